@@ -0,0 +1,86 @@
+"""Benchmarks for the compressed killmail archive.
+
+Prints the compression ratio of each format compared to the raw JSON.
+
+Run with: python -m benchmarks.bench_archive [--save FILE] [--compare FILE]
+"""
+
+import json
+import random
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+from zkillboard.archive import KillmailArchive
+from zkillboard.fakes import synthetic_killmail_data
+from zkillboard.recording import Compression
+
+from .runner import Result, main, measure
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+KILLMAILS = 5000
+
+
+def _archive_size(directory: Path) -> int:
+    return sum(obj.stat().st_size for obj in directory.glob("segment-*.dat"))
+
+
+def bench_archive(min_time: float) -> List[Result]:
+    rnd = random.Random(42)
+    killmails = [
+        synthetic_killmail_data(id, attackers=rnd.choice([1, 3, 10, 30]))
+        for id in range(1, KILLMAILS + 1)
+    ]
+    raw_size = sum(len(json.dumps(obj, separators=(",", ":"))) for obj in killmails)
+    compressions = [Compression.GZIP]
+    if zstandard:
+        compressions.append(Compression.ZSTD)
+
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for compression in compressions:
+            for training_samples in [0, 1000]:
+                name = f"{compression.value}-dict-{training_samples}"
+                directory = Path(temp_dir) / name
+                archive = KillmailArchive(
+                    directory,
+                    compression=compression,
+                    training_samples=training_samples,
+                )
+                for killmail_data in killmails:
+                    archive.add(killmail_data)
+                archive.flush()
+                ratio = raw_size / _archive_size(directory)
+                print(f"archive[{name}]: compression ratio {ratio:.2f}")
+
+                ids = [rnd.randint(1, KILLMAILS) for _ in range(1000)]
+                results.append(
+                    measure(
+                        f"archive_get[{name}-1000-killmails]",
+                        lambda archive=archive: [archive.get(id) for id in ids],
+                        min_time,
+                    )
+                )
+                results.append(
+                    measure(
+                        f"archive_batches[{name}-{KILLMAILS}-killmails]",
+                        lambda archive=archive: sum(
+                            len(obj) for obj in archive.batches()
+                        ),
+                        min_time,
+                    )
+                )
+                archive.close()
+    return results
+
+
+BENCHMARKS = {"archive": bench_archive}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
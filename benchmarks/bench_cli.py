@@ -0,0 +1,71 @@
+"""Benchmarks for startup time and throughput of the command line interface.
+
+Run with: python -m benchmarks.bench_cli [--save FILE] [--compare FILE]
+"""
+
+import io
+import json
+import subprocess
+import sys
+from typing import List
+
+from zkillboard.cli import LineWriter, _killmail_encoder
+from zkillboard.killmails import Killmail
+
+from .generators import make_killmail_data
+from .runner import Result, main, measure
+
+
+def _run_python(*args: str):
+    subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL)
+
+
+def bench_startup(min_time: float) -> List[Result]:
+    return [
+        measure("startup[python]", lambda: _run_python("-c", "pass"), min_time),
+        measure(
+            "startup[import zkillboard.cli]",
+            lambda: _run_python("-c", "import zkillboard.cli"),
+            min_time,
+        ),
+        measure(
+            "startup[python -m zkillboard --version]",
+            lambda: _run_python("-m", "zkillboard", "--version"),
+            min_time,
+        ),
+    ]
+
+
+def bench_output(min_time: float) -> List[Result]:
+    results = []
+    encode = _killmail_encoder()
+    for attackers in [10, 1000]:
+        killmail_data = make_killmail_data(attackers)
+        frame = json.dumps(killmail_data)
+        killmail = Killmail.create_from_zkb_data(killmail_data)
+        writer = LineWriter(stream=io.BytesIO())
+
+        def write_raw(frame=frame, writer=writer):
+            writer.write_line(frame.encode("utf-8"))
+            writer.stream.seek(0)
+            writer.stream.truncate()
+
+        def write_resolved(killmail=killmail, writer=writer):
+            writer.write_line(encode(killmail))
+            writer.stream.seek(0)
+            writer.stream.truncate()
+
+        results.append(
+            measure(f"output_raw[attackers-{attackers}]", write_raw, min_time)
+        )
+        results.append(
+            measure(f"output_resolved[attackers-{attackers}]", write_resolved, min_time)
+        )
+    return results
+
+
+BENCHMARKS = {"startup": bench_startup, "output": bench_output}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
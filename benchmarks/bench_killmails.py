@@ -0,0 +1,152 @@
+"""Benchmarks for parsing, resolving and delivering killmails.
+
+Run with: python -m benchmarks.bench_killmails [--save FILE] [--compare FILE]
+"""
+
+import asyncio
+import functools
+import json
+import pickle
+import sys
+from typing import List
+from unittest.mock import patch
+
+from tests.fixtures import killmails_raw
+from zkillboard.esi import create_eve_entities_from_ids
+from zkillboard.killmails import Killmail
+from zkillboard.parsing import parse_frame
+
+from .generators import make_killmail_data
+from .runner import Result, main, measure
+
+ATTACKER_COUNTS = [1, 10, 100, 1000, 5000]
+
+
+@functools.lru_cache(maxsize=None)
+def _payloads() -> dict:
+    payloads = {"fixture-111519365": killmails_raw[111519365]}
+    for count in ATTACKER_COUNTS:
+        payloads[f"attackers-{count}"] = make_killmail_data(count)
+    return payloads
+
+
+def bench_create_from_zkb_data(min_time: float) -> List[Result]:
+    return [
+        measure(
+            f"create_from_zkb_data[{name}]",
+            lambda data=data: Killmail.create_from_zkb_data(data),
+            min_time,
+        )
+        for name, data in _payloads().items()
+    ]
+
+
+def bench_entities(min_time: float) -> List[Result]:
+    results = []
+    for name, data in _payloads().items():
+        killmail = Killmail.create_from_zkb_data(data)
+        results.append(measure(f"entities[{name}]", killmail.entities, min_time))
+    return results
+
+
+def bench_asdict(min_time: float) -> List[Result]:
+    results = []
+    for name, data in _payloads().items():
+        killmail = Killmail.create_from_zkb_data(data)
+        results.append(measure(f"asdict[{name}]", killmail.asdict, min_time))
+    return results
+
+
+def bench_parse_pool_loop(min_time: float) -> List[Result]:
+    """Measure the work left to the event loop for each frame parsed in a pool.
+
+    Compares unpickling a full killmail from a worker
+    with unpickling its compact form and building the killmail from it.
+    """
+    results = []
+    for name, data in _payloads().items():
+        frame = json.dumps(data)
+        pickled_killmail = pickle.dumps(Killmail.create_from_zkb_data(data))
+        pickled_compact = pickle.dumps(parse_frame(frame))
+        results.append(
+            measure(
+                f"parse_pool_loop[killmail,{name}]",
+                lambda pickled=pickled_killmail: pickle.loads(pickled),
+                min_time,
+            )
+        )
+        results.append(
+            measure(
+                f"parse_pool_loop[compact,{name}]",
+                lambda pickled=pickled_compact: pickle.loads(pickled).to_killmail(),
+                min_time,
+            )
+        )
+    return results
+
+
+class _FakeResponse:
+    def __init__(self, data: list) -> None:
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        return self._data
+
+
+class _FakeSession:
+    """Stands in for aiohttp.ClientSession, so that ESI is not called."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def post(self, url, json):  # pylint: disable = redefined-outer-name
+        return _FakeResponse(
+            [{"id": id, "name": f"name-{id}", "category": "character"} for id in json]
+        )
+
+
+def bench_create_eve_entities_from_ids(min_time: float) -> List[Result]:
+    results = []
+    loop = asyncio.new_event_loop()
+    try:
+        with patch("zkillboard.esi.aiohttp.ClientSession", _FakeSession):
+            for name, data in _payloads().items():
+                killmail = Killmail.create_from_zkb_data(data)
+                ids = [obj.id for obj in killmail.entities()]
+                results.append(
+                    measure(
+                        f"create_eve_entities_from_ids[{name}]",
+                        lambda ids=ids: loop.run_until_complete(
+                            create_eve_entities_from_ids(ids)
+                        ),
+                        min_time,
+                    )
+                )
+    finally:
+        loop.close()
+    return results
+
+
+BENCHMARKS = {
+    "create_from_zkb_data": bench_create_from_zkb_data,
+    "entities": bench_entities,
+    "asdict": bench_asdict,
+    "parse_pool_loop": bench_parse_pool_loop,
+    "create_eve_entities_from_ids": bench_create_eve_entities_from_ids,
+}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
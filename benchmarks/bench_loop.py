@@ -0,0 +1,99 @@
+"""Benchmarks for the event loop overhead per received websocket message.
+
+Frames are pushed by a local fake zKillboard server as fast as possible
+and the client only counts them,
+so the measurement covers the loop, the socket and the websocket reader.
+The server runs in the same process,
+so the cost of compressing frames is included as well.
+
+Run with: python -m benchmarks.bench_loop [--save FILE] [--compare FILE]
+"""
+
+import asyncio
+import itertools
+import sys
+from typing import List
+
+from zkillboard import config
+from zkillboard.client import ClientKillStream
+from zkillboard.fakes import FakeZkbServer, synthetic_frames
+
+from .runner import Result, main, measure
+
+FRAMES = 2000
+
+DEFAULT_RUNTIME = config.RuntimeConfig(
+    heartbeat=None, max_msg_size=4 * 1024 * 1024, read_bufsize=64 * 1024, compress=0
+)
+TUNED_RUNTIME = config.RuntimeConfig()
+UNCOMPRESSED_RUNTIME = config.RuntimeConfig(compress=0)
+
+
+class _CountingClient(ClientKillStream):
+    def __init__(self, count: int, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.count = count
+        self.received = 0
+        self.done = asyncio.Event()
+
+    def _process_frame(self, data: str):
+        self.received += 1
+        if self.received >= self.count:
+            self.done.set()
+
+    async def on_new_killmail(self, killmail):
+        pass
+
+
+async def _receive_frames(frames: List[str], runtime: config.RuntimeConfig):
+    server = FakeZkbServer(frames, rate=1_000_000)
+    await server.start()
+    client = _CountingClient(len(frames), ws_url=server.url, runtime=runtime)
+    runner = asyncio.create_task(client.run_client())
+    try:
+        await client.done.wait()
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await server.stop()
+
+
+def _run(use_uvloop: bool, frames: List[str], runtime: config.RuntimeConfig):
+    if use_uvloop:
+        import uvloop  # pylint: disable = import-outside-toplevel
+
+        uvloop.run(_receive_frames(frames, runtime))
+    else:
+        asyncio.run(_receive_frames(frames, runtime))
+
+
+def bench_loop(min_time: float) -> List[Result]:
+    frames = list(itertools.islice(synthetic_frames(attackers=50), FRAMES))
+    loops = [False, True] if config.uvloop_available() else [False]
+    results = []
+    for use_uvloop, (settings, runtime) in itertools.product(
+        loops,
+        [
+            ("default", DEFAULT_RUNTIME),
+            ("tuned", TUNED_RUNTIME),
+            ("tuned-uncompressed", UNCOMPRESSED_RUNTIME),
+        ],
+    ):
+        loop_name = "uvloop" if use_uvloop else "asyncio"
+        result = measure(
+            f"receive_{FRAMES}_frames[{loop_name}-{settings}]",
+            lambda: _run(use_uvloop, frames, runtime),
+            min_time,
+            min_calls=3,
+            warmup=1,
+        )
+        print(f"{result.name}: {result.p50_us / FRAMES:.1f}us per message")
+        results.append(result)
+    return results
+
+
+BENCHMARKS = {"loop": bench_loop}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
@@ -0,0 +1,105 @@
+"""Benchmarks for proximity queries between solar systems.
+
+Run with: python -m benchmarks.bench_proximity [--save FILE] [--compare FILE]
+"""
+
+import random
+import sys
+from collections import deque
+from typing import Dict, List, Set, Tuple
+
+from zkillboard.proximity import JumpIndex, ProximityFilter
+
+from .generators import make_killmail
+from .runner import Result, main, measure
+
+SYSTEMS = 5000
+
+
+def _make_edges(systems: int) -> List[Tuple[int, int]]:
+    """Return a connected graph similar in size and degree to New Eden."""
+    rnd = random.Random(42)
+    edges = [(30_000_000 + num, 30_000_001 + num) for num in range(systems - 1)]
+    for _ in range(systems // 3):
+        first = rnd.randrange(systems)
+        second = min(systems - 1, first + rnd.randint(2, 50))
+        edges.append((30_000_000 + first, 30_000_000 + second))
+    return edges
+
+
+def _within_jumps_bfs(
+    neighbours: Dict[int, Set[int]], start: int, target: int, jumps: int
+) -> bool:
+    seen = {start}
+    queue = deque([(start, 0)])
+    while queue:
+        current, distance = queue.popleft()
+        if current == target:
+            return True
+        if distance == jumps:
+            continue
+        for neighbour in neighbours[current]:
+            if neighbour not in seen:
+                seen.add(neighbour)
+                queue.append((neighbour, distance + 1))
+    return False
+
+
+def bench_proximity(min_time: float) -> List[Result]:
+    edges = _make_edges(SYSTEMS)
+    neighbours: Dict[int, Set[int]] = {}
+    for first, second in edges:
+        neighbours.setdefault(first, set()).add(second)
+        neighbours.setdefault(second, set()).add(first)
+
+    results = [
+        measure(
+            f"build_index[systems-{SYSTEMS}-max-jumps-10]",
+            lambda: JumpIndex.from_edges(edges, max_jumps=10),
+            min_time,
+            min_calls=1,
+            warmup=0,
+        )
+    ]
+    index = JumpIndex.from_edges(edges, max_jumps=10)
+    home = 30_000_000 + SYSTEMS // 2
+    rnd = random.Random(7)
+    targets = [30_000_000 + rnd.randrange(SYSTEMS) for _ in range(1000)]
+
+    for jumps in [5, 10]:
+        results.append(
+            measure(
+                f"within_jumps_bfs[1000-queries-jumps-{jumps}]",
+                lambda jumps=jumps: [
+                    _within_jumps_bfs(neighbours, home, obj, jumps) for obj in targets
+                ],
+                min_time,
+            )
+        )
+        results.append(
+            measure(
+                f"within_jumps_index[1000-queries-jumps-{jumps}]",
+                lambda jumps=jumps: [
+                    index.within_jumps(home, obj, jumps) for obj in targets
+                ],
+                min_time,
+            )
+        )
+
+    my_filter = ProximityFilter(index, home, 10)
+    killmail = make_killmail(10)
+    results.append(
+        measure(
+            "proximity_filter_matches[1000-killmails]",
+            lambda: [my_filter.matches(killmail) for _ in range(1000)],
+            min_time,
+        )
+    )
+    return results
+
+
+BENCHMARKS = {"proximity": bench_proximity}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
@@ -0,0 +1,55 @@
+"""Benchmarks for storing killmails in SQLite.
+
+Run with: python -m benchmarks.bench_storage [--save FILE] [--compare FILE]
+"""
+
+import asyncio
+import itertools
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+from zkillboard.killmails import Killmail
+from zkillboard.storage import SqliteSink
+
+from .generators import make_killmail_data
+from .runner import Result, main, measure
+
+BATCH_SIZES = [1, 100, 1000]
+ATTACKERS = 10
+
+
+def bench_sqlite_sink(min_time: float) -> List[Result]:
+    template = make_killmail_data(ATTACKERS)
+    ids = itertools.count(1)
+    results = []
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for batch_size in BATCH_SIZES:
+            sink = SqliteSink(
+                Path(temp_dir) / f"bench-{batch_size}.sqlite", batch_size=batch_size
+            )
+            loop.run_until_complete(sink.start())
+
+            def write_batch(sink=sink, batch_size=batch_size):
+                for _ in range(batch_size):
+                    killmail_data = {**template, "killmail_id": next(ids)}
+                    loop.run_until_complete(
+                        sink.add(Killmail.create_from_zkb_data(killmail_data))
+                    )
+
+            result = measure(f"sqlite_sink[batch-{batch_size}]", write_batch, min_time)
+            loop.run_until_complete(sink.stop())
+            rows = batch_size * (1 + ATTACKERS)
+            print(f"{result.name}: {result.ops_per_sec * rows:,.0f} rows/s")
+            results.append(result)
+    loop.close()
+    return results
+
+
+BENCHMARKS = {"sqlite_sink": bench_sqlite_sink}
+
+
+if __name__ == "__main__":
+    sys.exit(main(BENCHMARKS))
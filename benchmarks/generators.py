@@ -0,0 +1,66 @@
+"""Generators for killmail payloads of any size."""
+
+from typing import Optional
+
+from tests.factories import KillmailAttackerFactory, KillmailFactory
+from zkillboard.killmails import Killmail, _KillmailCharacter
+
+
+def _character_data(obj: _KillmailCharacter) -> dict:
+    data = {}
+    for obj_prop, data_prop in obj._DATA_MAP.items():
+        if entity := getattr(obj, obj_prop, None):
+            data[data_prop] = entity.id
+    return data
+
+
+def killmail_to_zkb_data(killmail: Killmail) -> dict:
+    """Convert a killmail into raw data as received from the zkillboard WS API."""
+    attackers = []
+    for attacker in killmail.attackers:
+        attacker_data = _character_data(attacker)
+        attacker_data["damage_done"] = attacker.damage_done
+        attacker_data["final_blow"] = bool(attacker.is_final_blow)
+        attacker_data["security_status"] = attacker.security_status
+        attackers.append(attacker_data)
+
+    victim = _character_data(killmail.victim)
+    victim["damage_taken"] = killmail.victim.damage_taken
+    victim["position"] = {
+        "x": killmail.position.x,
+        "y": killmail.position.y,
+        "z": killmail.position.z,
+    }
+    zkb = killmail.zkb
+    return {
+        "attackers": attackers,
+        "killmail_id": killmail.id,
+        "killmail_time": killmail.time.strftime(r"%Y-%m-%dT%H:%M:%SZ"),
+        "solar_system_id": killmail.solar_system.id,
+        "victim": victim,
+        "zkb": {
+            "locationID": zkb.location_id,
+            "hash": zkb.hash,
+            "fittedValue": zkb.fitted_value,
+            "totalValue": zkb.total_value,
+            "points": zkb.points,
+            "npc": zkb.is_npc,
+            "solo": zkb.is_solo,
+            "awox": zkb.is_awox,
+        },
+    }
+
+
+def make_killmail(attackers: int, killmail_id: Optional[int] = None) -> Killmail:
+    """Create a killmail with the given number of attackers."""
+    my_attackers = [KillmailAttackerFactory() for _ in range(attackers)]
+    my_attackers[0].is_final_blow = True
+    params = {"attackers": my_attackers}
+    if killmail_id:
+        params["id"] = killmail_id
+    return KillmailFactory(**params)
+
+
+def make_killmail_data(attackers: int, killmail_id: Optional[int] = None) -> dict:
+    """Create raw killmail data with the given number of attackers."""
+    return killmail_to_zkb_data(make_killmail(attackers, killmail_id))
@@ -0,0 +1,95 @@
+"""End-to-end load test of the client against local fake zKillboard and ESI servers.
+
+Run with: python -m benchmarks.loadtest [options]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import List
+
+from zkillboard import ClientKillStream, Killmail
+from zkillboard.fakes import FakeEsiServer, FakeZkbServer, synthetic_frames
+
+
+class _LoadTestClient(ClientKillStream):
+    def __init__(self, zkb: FakeZkbServer, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.zkb = zkb
+        self.latencies: List[float] = []
+
+    async def on_new_killmail(self, killmail: Killmail):
+        self.latencies.append(time.time() - self.zkb.sent_at[killmail.id])
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * len(values))))
+    return values[index]
+
+
+async def run_load_test(args: argparse.Namespace):
+    zkb = FakeZkbServer(
+        synthetic_frames(attackers=args.attackers),
+        rate=args.rate,
+        burst_size=args.burst_size,
+        burst_interval=args.burst_interval,
+    )
+    esi = FakeEsiServer(
+        latency=args.esi_latency,
+        error_rate=args.esi_error_rate,
+        rate_limit=args.esi_rate_limit,
+    )
+    await esi.start()
+    await zkb.start()
+    client = _LoadTestClient(
+        zkb,
+        shards=args.shards,
+        parse_workers=args.parse_workers,
+        ws_url=zkb.url,
+        esi_url=esi.url,
+    )
+    runner = asyncio.create_task(client.run_client())
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        await zkb.stop()
+        await esi.stop()
+
+    latencies = client.latencies
+    print(f"Sent killmails:         {len(zkb.sent_at):>10,}")
+    print(f"Delivered killmails:    {len(latencies):>10,}")
+    print(f"Sustained killmails/s:  {len(latencies) / args.duration:>10,.1f}")
+    print(f"ESI requests / errors:  {esi.requests:>10,} / {esi.errors:,}")
+    if latencies:
+        print(
+            f"Latency p50:            {statistics.median(latencies) * 1000:>10,.1f} ms"
+        )
+        for percent in (95, 99):
+            value = _percentile(latencies, percent) * 1000
+            print(f"Latency p{percent}:            {value:>10,.1f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run an end-to-end load test.")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--rate", type=float, default=100, help="killmails/s")
+    parser.add_argument("--burst-size", type=int, default=0)
+    parser.add_argument("--burst-interval", type=float, default=0, help="seconds")
+    parser.add_argument("--attackers", type=int, default=10)
+    parser.add_argument("--esi-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--esi-error-rate", type=float, default=0)
+    parser.add_argument("--esi-rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--parse-workers", type=int, default=0)
+    args = parser.parse_args(argv)
+    asyncio.run(run_load_test(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
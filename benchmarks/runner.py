@@ -0,0 +1,158 @@
+"""A minimal runner for benchmarks with baselines and regression checks."""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class Result:
+    """The result of a benchmark."""
+
+    name: str
+    calls: int
+    ops_per_sec: float
+    p50_us: float
+    p95_us: float
+    p99_us: float
+    peak_alloc_bytes: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<50} {self.ops_per_sec:>12,.1f} ops/s "
+            f"p50 {self.p50_us:>10,.1f}us  p95 {self.p95_us:>10,.1f}us  "
+            f"p99 {self.p99_us:>10,.1f}us  peak {self.peak_alloc_bytes:>12,} B"
+        )
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))))
+    return sorted_values[index]
+
+
+def measure(
+    name: str,
+    func: Callable[[], object],
+    min_time: float = 0.5,
+    min_calls: int = 5,
+    warmup: int = 2,
+) -> Result:
+    """Measure a function by calling it repeatedly.
+
+    Latency percentiles are measured per call.
+    Allocations are measured as peak traced memory of a single extra call.
+    """
+    for _ in range(warmup):
+        func()
+
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < min_calls or time.perf_counter() - started < min_time:
+        call_started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - call_started)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    durations.sort()
+    return Result(
+        name=name,
+        calls=len(durations),
+        ops_per_sec=len(durations) / sum(durations),
+        p50_us=statistics.median(durations) * 1_000_000,
+        p95_us=_percentile(durations, 95) * 1_000_000,
+        p99_us=_percentile(durations, 99) * 1_000_000,
+        peak_alloc_bytes=peak,
+    )
+
+
+def save_results(path: Path, results: List[Result]):
+    """Save results as baseline."""
+    data = {obj.name: asdict(obj) for obj in results}
+    path.write_text(json.dumps(data, indent=2, sort_keys=True))
+
+
+def load_results(path: Path) -> Dict[str, Result]:
+    """Load results from a baseline."""
+    data = json.loads(path.read_text())
+    return {name: Result(**obj) for name, obj in data.items()}
+
+
+def compare_results(
+    results: List[Result], baseline: Dict[str, Result], max_regression: float
+) -> List[str]:
+    """Compare results with a baseline and return a description of each regression.
+
+    A regression is a throughput drop larger than max_regression,
+    e.g. 0.2 for 20%.
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+
+        change = (result.ops_per_sec - base.ops_per_sec) / base.ops_per_sec
+        print(f"{result.name:<50} {change:>+8.1%}")
+        if change < -max_regression:
+            regressions.append(
+                f"{result.name}: {base.ops_per_sec:,.1f} -> "
+                f"{result.ops_per_sec:,.1f} ops/s ({change:+.1%})"
+            )
+    return regressions
+
+
+def main(
+    benchmarks: Dict[str, Callable[[float], List[Result]]],
+    argv: Optional[List[str]] = None,
+) -> int:
+    """Run benchmarks from the command line and return the exit code.
+
+    Each benchmark is called with the minimum measuring time per case
+    and returns its results.
+    """
+    parser = argparse.ArgumentParser(description="Run benchmarks.")
+    parser.add_argument("-k", dest="filter", help="only run benchmarks containing this")
+    parser.add_argument("--min-time", type=float, default=0.5)
+    parser.add_argument("--save", type=Path, help="save results as baseline")
+    parser.add_argument("--compare", type=Path, help="compare with this baseline")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="fail when throughput drops by more than this fraction",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, benchmark in benchmarks.items():
+        if args.filter and args.filter not in name:
+            continue
+        for result in benchmark(args.min_time):
+            print(result)
+            results.append(result)
+
+    if args.save:
+        save_results(args.save, results)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        regressions = compare_results(
+            results, load_results(args.compare), args.max_regression
+        )
+        if regressions:
+            print("Regressions:", *regressions, sep="\n  ", file=sys.stderr)
+            return 1
+
+    return 0
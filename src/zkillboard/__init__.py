@@ -2,7 +2,55 @@
 
 __version__ = "0.1.0dev1"
 
-from .client import ClientFiltered, ClientKillStream, Filter, FilterType
-from .killmails import Killmail
+import importlib
 
-__all__ = ["ClientKillStream", "ClientFiltered", "Filter", "FilterType", "Killmail"]
+# Public objects are imported on first access to keep import time low,
+# e.g. for the command line interface
+_EXPORTS = {
+    "ClientKillStream": ".client",
+    "ClientFiltered": ".client",
+    "Compression": ".recording",
+    "Filter": ".client",
+    "FunctionSink": ".sinks",
+    "FilterType": ".client",
+    "HistorySource": ".history",
+    "Hook": ".hooks",
+    "InMemoryMetrics": ".metrics",
+    "JumpIndex": ".proximity",
+    "Killmail": ".killmails",
+    "KillmailArchive": ".archive",
+    "Lane": ".scheduling",
+    "Metrics": ".metrics",
+    "OpenTelemetryHook": ".hooks",
+    "Ordering": ".parsing",
+    "PrometheusExporter": ".metrics",
+    "ProximityFilter": ".proximity",
+    "Ranker": ".scheduling",
+    "RelayServer": ".relay",
+    "ReplaySource": ".recording",
+    "RuntimeConfig": ".config",
+    "Sink": ".sinks",
+    "SinkPolicy": ".sinks",
+    "SinkRegistry": ".sinks",
+    "SlowestKillmailsProfiler": ".hooks",
+    "SqliteSink": ".storage",
+    "StreamRecorder": ".recording",
+    "ZkbHistorySource": ".history",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    obj = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = obj
+    return obj
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,7 @@
+"""Entry point for running zkillboard as module."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
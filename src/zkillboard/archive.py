@@ -0,0 +1,350 @@
+"""A compact archive of killmails with a shared compression dictionary."""
+
+# pylint: disable = redefined-builtin
+
+import json
+import logging
+import mmap
+import struct
+import zlib
+from pathlib import Path
+from typing import (
+    IO,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .killmails import Killmail
+from .recording import Compression
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("zkillboard")
+
+_DICTIONARY_FILE = "dictionary.bin"
+_DICTIONARY_MAGIC = b"ZKBDICT1"
+_LENGTH = struct.Struct("<I")
+_INDEX_ENTRY = struct.Struct("<qQI")
+_ZLIB_MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+class _Location(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+def _train_zlib_dictionary(samples: List[bytes], size: int) -> bytes:
+    """Return a preset dictionary for zlib from samples.
+
+    zlib can only refer back 32 KB and finds matches at the end
+    of the dictionary with the shortest distances,
+    so the dictionary is made of the most common chunks of the samples,
+    with the most common at the end.
+    """
+    size = min(size, _ZLIB_MAX_DICTIONARY_SIZE)
+    counts: Dict[bytes, int] = {}
+    for sample in samples:
+        for chunk in set(sample[num : num + 16] for num in range(0, len(sample), 8)):
+            counts[chunk] = counts.get(chunk, 0) + 1
+
+    chunks = sorted(
+        (chunk for chunk, count in counts.items() if count > 1),
+        key=lambda chunk: counts[chunk],
+    )
+    dictionary = b"".join(chunks)
+    return dictionary[-size:]
+
+
+class _Codec:
+    """Compresses single records with a shared dictionary."""
+
+    def __init__(self, compression: Compression, dictionary: bytes) -> None:
+        self.compression = Compression(compression)
+        self.dictionary = dictionary
+        if self.compression is Compression.ZSTD:
+            if not zstandard:
+                raise RuntimeError("zstd compression requires the zstandard package")
+            dict_data = (
+                zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            )
+            self._compressor = zstandard.ZstdCompressor(
+                level=3, dict_data=dict_data, write_content_size=True
+            )
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    @classmethod
+    def train(
+        cls, compression: Compression, samples: List[bytes], size: int
+    ) -> "_Codec":
+        """Create a codec with a dictionary trained from samples."""
+        dictionary = b""
+        if Compression(compression) is Compression.ZSTD:
+            if not zstandard:
+                raise RuntimeError("zstd compression requires the zstandard package")
+            try:
+                dictionary = zstandard.train_dictionary(size, samples).as_bytes()
+            except zstandard.ZstdError as ex:
+                logger.warning("Archive: Using no dictionary: %s", ex)
+        elif samples:
+            dictionary = _train_zlib_dictionary(samples, size)
+        return cls(compression, dictionary)
+
+    @classmethod
+    def load(cls, path: Path) -> "_Codec":
+        """Load a codec from a dictionary file."""
+        data = path.read_bytes()
+        if not data.startswith(_DICTIONARY_MAGIC):
+            raise ValueError(f"Not a dictionary file: {path}")
+        header_size = len(_DICTIONARY_MAGIC) + 4
+        name = data[len(_DICTIONARY_MAGIC) : header_size].decode("ascii").strip()
+        return cls(Compression(name), data[header_size:])
+
+    def save(self, path: Path):
+        """Save the dictionary to a file."""
+        name = self.compression.value.ljust(4).encode("ascii")
+        path.write_bytes(_DICTIONARY_MAGIC + name + self.dictionary)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.compression is Compression.ZSTD:
+            return self._compressor.compress(data)
+
+        if self.dictionary:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=self.dictionary)
+        else:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.compression is Compression.ZSTD:
+            return self._decompressor.decompress(data)
+
+        if self.dictionary:
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+        else:
+            decompressor = zlib.decompressobj(-15)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+class KillmailArchive:
+    """Stores killmails compactly as compressed records in segment files.
+
+    Each killmail is compressed on its own with a dictionary,
+    which is trained on the first killmails added to a new archive
+    and shared by all records.
+    This compresses much better than single records without a dictionary,
+    while every killmail can still be read on its own.
+
+    An index maps the ID of each killmail to its record,
+    and segment files are memory-mapped for reading.
+    Killmails added before the dictionary is trained are kept in memory
+    and written once it has been trained, or on flush.
+
+    Uses zstd when the zstandard package is installed,
+    otherwise deflate from zlib with a preset dictionary.
+
+    Args:
+        directory: Where to store the archive.
+        compression: Compression format for new archives.
+            An existing archive keeps its compression format.
+        dictionary_size: Maximum size of the dictionary in bytes.
+            The dictionary for zlib is at most 32 KB.
+        training_samples: Number of killmails to train the dictionary with.
+        max_segment_bytes: Start a new segment file after this many bytes.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        compression: Optional[Compression] = None,
+        dictionary_size: int = 112 * 1024,
+        training_samples: int = 1000,
+        max_segment_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        if compression is None:
+            compression = Compression.ZSTD if zstandard else Compression.GZIP
+        self.directory = Path(directory)
+        self.compression = Compression(compression)
+        self.dictionary_size = dictionary_size
+        self.training_samples = training_samples
+        self.max_segment_bytes = max_segment_bytes
+        self._codec: Optional[_Codec] = None
+        self._samples: List[Tuple[int, bytes]] = []
+        self._sample_ids: Set[int] = set()
+        self._index: Dict[int, _Location] = {}
+        self._segment = 0
+        self._segment_file: Optional[IO[bytes]] = None
+        self._index_file: Optional[IO[bytes]] = None
+        self._segment_bytes = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._samples)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._index or id in self._sample_ids
+
+    def __enter__(self) -> "KillmailArchive":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, killmail_data: Union[dict, str, bytes]) -> bool:
+        """Add a killmail in the format of the zkillboard WS API,
+        either as dict or as raw frame.
+
+        Return True when it was added and False when it already existed.
+        """
+        if isinstance(killmail_data, (str, bytes)):
+            killmail_data = json.loads(killmail_data)
+        id = killmail_data["killmail_id"]
+        if id in self:
+            return False
+
+        data = json.dumps(killmail_data, separators=(",", ":")).encode("utf-8")
+        if self._codec:
+            self._write(id, data)
+            return True
+
+        self._samples.append((id, data))
+        self._sample_ids.add(id)
+        if len(self._samples) >= self.training_samples:
+            self._train()
+        return True
+
+    def flush(self):
+        """Make all added killmails readable and write them to disk.
+
+        Trains the dictionary with the killmails added so far, if needed.
+        """
+        if not self._codec and self._samples:
+            self._train()
+        if self._segment_file:
+            self._segment_file.flush()
+            self._index_file.flush()
+
+    def close(self):
+        """Flush and close the archive."""
+        self.flush()
+        self._close_segment()
+        for obj in self._maps.values():
+            obj.close()
+        self._maps.clear()
+
+    def get_data(self, id: int) -> Optional[dict]:
+        """Return raw data of a killmail or None if it is not in the archive."""
+        location = self._index.get(id)
+        if not location:
+            if id in self._sample_ids:
+                data = next(data for obj, data in self._samples if obj == id)
+                return json.loads(data)
+            return None
+
+        return json.loads(self._read(location))
+
+    def get(self, id: int) -> Optional[Killmail]:
+        """Return a killmail or None if it is not in the archive."""
+        killmail_data = self.get_data(id)
+        if killmail_data is None:
+            return None
+        return Killmail.create_from_zkb_data(killmail_data)
+
+    def batches(self, batch_size: int = 1000) -> Iterator[List[Killmail]]:
+        """Yield all killmails in batches in the order they were added."""
+        locations: List[Union[_Location, bytes]] = sorted(self._index.values())
+        locations += [data for _, data in self._samples]
+        for start in range(0, len(locations), batch_size):
+            yield [
+                Killmail.create_from_zkb_data(
+                    json.loads(obj if isinstance(obj, bytes) else self._read(obj))
+                )
+                for obj in locations[start : start + batch_size]
+            ]
+
+    def killmails(self) -> Iterator[Killmail]:
+        """Yield all killmails in the order they were added."""
+        for batch in self.batches():
+            yield from batch
+
+    def _open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / _DICTIONARY_FILE
+        if path.exists():
+            self._codec = _Codec.load(path)
+            self.compression = self._codec.compression
+
+        for index_path in sorted(self.directory.glob("segment-*.idx")):
+            segment = int(index_path.stem.split("-")[1])
+            self._segment = max(self._segment, segment)
+            data = index_path.read_bytes()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            for id, offset, length in _INDEX_ENTRY.iter_unpack(data[:usable]):
+                self._index[id] = _Location(segment, offset, length)
+
+    def _train(self):
+        samples = [data for _, data in self._samples]
+        self._codec = _Codec.train(self.compression, samples, self.dictionary_size)
+        self._codec.save(self.directory / _DICTIONARY_FILE)
+        logger.info(
+            "Archive: Trained dictionary of %d bytes with %d killmails",
+            len(self._codec.dictionary),
+            len(samples),
+        )
+        buffered, self._samples = self._samples, []
+        self._sample_ids.clear()
+        for id, data in buffered:
+            self._write(id, data)
+
+    def _write(self, id: int, data: bytes):
+        record = self._codec.compress(data)
+        if not self._segment_file or self._segment_bytes >= self.max_segment_bytes:
+            self._open_next_segment()
+        offset = self._segment_bytes
+        self._segment_file.write(_LENGTH.pack(len(record)) + record)
+        self._segment_bytes += _LENGTH.size + len(record)
+        self._index_file.write(_INDEX_ENTRY.pack(id, offset, len(record)))
+        self._index[id] = _Location(self._segment, offset, len(record))
+
+    def _open_next_segment(self):
+        self._close_segment()
+        self._segment += 1
+        path = self._segment_path(self._segment)
+        self._segment_file = open(path, "ab")
+        self._segment_bytes = self._segment_file.tell()
+        self._index_file = open(path.with_suffix(".idx"), "ab")
+
+    def _close_segment(self):
+        if self._segment_file:
+            self._segment_file.close()
+            self._index_file.close()
+            self._segment_file = None
+            self._index_file = None
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:05d}.dat"
+
+    def _read(self, location: _Location) -> bytes:
+        end = location.offset + _LENGTH.size + location.length
+        mapped = self._maps.get(location.segment)
+        if mapped is None or len(mapped) < end:
+            if location.segment == self._segment and self._segment_file:
+                self._segment_file.flush()
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(location.segment), "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[location.segment] = mapped
+
+        start = location.offset + _LENGTH.size
+        return self._codec.decompress(mapped[start:end])
@@ -0,0 +1,290 @@
+"""Command line interface for streaming killmails.
+
+Modules which are slow to import, like asyncio and aiohttp,
+are imported only once they are needed to keep startup fast.
+"""
+
+# pylint: disable = import-outside-toplevel
+
+import argparse
+import datetime as dt
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, List, Optional, Tuple
+
+from . import __version__, config
+from .helpers import json_default
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from .killmails import Killmail
+
+logger = logging.getLogger("zkillboard")
+
+
+def _killmail_encoder() -> Callable[["Killmail"], bytes]:
+    """Return the fastest available JSON encoder for killmails.
+
+    The output is the same with and without orjson.
+    orjson would encode enums by value, so they are converted before encoding.
+    """
+    import dataclasses
+    import enum
+
+    try:
+        import orjson
+    except ImportError:
+        import json
+
+        return lambda killmail: json.dumps(
+            dataclasses.asdict(killmail),
+            default=json_default,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    def dict_with_enum_names(items: List[Tuple[str, Any]]) -> dict:
+        return {
+            key: json_default(value) if isinstance(value, enum.Enum) else value
+            for key, value in items
+        }
+
+    return lambda killmail: orjson.dumps(
+        dataclasses.asdict(killmail, dict_factory=dict_with_enum_names),
+        default=json_default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+
+
+class LineWriter:
+    """Writes lines through a buffer to a stream or to rotating JSONL files.
+
+    Args:
+        stream: Stream to write to. Not used when directory is set.
+        directory: When set, write to rotating files in this directory.
+        max_file_bytes: Start a new file after this many bytes.
+        buffer_size: Write buffered lines once they exceed this many bytes.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[BinaryIO] = None,
+        directory: Optional[Path] = None,
+        max_file_bytes: int = 256 * 1024 * 1024,
+        buffer_size: int = 256 * 1024,
+    ) -> None:
+        if not stream and not directory:
+            raise ValueError("Need either stream or directory")
+        self.stream = stream
+        self.directory = Path(directory) if directory else None
+        self.max_file_bytes = max_file_bytes
+        self.buffer_size = buffer_size
+        self.lines_written = 0
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        self._file: Optional[BinaryIO] = None
+        self._file_bytes = 0
+        self._file_count = 0
+
+    def write_line(self, line: bytes):
+        """Add a line without line break to the buffer."""
+        self._buffer.append(line)
+        self._buffer.append(b"\n")
+        self._buffer_bytes += len(line) + 1
+        self.lines_written += 1
+        if self._buffer_bytes >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered lines."""
+        if not self._buffer:
+            return
+
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._buffer_bytes = 0
+        if self.directory:
+            if self._file and self._file_bytes >= self.max_file_bytes:
+                self.close()
+            if not self._file:
+                self._open_next_file()
+            self._file.write(data)
+            self._file.flush()
+            self._file_bytes += len(data)
+        else:
+            self.stream.write(data)
+            self.stream.flush()
+
+    def close(self):
+        """Flush buffered lines and close the current file."""
+        if self._buffer:
+            self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _open_next_file(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._file_count += 1
+        now = dt.datetime.now(dt.timezone.utc)
+        name = f"zkb-{now:%Y%m%dT%H%M%S}-{self._file_count:04d}.jsonl"
+        self._file = open(self.directory / name, "ab")
+        self._file_bytes = 0
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="zkillboard",
+        description="Stream killmails from zKillboard as JSON lines.",
+    )
+    parser.add_argument(
+        "channels",
+        nargs="*",
+        metavar="TYPE:ID",
+        help="channels to subscribe to, e.g. alliance:99000001 (default: killstream)",
+    )
+    parser.add_argument(
+        "--resolved",
+        action="store_true",
+        help="write parsed killmails with names resolved from ESI "
+        "instead of raw frames",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, help="write to rotating files in this directory"
+    )
+    parser.add_argument(
+        "--max-file-mb", type=int, default=256, help="size of each output file"
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="seconds between flushing buffered output",
+    )
+    parser.add_argument(
+        "--limit", type=int, help="exit after writing this many killmails"
+    )
+    parser.add_argument(
+        "--duration", type=float, help="exit after running this many seconds"
+    )
+    parser.add_argument("--replay", type=Path, help="read frames from a recording")
+    parser.add_argument(
+        "--uvloop", action="store_true", help="use uvloop when it is installed"
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--version", action="version", version=__version__)
+    return parser
+
+
+def _create_client(
+    args: argparse.Namespace, filters: list, writer: LineWriter, done: "asyncio.Event"
+):
+    from .client import ClientFiltered
+    from .killmails import Killmail
+
+    encode = _killmail_encoder()
+
+    class _CliClient(ClientFiltered):
+        def __init__(self) -> None:
+            super().__init__(filters)
+            if not filters:
+                self.channels = ["killstream"]
+
+        def _process_frame(self, data: str):
+            if args.resolved:
+                super()._process_frame(data)
+            else:
+                self._write(data.encode("utf-8"))
+
+        async def on_new_killmail(self, killmail: Killmail):
+            self._write(encode(killmail))
+
+        def _write(self, line: bytes):
+            if done.is_set():
+                return
+
+            writer.write_line(line)
+            if args.limit and writer.lines_written >= args.limit:
+                done.set()
+
+    return _CliClient()
+
+
+async def _flush_periodically(writer: LineWriter, interval: float):
+    import asyncio
+
+    while True:
+        await asyncio.sleep(interval)
+        writer.flush()
+
+
+async def _run(args: argparse.Namespace, filters: list, writer: LineWriter):
+    import asyncio
+
+    done = asyncio.Event()
+    client = _create_client(args, filters, writer, done)
+    if args.replay:
+        from .recording import ReplaySource
+
+        runner = asyncio.create_task(client.run_replay(ReplaySource(args.replay, None)))
+    else:
+        runner = asyncio.create_task(client.run_client())
+
+    flusher = asyncio.create_task(_flush_periodically(writer, args.flush_interval))
+    waiter = asyncio.create_task(done.wait())
+    try:
+        await asyncio.wait(
+            [runner, waiter],
+            timeout=args.duration,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        for task in (runner, flusher, waiter):
+            task.cancel()
+        await asyncio.gather(runner, flusher, waiter, return_exceptions=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line interface and return the exit code."""
+    parser = _create_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format=config.LOG_FORMAT)
+
+    import asyncio
+
+    from .client import Filter
+
+    try:
+        filters = [Filter.from_channel(channel) for channel in args.channels]
+    except ValueError:
+        parser.error(f"invalid channels: {' '.join(args.channels)}")
+
+    if args.output:
+        writer = LineWriter(
+            directory=args.output, max_file_bytes=args.max_file_mb * 1024 * 1024
+        )
+    else:
+        writer = LineWriter(stream=sys.stdout.buffer)
+
+    started = time.perf_counter()
+    try:
+        if args.uvloop and config.uvloop_available():
+            import uvloop
+
+            uvloop.run(_run(args, filters, writer))
+        else:
+            asyncio.run(_run(args, filters, writer))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+    logger.info(
+        "Wrote %d killmails in %.1f seconds",
+        writer.lines_written,
+        time.perf_counter() - started,
+    )
+    return 0
@@ -1,19 +1,47 @@
 """Clients for zkillboard WS API."""
 
 import asyncio
+import contextlib
+import datetime as dt
 import enum
+import json
 import logging
+import time
 from abc import ABC, abstractmethod
-from typing import List, NamedTuple
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 import aiohttp
-import aiorun
 
 from . import config
+from .connection import Backoff, InactivityWatchdog
+from .esi import ESI_EVEUNIVERSE_NAMES_URL
+from .helpers import RecentIds
+from .history import HistorySource, backfill_killmails
+from .hooks import Hook, KillmailContext
 from .killmails import Killmail
+from .metrics import (
+    LANE_LATENCY_SECONDS,
+    LANE_QUEUE_SIZE,
+    MESSAGES_TOTAL,
+    RECONNECTS_TOTAL,
+    STAGE_SECONDS,
+    STALLS_TOTAL,
+    STREAM_LAG_SECONDS,
+    TASKS_IN_FLIGHT,
+    InMemoryMetrics,
+    Metrics,
+    NullMetrics,
+    PrometheusExporter,
+)
+from .parsing import Ordering, ProcessPoolParser
+from .recording import ReplaySource, StreamRecorder
+from .scheduling import PriorityScheduler, Ranker
+from .sinks import SinkRegistry
 
 logger = logging.getLogger("zkillboard")
 
+STALLED_CLOSE_TIMEOUT_SECONDS = 1.0
+
 
 class FilterType(str, enum.Enum):
     """A type for filtering killmails.."""
@@ -41,85 +69,788 @@ class Filter(NamedTuple):
     def channel(self) -> str:
         """Return channel name for this filter."""
         filter_id = "*" if self.type == FilterType.ALL else self.id
-        return f"{self.type}:{filter_id}"
+        return f"{FilterType(self.type).value}:{filter_id}"
+
+    @classmethod
+    def from_channel(cls, channel: str) -> "Filter":
+        """Create a new filter from a channel name, e.g. `alliance:99000001`.
+
+        Raises ValueError for invalid channel names.
+        """
+        if channel == "killstream":
+            return cls(FilterType.ALL, 0)
+
+        filter_type, _, filter_id = channel.partition(":")
+        filter_type = FilterType(filter_type)
+        if filter_type == FilterType.ALL:
+            return cls(FilterType.ALL, 0)
+
+        return cls(filter_type, int(filter_id))
+
+    def can_match_locally(self) -> bool:
+        """Report whether this filter can be matched against killmails locally."""
+        return FilterType(self.type) not in _ZKB_ONLY_FILTER_TYPES
+
+    def matches_data(self, killmail_data: dict) -> bool:
+        """Report whether raw data of a killmail in the format
+        of the zkillboard WS API matches this filter.
+
+        Allows skipping killmails before they are parsed.
+        Like `matches()` filters which can only be matched by zKillboard never match.
+        """
+        filter_type = FilterType(self.type)
+        if filter_type == FilterType.ALL:
+            return True
+
+        if filter_type == FilterType.SYSTEM:
+            return killmail_data.get("solar_system_id") == self.id
+
+        if filter_type == FilterType.LOCATION:
+            zkb = killmail_data.get("zkb") or {}
+            return zkb.get("locationID") == self.id
+
+        prop = _FILTER_CHARACTER_PROPS.get(filter_type)
+        if not prop:
+            return False
+
+        key = f"{prop}_id"
+        victim = killmail_data.get("victim") or {}
+        return any(
+            character.get(key) == self.id
+            for character in (victim, *killmail_data.get("attackers", []))
+        )
+
+    def matches(self, killmail: Killmail) -> bool:
+        """Report whether a killmail matches this filter.
+
+        Filters for groups, constellations, regions and labels
+        can not be matched locally, because killmails do not contain that data.
+        They never match.
+        """
+        filter_type = FilterType(self.type)
+        if filter_type == FilterType.ALL:
+            return True
+
+        if filter_type == FilterType.SYSTEM:
+            return bool(killmail.solar_system and killmail.solar_system.id == self.id)
+
+        if filter_type == FilterType.LOCATION:
+            return bool(killmail.zkb and killmail.zkb.location_id == self.id)
+
+        prop = _FILTER_CHARACTER_PROPS.get(filter_type)
+        if not prop:
+            return False
+
+        characters = [killmail.victim] if killmail.victim else []
+        characters += killmail.attackers
+        for character in characters:
+            entity = getattr(character, prop)
+            if entity and entity.id == self.id:
+                return True
+
+        return False
+
+
+_ZKB_ONLY_FILTER_TYPES = frozenset(
+    {
+        FilterType.GROUP,
+        FilterType.CONSTELLATION,
+        FilterType.REGION,
+        FilterType.LABEL,
+    }
+)
+
+_FILTER_CHARACTER_PROPS = {
+    FilterType.ALLIANCE: "alliance",
+    FilterType.CHARACTER: "character",
+    FilterType.CORPORATION: "corporation",
+    FilterType.FACTION: "faction",
+    FilterType.SHIP: "ship_type",
+}
 
 
 class _Client(ABC):
-    """Base class for all client variants."""
-
-    def __init__(self) -> None:
+    """Base class for all client variants.
+
+    Args:
+        shards: Number of parallel websocket connections to spread the channels over.
+            Each connection reconnects on its own
+            and killmails received on several connections are only delivered once.
+        parse_workers: Number of worker processes for decoding and parsing killmails.
+            When 0 all killmails are parsed in the event loop.
+        parse_ordering: Order in which killmails parsed by worker processes
+            are delivered.
+        metrics: Where to record metrics. Metrics are not recorded when not set.
+        metrics_port: When set, metrics are exposed in the Prometheus text format
+            on this port under `/metrics`.
+        hooks: Hooks called around each processing stage of every killmail.
+        recorder: When set, all received raw frames are recorded with it.
+        ws_url: URL of the zKillboard websocket API.
+        esi_url: URL of the ESI endpoint for resolving names of IDs.
+        runtime: Runtime settings for the event loop and websocket connections.
+        history: When set, killmails missed while disconnected
+            are fetched from this source after reconnecting.
+        sinks: When set, each killmail is also dispatched to these sinks.
+            The registry is started and stopped together with the client.
+        ranker: When set, killmails are processed in priority lanes
+            assigned by this ranker.
+            Can not be combined with parse_workers.
+    """
+
+    def __init__(
+        self,
+        shards: int = 1,
+        parse_workers: int = 0,
+        parse_ordering: Ordering = Ordering.ARRIVAL,
+        metrics: Optional[Metrics] = None,
+        metrics_port: Optional[int] = None,
+        hooks: Optional[List[Hook]] = None,
+        recorder: Optional[StreamRecorder] = None,
+        ws_url: str = config.ZKB_WS_URL,
+        esi_url: str = ESI_EVEUNIVERSE_NAMES_URL,
+        runtime: Optional[config.RuntimeConfig] = None,
+        history: Optional[HistorySource] = None,
+        sinks: Optional[SinkRegistry] = None,
+        ranker: Optional[Ranker] = None,
+    ) -> None:
         super().__init__()
         self.channels = []
+        self.shards = max(1, shards)
+        self.parse_workers = max(0, parse_workers)
+        self.parse_ordering = Ordering(parse_ordering)
+        if metrics_port and not metrics:
+            metrics = InMemoryMetrics()
+        if metrics_port and not isinstance(metrics, InMemoryMetrics):
+            raise ValueError("metrics_port requires InMemoryMetrics")
+        if ranker and parse_workers:
+            raise ValueError("ranker can not be combined with parse_workers")
+        self.metrics = metrics or NullMetrics()
+        self.metrics_port = metrics_port
+        self.hooks = list(hooks) if hooks else []
+        self.recorder = recorder
+        self.ws_url = ws_url
+        self.esi_url = esi_url
+        self.runtime = runtime or config.RuntimeConfig()
+        self.history = history
+        self.sinks = sinks
+        self.ranker = ranker
+        self.last_killmail_id = 0
+        self.last_killmail_time: Optional[dt.datetime] = None
+        self._backfills: Dict[int, asyncio.Task] = {}
+        self._backfill_skipped = False
+        self._parser: Optional[ProcessPoolParser] = None
+        self._delivery_queue: Optional[asyncio.Queue] = None
+        self._scheduler: Optional[PriorityScheduler] = None
+        self._seen_killmail_ids = RecentIds(config.DEDUP_CACHE_SIZE)
+        self._tasks: Set[asyncio.Task] = set()
 
     @abstractmethod
     async def on_new_killmail(self, killmail: Killmail):
         """This method is called when a new killmail is received from zkillboard API."""
 
-    async def _subscribe_channels(self, ws: aiohttp.ClientWebSocketResponse):
-        for channel in self.channels:
+    def matches(self, killmail: Killmail) -> bool:
+        """Report whether a killmail belongs to the channels of this client.
+
+        Used for backfilled killmails, which are not filtered by zKillboard.
+        """
+        return True
+
+    def matches_data(self, killmail_data: dict) -> bool:
+        """Report whether raw data of a killmail may belong to the channels
+        of this client.
+
+        Used to skip backfilled killmails before they are parsed.
+        """
+        return True
+
+    def can_backfill(self) -> bool:
+        """Report whether backfilled killmails can be matched to this client."""
+        return True
+
+    def _is_wanted(self, killmail: Killmail) -> bool:
+        """Report whether a received killmail should be resolved and delivered."""
+        return True
+
+    def channel_shards(self) -> List[List[str]]:
+        """Return the channels split into one list per websocket connection."""
+        count = max(1, min(self.shards, len(self.channels)))
+        return [self.channels[num::count] for num in range(count)]
+
+    async def _subscribe_channels(
+        self, ws: aiohttp.ClientWebSocketResponse, channels: List[str]
+    ):
+        for channel in channels:
             await ws.send_json({"action": "sub", "channel": str(channel)})
             logger.info("subscribed to %s", channel)
 
-    async def _parse_killmail(self, killmail_data: dict):
-        killmail = Killmail.create_from_zkb_data(killmail_data)
-        await killmail.resolve_entities()
-        await self.on_new_killmail(killmail)
+    def _process_frame(self, data: str):
+        self.metrics.inc(MESSAGES_TOTAL)
+        if self._parser:
+            self._parser.submit(data)
+            return
+
+        context = KillmailContext(size=len(data)) if self.hooks else None
+        with self._stage("decode", context):
+            killmail_data = json.loads(data)
+            if context:
+                context.killmail_id = killmail_data.get("killmail_id")
+                context.attackers_count = len(killmail_data.get("attackers", []))
+        self._process_killmail_data(killmail_data, context)
+
+    def _process_killmail_data(
+        self, killmail_data: dict, context: Optional[KillmailContext] = None
+    ):
+        if not self._is_new_killmail(killmail_data["killmail_id"]):
+            return
+
+        if self._scheduler is not None:
+            lane = self.ranker.rank(killmail_data)
+            self._scheduler.put(lane, (killmail_data, context))
+            self.metrics.set_gauge(
+                LANE_QUEUE_SIZE, self._scheduler.qsize(lane), lane=lane.label
+            )
+            return
+
+        task = asyncio.create_task(self._parse_killmail(killmail_data, context))
+        self._track_task(task)
+
+    def _is_new_killmail(self, killmail_id: int) -> bool:
+        if not self._seen_killmail_ids.add(killmail_id):
+            logger.debug("Ignoring duplicate killmail: %s", killmail_id)
+            return False
+
+        logger.info("Received killmail: %s", killmail_id)
+        return True
+
+    def _track_task(self, task: asyncio.Task):
+        """Keep a reference to a running task and count it as in flight."""
+        self._tasks.add(task)
+        self.metrics.set_gauge(TASKS_IN_FLIGHT, len(self._tasks))
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self.metrics.set_gauge(TASKS_IN_FLIGHT, len(self._tasks))
+
+    def _start_stage(self, stage: str, context: Optional[KillmailContext]) -> float:
+        if context:
+            for hook in self.hooks:
+                hook.on_stage_start(stage, context)
+        return time.perf_counter()
+
+    def _end_stage(
+        self,
+        stage: str,
+        context: Optional[KillmailContext],
+        start: float,
+        error: Optional[BaseException] = None,
+    ):
+        duration = time.perf_counter() - start
+        self.metrics.observe(STAGE_SECONDS, duration, stage=stage)
+        if context:
+            context.durations[stage] = duration
+            for hook in self.hooks:
+                if error:
+                    hook.on_stage_error(stage, context, error)
+                hook.on_stage_end(stage, context, duration)
+
+    @contextlib.contextmanager
+    def _stage(self, stage: str, context: Optional[KillmailContext]) -> Iterator[None]:
+        """Run a stage, which is ended for hooks even when it fails."""
+        start = self._start_stage(stage, context)
+        try:
+            yield
+        except BaseException as ex:
+            self._end_stage(stage, context, start, ex)
+            raise
+        self._end_stage(stage, context, start)
+
+    async def _parse_killmail(
+        self, killmail_data: dict, context: Optional[KillmailContext] = None
+    ):
+        with self._stage("parse", context):
+            killmail = Killmail.create_from_zkb_data(killmail_data)
+        if not self._is_wanted(killmail):
+            return
+
+        try:
+            await self._resolve_killmail(killmail, context)
+        except aiohttp.ClientError as ex:
+            logger.error("Failed to resolve killmail %s: %s", killmail.id, ex)
+            return
+
+        await self._deliver_killmail(killmail, context)
+
+    async def _resolve_killmail(
+        self, killmail: Killmail, context: Optional[KillmailContext] = None
+    ):
+        with self._stage("resolve", context):
+            await killmail.resolve_entities(self.metrics, self.esi_url)
+
+    async def _deliver_killmail(
+        self, killmail: Killmail, context: Optional[KillmailContext] = None
+    ):
+        if killmail.id > self.last_killmail_id:
+            self.last_killmail_id = killmail.id
+            self.last_killmail_time = killmail.time
+        self.metrics.observe(
+            STREAM_LAG_SECONDS, time.time() - killmail.time.timestamp()
+        )
+        with self._stage("callback", context):
+            if self.sinks:
+                await self.sinks.dispatch(killmail)
+            await self.on_new_killmail(killmail)
+        if context:
+            for hook in self.hooks:
+                hook.on_killmail_end(context)
+
+    async def _consume_parsed_killmails(self):
+        """Start resolving killmails from the parser as they arrive."""
+        async for compact_killmail in self._parser.results():
+            if not self._is_new_killmail(compact_killmail.id):
+                continue
+
+            killmail = compact_killmail.to_killmail()
+            if not self._is_wanted(killmail):
+                continue
+
+            context = None
+            if self.hooks:
+                context = KillmailContext(
+                    killmail_id=killmail.id, attackers_count=len(killmail.attackers)
+                )
+            task = asyncio.create_task(self._resolve_killmail(killmail, context))
+            self._track_task(task)
+            await self._delivery_queue.put((killmail, context, task))
+
+    async def _deliver_in_order(self):
+        """Deliver resolved killmails in the order they were parsed."""
+        while True:
+            killmail, context, task = await self._delivery_queue.get()
+            try:
+                await task
+            except aiohttp.ClientError as ex:
+                logger.error("Failed to resolve killmail %s: %s", killmail.id, ex)
+            else:
+                await self._deliver_killmail(killmail, context)
+            finally:
+                self._delivery_queue.task_done()
+
+    async def _process_lanes(self):
+        """Process killmails from the priority lanes."""
+        while True:
+            lane, (killmail_data, context), queued_at = await self._scheduler.get()
+            self.metrics.set_gauge(
+                LANE_QUEUE_SIZE, self._scheduler.qsize(lane), lane=lane.label
+            )
+            try:
+                await self._parse_killmail(killmail_data, context)
+            except Exception:  # pylint: disable = broad-exception-caught
+                logger.exception(
+                    "Failed to process killmail %s", killmail_data["killmail_id"]
+                )
+            finally:
+                self._scheduler.task_done()
+            self.metrics.observe(
+                LANE_LATENCY_SECONDS, time.monotonic() - queued_at, lane=lane.label
+            )
 
     async def run_client(self):
         """Run the client for receiving events from the zkillboard websocket API."""
-
+        shards = self.channel_shards()
+        await self._run_pipeline(
+            [
+                self._run_connection(channels, shard)
+                for shard, channels in enumerate(shards)
+            ]
+        )
+
+    async def run_replay(self, source: ReplaySource):
+        """Process recorded frames from a replay source
+        and return once all killmails have been delivered.
+        """
+        await self._run_pipeline([self._replay(source)], until_idle=True)
+
+    async def _replay(self, source: ReplaySource):
+        async for data in source.frames():
+            self._process_frame(data)
+
+    async def _run_pipeline(self, producers: list, until_idle: bool = False):
+        """Run producers of frames together with the processing pipeline.
+
+        When until_idle is True,
+        return when all producers are done and all frames have been processed.
+        """
+        background = []
+        if self.parse_workers:
+            self._parser = ProcessPoolParser(
+                workers=self.parse_workers, ordering=self.parse_ordering
+            )
+            self._parser.start()
+            self._delivery_queue = asyncio.Queue()
+            background += [
+                asyncio.create_task(self._consume_parsed_killmails()),
+                asyncio.create_task(self._deliver_in_order()),
+            ]
+
+        if self.ranker:
+            self._scheduler = PriorityScheduler(self.runtime.max_lane_wait)
+            background += [
+                asyncio.create_task(self._process_lanes())
+                for _ in range(max(1, self.runtime.lane_workers))
+            ]
+
+        if self.sinks:
+            await self.sinks.start()
+
+        exporter = None
+        if self.metrics_port:
+            exporter = PrometheusExporter(self.metrics, port=self.metrics_port)
+            await exporter.start()
+            logger.info("Exposing metrics on port %d", self.metrics_port)
+
+        try:
+            if until_idle:
+                await asyncio.gather(*producers)
+                await self._wait_until_idle()
+            else:
+                await asyncio.gather(*producers, *background)
+        finally:
+            for task in background:
+                task.cancel()
+            if exporter:
+                await exporter.stop()
+            if self._parser:
+                self._parser.close()
+                self._parser = None
+            self._delivery_queue = None
+            self._scheduler = None
+            if self.recorder:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.recorder.close
+                )
+            if self.sinks:
+                await self.sinks.stop()
+
+    async def _wait_until_idle(self):
+        """Wait until all received frames have been processed."""
         while True:
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.ws_connect(config.ZKB_WS_URL) as ws:
-                        logger.info("Connected to zKillboard websocket API")
-                        await self._subscribe_channels(ws)
-
-                        async for msg in ws:
-                            if msg.type == aiohttp.WSMsgType.TEXT:
-                                killmail_data = msg.json()
-                                logger.info(
-                                    "Received killmail: %s",
-                                    killmail_data["killmail_id"],
-                                )
-                                asyncio.create_task(self._parse_killmail(killmail_data))
-
-                    logger.info("ZKB API closed connection")
-
-                except aiohttp.ClientError as ex:
-                    logger.error("client error when listening to websocket API: %s", ex)
-
-            logger.info(
-                "Trying to re-connect to ZKB API in %d seconds",
-                config.RECONNECT_TIMEOUT_SECONDS,
+            if self._tasks:
+                await asyncio.wait(list(self._tasks))
+                continue
+
+            if self._parser and self._parser.in_progress:
+                await asyncio.sleep(0.01)
+                continue
+
+            if self._delivery_queue:
+                await self._delivery_queue.join()
+
+            if self._scheduler is not None:
+                await self._scheduler.join()
+
+            if not self._tasks:
+                return
+
+    async def _run_connection(self, channels: List[str], shard: int):
+        """Run one websocket connection for the given channels.
+
+        Reconnects with exponential backoff when the connection is lost
+        and immediately when it has stalled.
+        """
+        runtime = self.runtime
+        backoff = Backoff(runtime.reconnect_delay, runtime.max_reconnect_delay)
+        watchdog = None
+        if runtime.max_inactivity_timeout:
+            watchdog = InactivityWatchdog(
+                runtime.min_inactivity_timeout, runtime.max_inactivity_timeout
             )
-            await asyncio.sleep(config.RECONNECT_TIMEOUT_SECONDS)
+
+        connected_before = False
+        # last delivered killmail when this shard lost its connection
+        disconnected_after: Optional[Tuple[int, Optional[dt.datetime]]] = None
+        async with aiohttp.ClientSession(read_bufsize=runtime.read_bufsize) as session:
+            standby: Optional[asyncio.Task] = None
+            try:
+                while True:
+                    stalled = False
+                    try:
+                        ws = await self._take_standby(standby)
+                        standby = None
+                        if not ws:
+                            ws = await self._ws_connect(session)
+                        logger.info(
+                            "Shard %d: Connected to zKillboard websocket API", shard
+                        )
+                        await self._subscribe_channels(ws, channels)
+                        if disconnected_after:
+                            self._start_backfill(shard, *disconnected_after)
+                            disconnected_after = None
+                        connected_before = True
+                        if runtime.standby:
+                            standby = asyncio.create_task(self._ws_connect(session))
+                        try:
+                            stalled = await self._receive_frames(ws, watchdog, backoff)
+                        finally:
+                            await self._close_websocket(ws, stalled)
+
+                        if not stalled:
+                            logger.info("Shard %d: ZKB API closed connection", shard)
+
+                    except aiohttp.ClientError as ex:
+                        logger.error(
+                            "Shard %d: client error "
+                            "when listening to websocket API: %s",
+                            shard,
+                            ex,
+                        )
+
+                    if connected_before and not disconnected_after:
+                        disconnected_after = (
+                            self.last_killmail_id,
+                            self.last_killmail_time,
+                        )
+                    self.metrics.inc(RECONNECTS_TOTAL, shard=str(shard))
+                    if stalled:
+                        logger.warning(
+                            "Shard %d: No messages received for %.0f seconds. "
+                            "Re-connecting to ZKB API now",
+                            shard,
+                            watchdog.timeout(),
+                        )
+                        self.metrics.inc(STALLS_TOTAL, shard=str(shard))
+                        continue
+
+                    if self._is_standby_ready(standby):
+                        continue
+
+                    delay = backoff.next_delay()
+                    logger.info(
+                        "Shard %d: Trying to re-connect to ZKB API in %.1f seconds",
+                        shard,
+                        delay,
+                    )
+                    await asyncio.sleep(delay)
+            finally:
+                if standby:
+                    standby.cancel()
+                    ws = await self._take_standby(standby)
+                    if ws:
+                        await ws.close()
+
+    def _start_backfill(self, shard: int, after_id: int, since: Optional[dt.datetime]):
+        """Start fetching killmails a shard has missed after the given killmail.
+
+        Each shard is backfilled from the last killmail delivered
+        when it lost its connection,
+        because other shards may have delivered newer killmails since.
+        """
+        if not self.history or not since:
+            return
+        if not self.can_backfill():
+            if not self._backfill_skipped:
+                logger.warning(
+                    "Not backfilling missed killmails, "
+                    "because the channels can only be matched by zKillboard"
+                )
+                self._backfill_skipped = True
+            return
+        backfill = self._backfills.get(shard)
+        if backfill and not backfill.done():
+            return
+
+        backfill = asyncio.create_task(self._backfill_killmails(since, after_id))
+        self._backfills[shard] = backfill
+        self._track_task(backfill)
+
+    async def _backfill_killmails(self, since: dt.datetime, after_id: int):
+        async for killmail_data in backfill_killmails(
+            self.history,
+            since=since,
+            after_id=after_id,
+            is_known=self._seen_killmail_ids.__contains__,
+            concurrency=self.runtime.backfill_concurrency,
+            limit=self.runtime.max_backfill_killmails,
+            metrics=self.metrics,
+        ):
+            if not self.matches_data(killmail_data):
+                continue
+            if not self._is_new_killmail(killmail_data["killmail_id"]):
+                continue
+
+            killmail = Killmail.create_from_zkb_data(killmail_data)
+            if not self.matches(killmail):
+                continue
+
+            try:
+                await self._resolve_killmail(killmail)
+            except aiohttp.ClientError as ex:
+                logger.error("Failed to resolve killmail %s: %s", killmail.id, ex)
+                continue
+
+            await self._deliver_killmail(killmail)
+
+    async def _ws_connect(
+        self, session: aiohttp.ClientSession
+    ) -> aiohttp.ClientWebSocketResponse:
+        return await session.ws_connect(
+            self.ws_url,
+            heartbeat=self.runtime.heartbeat,
+            max_msg_size=self.runtime.max_msg_size,
+            compress=self.runtime.compress,
+        )
+
+    @staticmethod
+    def _is_standby_ready(standby: Optional[asyncio.Task]) -> bool:
+        return bool(
+            standby
+            and standby.done()
+            and not standby.cancelled()
+            and not standby.exception()
+            and not standby.result().closed
+        )
+
+    @staticmethod
+    async def _take_standby(
+        standby: Optional[asyncio.Task],
+    ) -> Optional[aiohttp.ClientWebSocketResponse]:
+        """Return the standby connection when it is open, else None."""
+        if not standby:
+            return None
+        try:
+            ws = await standby
+        except (asyncio.CancelledError, aiohttp.ClientError):
+            return None
+        if ws.closed:
+            return None
+        return ws
+
+    async def _receive_frames(
+        self,
+        ws: aiohttp.ClientWebSocketResponse,
+        watchdog: Optional[InactivityWatchdog],
+        backoff: Backoff,
+    ) -> bool:
+        """Receive frames until the connection is closed.
+
+        Return True when the connection was given up because it stalled.
+        """
+        reader = asyncio.create_task(self._read_frames(ws, watchdog, backoff))
+        try:
+            if not watchdog:
+                await reader
+                return False
+
+            watchdog.start()
+            while True:
+                await asyncio.wait([reader], timeout=watchdog.remaining())
+                if reader.done():
+                    reader.result()
+                    return False
+                if watchdog.is_stalled():
+                    return True
+        finally:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+
+    async def _read_frames(
+        self,
+        ws: aiohttp.ClientWebSocketResponse,
+        watchdog: Optional[InactivityWatchdog],
+        backoff: Backoff,
+    ):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                if watchdog:
+                    watchdog.record_message()
+                backoff.reset()
+                if self.recorder:
+                    self.recorder.write(msg.data)
+                self._process_frame(msg.data)
+
+    @staticmethod
+    async def _close_websocket(ws: aiohttp.ClientWebSocketResponse, stalled: bool):
+        if not stalled:
+            await ws.close()
+            return
+
+        # A stalled peer will likely not answer the close handshake
+        try:
+            await asyncio.wait_for(ws.close(), STALLED_CLOSE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
 
     def run(self):
         """Run the client standalone."""
+        import aiorun  # imported here to keep import time low
+
         logging.basicConfig(level=config.LOG_LEVEL_DEFAULT, format=config.LOG_FORMAT)
-        aiorun.run(self.run_client())
+        use_uvloop = self.runtime.use_uvloop and config.uvloop_available()
+        if use_uvloop:
+            logger.info("Using uvloop")
+        aiorun.run(self.run_client(), use_uvloop=use_uvloop)
 
 
 class ClientKillStream(_Client):
     """A client for receiving the complete killmail stream."""
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
         self.channels = ["killstream"]
 
 
 class ClientFiltered(_Client):
-    """A client for receiving killmails from filtered channels."""
-
-    def __init__(self, filters: List[Filter]) -> None:
-        super().__init__()
-        self.channels = [filter.channel() for filter in filters]
+    """A client for receiving killmails from filtered channels.
+
+    Filters which zKillboard does not support, e.g. a `ProximityFilter`,
+    subscribe to the complete killstream and are matched locally.
+    Then all received killmails are matched against all filters.
+    Because of that they can not be combined with filters
+    for groups, constellations, regions or labels,
+    which can only be matched by zKillboard.
+
+    Raises ValueError when filters can not be combined.
+    """
+
+    def __init__(self, filters: List[Filter], **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.filters = list(filters)
+        self.channels = list(dict.fromkeys(filter.channel() for filter in filters))
+        self._filter_locally = any(not isinstance(obj, Filter) for obj in self.filters)
+        if self._filter_locally:
+            channels = [
+                obj.channel()
+                for obj in self.filters
+                if isinstance(obj, Filter) and not obj.can_match_locally()
+            ]
+            if channels:
+                raise ValueError(
+                    "Filters which are matched locally can not be combined "
+                    f"with these channels: {', '.join(channels)}"
+                )
+
+    def matches(self, killmail: Killmail) -> bool:
+        return any(obj.matches(killmail) for obj in self.filters)
+
+    def matches_data(self, killmail_data: dict) -> bool:
+        return any(
+            not hasattr(obj, "matches_data") or obj.matches_data(killmail_data)
+            for obj in self.filters
+        )
+
+    def can_backfill(self) -> bool:
+        return any(
+            not isinstance(obj, Filter) or obj.can_match_locally()
+            for obj in self.filters
+        )
+
+    def _is_wanted(self, killmail: Killmail) -> bool:
+        return not self._filter_locally or self.matches(killmail)
 
 
 class ClientPublic(_Client):
     """A client for receiving items from the public channel.."""
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
         self.channels = ["killstream"]
@@ -1,8 +1,70 @@
 """Configuration for zkillboard."""
 
+import importlib.util
+from dataclasses import dataclass
+from typing import Optional
+
 ZKB_WS_URL = "wss://zkillboard.com/websocket/"
 
 RECONNECT_TIMEOUT_SECONDS = 3
 
+DEDUP_CACHE_SIZE = 10_000
+
 LOG_LEVEL_DEFAULT = "INFO"
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+
+def uvloop_available() -> bool:
+    """Report whether uvloop is installed."""
+    return importlib.util.find_spec("uvloop") is not None
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """Runtime settings of a client.
+
+    Args:
+        use_uvloop: Run the client with uvloop, when it is installed.
+        heartbeat: Seconds between pings to the websocket server.
+            The connection is closed when a pong does not arrive in time.
+            Disabled when None.
+        max_msg_size: Maximum size of a websocket message in bytes.
+            Killmails from large fights can be several MB.
+        read_bufsize: Size of the read buffer of a websocket connection in bytes.
+        compress: Window bits for the permessage-deflate websocket extension.
+            Compression is not negotiated when 0.
+        reconnect_delay: Seconds before the first retry to connect.
+            Further retries back off exponentially with jitter.
+        max_reconnect_delay: Maximum seconds between retries to connect.
+        min_inactivity_timeout: Minimum seconds without messages
+            before a connection is considered stalled.
+        max_inactivity_timeout: Maximum seconds without messages
+            before a connection is considered stalled.
+            The inactivity watchdog is disabled when None, which is the default,
+            because filtered channels can be quiet for long periods.
+        standby: Keep an idle standby connection open,
+            which takes over immediately when the active connection fails.
+        backfill_concurrency: Maximum number of missed killmails
+            to fetch at the same time after a reconnect.
+        max_backfill_killmails: Maximum number of missed killmails
+            to fetch after a reconnect.
+        lane_workers: Number of killmails processed at the same time,
+            when killmails are processed in priority lanes.
+        max_lane_wait: Seconds after which a killmail from a lower priority lane
+            is processed ahead of higher priority lanes.
+    """
+
+    use_uvloop: bool = False
+    heartbeat: Optional[float] = 30.0
+    max_msg_size: int = 32 * 1024 * 1024
+    read_bufsize: int = 256 * 1024
+    compress: int = 15
+    reconnect_delay: float = RECONNECT_TIMEOUT_SECONDS
+    max_reconnect_delay: float = 60.0
+    min_inactivity_timeout: float = 30.0
+    max_inactivity_timeout: Optional[float] = None
+    standby: bool = False
+    backfill_concurrency: int = 10
+    max_backfill_killmails: int = 1000
+    lane_workers: int = 20
+    max_lane_wait: float = 5.0
@@ -0,0 +1,115 @@
+"""Helpers for keeping websocket connections alive."""
+
+import random
+import time
+from typing import Optional
+
+
+class Backoff:
+    """Exponential backoff with jitter for reconnecting.
+
+    Each delay is the base delay doubled for every failed attempt,
+    capped at the maximum and then reduced randomly by up to the jitter fraction,
+    so that many clients do not reconnect at the same time.
+
+    Args:
+        initial: Delay in seconds before the first retry.
+        maximum: Maximum delay in seconds.
+        jitter: Fraction by which each delay is randomly reduced.
+    """
+
+    def __init__(
+        self,
+        initial: float = 1.0,
+        maximum: float = 60.0,
+        jitter: float = 0.5,
+        rnd: Optional[random.Random] = None,
+    ) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempts = 0
+        self._random = rnd or random.Random()
+
+    def next_delay(self) -> float:
+        """Return the delay before the next retry and count the attempt."""
+        delay = min(self.maximum, self.initial * 2**self.attempts)
+        self.attempts += 1
+        return delay * (1 - self.jitter * self._random.random())
+
+    def reset(self):
+        """Start again with the initial delay, e.g. after a successful connect."""
+        self.attempts = 0
+
+
+class InactivityWatchdog:
+    """Detects a connection which has stopped receiving messages.
+
+    The timeout follows the expected message rate,
+    which is estimated as moving average of the intervals between messages.
+    A connection is considered stalled,
+    when no message has arrived for factor times the average interval.
+    The timeout is always kept between the minimum and maximum.
+
+    Args:
+        min_timeout: Minimum seconds without messages before a stall is detected.
+        max_timeout: Maximum seconds without messages before a stall is detected.
+            Also used while the message rate is unknown.
+        factor: Multiple of the average interval between messages.
+        smoothing: Weight of the latest interval for the moving average.
+    """
+
+    def __init__(
+        self,
+        min_timeout: float = 30.0,
+        max_timeout: float = 600.0,
+        factor: float = 20.0,
+        smoothing: float = 0.05,
+    ) -> None:
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.smoothing = smoothing
+        self.average_interval: Optional[float] = None
+        self._last_message = time.monotonic()
+        self._has_message = False
+
+    def start(self, now: Optional[float] = None):
+        """Start watching a new connection.
+
+        The estimated message rate is kept from previous connections.
+        """
+        self._last_message = time.monotonic() if now is None else now
+        self._has_message = False
+
+    def record_message(self, now: Optional[float] = None):
+        """Record that a message has arrived."""
+        now = time.monotonic() if now is None else now
+        if self._has_message:
+            interval = now - self._last_message
+            if self.average_interval is None:
+                self.average_interval = interval
+            else:
+                self.average_interval += self.smoothing * (
+                    interval - self.average_interval
+                )
+        self._last_message = now
+        self._has_message = True
+
+    def timeout(self) -> float:
+        """Return the current timeout in seconds."""
+        if self.average_interval is None:
+            return self.max_timeout
+        return min(
+            self.max_timeout,
+            max(self.min_timeout, self.factor * self.average_interval),
+        )
+
+    def remaining(self, now: Optional[float] = None) -> float:
+        """Return seconds left until the connection is considered stalled."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._last_message + self.timeout() - now)
+
+    def is_stalled(self, now: Optional[float] = None) -> bool:
+        """Report whether the connection is considered stalled."""
+        return self.remaining(now) <= 0
@@ -1,12 +1,13 @@
 """Accessing ESI."""
 
 import logging
-from typing import Collection, Dict
+from typing import Collection, Dict, Optional
 
 import aiohttp
 
 from .eveuniverse import EveEntity
 from .helpers import chunks
+from .metrics import ESI_IDS_TOTAL, ESI_REQUESTS_TOTAL, Metrics
 
 ESI_EVEUNIVERSE_NAMES_URL = "https://esi.evetech.net/latest/universe/names"
 
@@ -14,15 +15,26 @@ ESI_EVEUNIVERSE_NAMES_URL = "https://esi.evetech.net/latest/universe/names"
 logger = logging.getLogger("zkillboard")
 
 
-async def create_eve_entities_from_ids(ids: Collection[int]) -> Dict[int, EveEntity]:
-    """Create EveEntity objects from IDs."""
+async def create_eve_entities_from_ids(
+    ids: Collection[int],
+    metrics: Optional[Metrics] = None,
+    url: str = ESI_EVEUNIVERSE_NAMES_URL,
+) -> Dict[int, EveEntity]:
+    """Create EveEntity objects from IDs.
+
+    Raises aiohttp.ClientResponseError when ESI responds with an error.
+    """
     ids = list({int(id) for id in ids if id != 1})  # 1 is not a valid ID
 
     data = []
     async with aiohttp.ClientSession() as session:
         for ids_chunk in chunks(ids, 999):
             logger.info("Requesting details from ESI for %d IDs", len(ids_chunk))
-            async with session.post(ESI_EVEUNIVERSE_NAMES_URL, json=ids_chunk) as resp:
+            if metrics:
+                metrics.inc(ESI_REQUESTS_TOTAL)
+                metrics.inc(ESI_IDS_TOTAL, len(ids_chunk))
+            async with session.post(url, json=ids_chunk) as resp:
+                resp.raise_for_status()
                 data += await resp.json()
                 logger.debug("Received response from ESI: %s", data)
 
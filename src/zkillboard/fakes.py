@@ -0,0 +1,344 @@
+"""Local fake servers of zKillboard and ESI for load tests."""
+
+# pylint: disable = redefined-builtin
+
+import asyncio
+import datetime as dt
+import json
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from aiohttp import WSMsgType, web
+
+
+def synthetic_killmail_data(
+    killmail_id: int, attackers: int = 10, rnd: Optional[random.Random] = None
+) -> dict:
+    """Return raw data of a synthetic killmail as sent by the zkillboard WS API."""
+    rnd = rnd or random.Random(killmail_id)
+    now = dt.datetime.now(dt.timezone.utc)
+    value = rnd.uniform(1_000_000, 1_000_000_000)
+
+    def character() -> dict:
+        return {
+            "character_id": rnd.randint(90_000_000, 98_000_000),
+            "corporation_id": rnd.randint(98_000_000, 99_000_000),
+            "alliance_id": rnd.randint(99_000_000, 99_100_000),
+            "ship_type_id": rnd.randint(580, 35_000),
+        }
+
+    attackers_data = []
+    for num in range(max(1, attackers)):
+        attacker = character()
+        attacker["damage_done"] = rnd.randint(1, 10_000)
+        attacker["final_blow"] = num == 0
+        attacker["security_status"] = round(rnd.uniform(-10, 5), 1)
+        attacker["weapon_type_id"] = rnd.randint(580, 35_000)
+        attackers_data.append(attacker)
+
+    victim = character()
+    victim["damage_taken"] = rnd.randint(1, 100_000)
+    victim["position"] = {
+        "x": rnd.uniform(-1e12, 1e12),
+        "y": rnd.uniform(-1e12, 1e12),
+        "z": rnd.uniform(-1e12, 1e12),
+    }
+    return {
+        "attackers": attackers_data,
+        "killmail_id": killmail_id,
+        "killmail_time": now.strftime(r"%Y-%m-%dT%H:%M:%SZ"),
+        "solar_system_id": rnd.randint(30_000_001, 30_005_000),
+        "victim": victim,
+        "zkb": {
+            "locationID": rnd.randint(40_000_000, 40_500_000),
+            "hash": f"{rnd.getrandbits(160):040x}",
+            "fittedValue": value,
+            "totalValue": value,
+            "points": rnd.randint(1, 100),
+            "npc": False,
+            "solo": attackers == 1,
+            "awox": False,
+            "url": f"https://zkillboard.com/kill/{killmail_id}/",
+        },
+    }
+
+
+def synthetic_frames(start_id: int = 1, attackers: int = 10) -> Iterator[str]:
+    """Yield an endless sequence of raw frames with synthetic killmails."""
+    killmail_id = start_id
+    while True:
+        yield json.dumps(synthetic_killmail_data(killmail_id, attackers))
+        killmail_id += 1
+
+
+class _FakeServer(ABC):
+    """Base class for fake servers."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    @abstractmethod
+    def _make_app(self) -> web.Application:
+        """Return the application of this server."""
+
+    async def start(self):
+        """Start the server. When port is 0 a free port is chosen."""
+        self._runner = web.AppRunner(self._make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if not self.port:
+            self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        """Stop the server."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeZkbServer(_FakeServer):
+    """A fake zKillboard websocket server, which pushes killmails to all clients.
+
+    Frames are sent at a steady rate once the first client has connected.
+    Optionally an additional burst of frames is sent in regular intervals.
+
+    Args:
+        frames: Raw frames to send, e.g. from `synthetic_frames()` or a recording.
+        rate: Frames to send per second.
+        burst_size: Number of frames to send at once for each burst.
+        burst_interval: Seconds between bursts. Bursts are disabled when 0.
+    """
+
+    path = "/websocket/"
+
+    def __init__(
+        self,
+        frames: Iterable[str],
+        rate: float = 10,
+        burst_size: int = 0,
+        burst_interval: float = 0,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.frames = iter(frames)
+        self.rate = rate
+        self.burst_size = burst_size
+        self.burst_interval = burst_interval
+        self.sent_at: Dict[int, float] = {}
+        self.connections = 0
+        self.subscriptions: List[str] = []
+        self._clients: Set[web.WebSocketResponse] = set()
+        self._pusher: Optional[asyncio.Task] = None
+        self._client_connected = asyncio.Event()
+
+    @property
+    def url(self) -> str:
+        """Return URL of the websocket endpoint."""
+        return f"ws://{self.host}:{self.port}{self.path}"
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(self.path, self._handle_websocket)
+        return app
+
+    async def start(self):
+        await super().start()
+        self._pusher = asyncio.create_task(self._push_frames())
+
+    async def stop(self):
+        if self._pusher:
+            self._pusher.cancel()
+            self._pusher = None
+        for ws in list(self._clients):
+            await ws.close()
+        await super().stop()
+
+    async def _handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.add(ws)
+        self.connections += 1
+        self._client_connected.set()
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    data = msg.json()
+                    if data.get("action") == "sub":
+                        self.subscriptions.append(data["channel"])
+        finally:
+            self._clients.discard(ws)
+        return ws
+
+    async def _push_frames(self):
+        await self._client_connected.wait()
+        started = time.monotonic()
+        next_burst = started + self.burst_interval
+        sent = 0
+        while True:
+            amount = 1
+            now = time.monotonic()
+            if self.burst_interval and self.burst_size and now >= next_burst:
+                amount += self.burst_size
+                next_burst += self.burst_interval
+
+            for _ in range(amount):
+                if not await self._send_next_frame():
+                    return
+
+            sent += 1
+            delay = started + sent / self.rate - time.monotonic()
+            await asyncio.sleep(max(0, delay))
+
+    async def _send_next_frame(self) -> bool:
+        try:
+            data = next(self.frames)
+        except StopIteration:
+            return False
+
+        killmail_id = json.loads(data)["killmail_id"]
+        self.sent_at[killmail_id] = time.time()
+        for ws in list(self._clients):
+            try:
+                await ws.send_str(data)
+            except ConnectionError:
+                self._clients.discard(ws)
+        return True
+
+
+class FakeEsiServer(_FakeServer):
+    """A fake ESI server for the `/universe/names/` endpoint.
+
+    Args:
+        latency: Seconds to wait before responding.
+        error_rate: Fraction of requests to fail with a 502 error.
+        rate_limit: Maximum number of requests per second.
+            Requests over the limit fail with a 420 error. Unlimited when 0.
+    """
+
+    path = "/latest/universe/names"
+
+    def __init__(
+        self,
+        latency: float = 0,
+        error_rate: float = 0,
+        rate_limit: float = 0,
+        seed: Optional[int] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._tokens = rate_limit
+        self._tokens_updated = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        """Return URL of the names endpoint."""
+        return f"http://{self.host}:{self.port}{self.path}"
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_names)
+        return app
+
+    def _take_token(self) -> bool:
+        if not self.rate_limit:
+            return True
+
+        now = time.monotonic()
+        self._tokens = min(
+            self.rate_limit,
+            self._tokens + (now - self._tokens_updated) * self.rate_limit,
+        )
+        self._tokens_updated = now
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    async def _handle_names(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._take_token():
+            self.errors += 1
+            return web.json_response({"error": "rate limited"}, status=420)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": "bad gateway"}, status=502)
+
+        ids = await request.json()
+        data = [{"id": id, "name": f"Name {id}", "category": "character"} for id in ids]
+        return web.json_response(data)
+
+
+class FakeHistoryServer(_FakeServer):
+    """A fake of the zKillboard history API and the ESI killmails endpoint.
+
+    Args:
+        killmails: Raw data of the killmails to serve,
+            e.g. from `synthetic_killmail_data()`.
+        latency: Seconds to wait before responding to a killmail request.
+    """
+
+    def __init__(self, killmails: Iterable[dict], latency: float = 0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.killmails = {obj["killmail_id"]: obj for obj in killmails}
+        self.latency = latency
+        self.requests = 0
+        self.max_concurrent_requests = 0
+        self._concurrent_requests = 0
+
+    @property
+    def history_url(self) -> str:
+        """Return URL of the history API."""
+        return f"http://{self.host}:{self.port}/api/history/"
+
+    @property
+    def killmails_url(self) -> str:
+        """Return URL of the killmails endpoint."""
+        return f"http://{self.host}:{self.port}/latest/killmails/"
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/history/{day}.json", self._handle_history)
+        app.router.add_get("/latest/killmails/{id}/{hash}/", self._handle_killmail)
+        return app
+
+    async def _handle_history(self, request: web.Request) -> web.Response:
+        day = request.match_info["day"]
+        data = {
+            str(id): obj["zkb"]["hash"]
+            for id, obj in self.killmails.items()
+            if obj["killmail_time"][:10].replace("-", "") == day
+        }
+        return web.json_response(data)
+
+    async def _handle_killmail(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        self._concurrent_requests += 1
+        self.max_concurrent_requests = max(
+            self.max_concurrent_requests, self._concurrent_requests
+        )
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            killmail = self.killmails.get(int(request.match_info["id"]))
+            if not killmail or killmail["zkb"]["hash"] != request.match_info["hash"]:
+                return web.json_response({"error": "not found"}, status=404)
+            data = {key: value for key, value in killmail.items() if key != "zkb"}
+            return web.json_response(data)
+        finally:
+            self._concurrent_requests -= 1
@@ -1,7 +1,56 @@
 """Helpers for zkillboard."""
 
+# pylint: disable = redefined-builtin
+
+import datetime as dt
+import enum
+from collections import deque
+from typing import Any, Deque, Set
+
 
 def chunks(lst, size):
     """Yield successive sized chunks from lst."""
     for i in range(0, len(lst), size):
         yield lst[i : i + size]
+
+
+def json_default(obj: Any) -> Any:
+    """Serialize objects not supported by the json module.
+
+    To be used as `default` for `json.dumps()`.
+    """
+    if isinstance(obj, dt.datetime):
+        return obj.isoformat()
+    if isinstance(obj, enum.Enum):
+        return obj.name.lower()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RecentIds:
+    """A bounded set of recently seen IDs.
+
+    When full the oldest IDs are forgotten first.
+    """
+
+    def __init__(self, maxlen: int) -> None:
+        self.maxlen = maxlen
+        self._ids: Set[int] = set()
+        self._order: Deque[int] = deque()
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, id: int) -> bool:
+        """Add an ID. Return True when it was not seen before, else False."""
+        if id in self._ids:
+            return False
+
+        self._ids.add(id)
+        self._order.append(id)
+        if len(self._order) > self.maxlen:
+            self._ids.discard(self._order.popleft())
+
+        return True
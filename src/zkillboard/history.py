@@ -0,0 +1,139 @@
+"""Backfilling killmails missed while disconnected from a history source."""
+
+# pylint: disable = redefined-builtin
+
+import asyncio
+import datetime as dt
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import aiohttp
+
+from .metrics import BACKFILL_KILLMAILS_TOTAL, Metrics, NullMetrics
+
+ZKB_HISTORY_URL = "https://zkillboard.com/api/history/"
+ESI_KILLMAILS_URL = "https://esi.evetech.net/latest/killmails/"
+
+logger = logging.getLogger("zkillboard")
+
+
+class HistorySource(ABC):
+    """A source of past killmails."""
+
+    @abstractmethod
+    async def killmail_hashes(
+        self, session: aiohttp.ClientSession, day: dt.date
+    ) -> Dict[int, str]:
+        """Return the IDs and hashes of all killmails of a day."""
+
+    @abstractmethod
+    async def killmail_data(
+        self, session: aiohttp.ClientSession, id: int, hash: str
+    ) -> dict:
+        """Return raw data of a killmail in the format of the zkillboard WS API."""
+
+
+class ZkbHistorySource(HistorySource):
+    """Past killmails from the zKillboard history API and ESI.
+
+    The history API lists IDs and hashes of the killmails of a day,
+    which are then fetched from ESI.
+    Killmails from ESI only have the hash as zkb data.
+
+    Args:
+        history_url: URL of the zKillboard history API.
+        killmails_url: URL of the ESI killmails endpoint.
+    """
+
+    def __init__(
+        self, history_url: str = ZKB_HISTORY_URL, killmails_url: str = ESI_KILLMAILS_URL
+    ) -> None:
+        self.history_url = history_url.rstrip("/")
+        self.killmails_url = killmails_url.rstrip("/")
+
+    async def killmail_hashes(
+        self, session: aiohttp.ClientSession, day: dt.date
+    ) -> Dict[int, str]:
+        url = f"{self.history_url}/{day:%Y%m%d}.json"
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        return {int(id): hash for id, hash in data.items()}
+
+    async def killmail_data(
+        self, session: aiohttp.ClientSession, id: int, hash: str
+    ) -> dict:
+        url = f"{self.killmails_url}/{id}/{hash}/"
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        data["zkb"] = {"hash": hash}
+        return data
+
+
+async def backfill_killmails(
+    source: HistorySource,
+    since: dt.datetime,
+    after_id: int,
+    is_known: Callable[[int], bool],
+    concurrency: int = 10,
+    limit: int = 1000,
+    metrics: Optional[Metrics] = None,
+) -> AsyncIterator[dict]:
+    """Yield raw data of killmails missed since a point in time.
+
+    Killmails are missed when their ID is higher than the last seen ID
+    and they are not already known.
+    Killmails are fetched concurrently and yielded as they arrive.
+    Killmails which can not be fetched are skipped.
+
+    Args:
+        source: Source to fetch past killmails from.
+        since: Time of the last seen killmail.
+        after_id: ID of the last seen killmail.
+        is_known: Report whether a killmail ID has already been received.
+        concurrency: Maximum number of killmails to fetch at the same time.
+        limit: Maximum number of killmails to fetch. The oldest are fetched first.
+    """
+    metrics = metrics or NullMetrics()
+    async with aiohttp.ClientSession() as session:
+        hashes: Dict[int, str] = {}
+        day = since.astimezone(dt.timezone.utc).date()
+        today = dt.datetime.now(dt.timezone.utc).date()
+        while day <= today:
+            try:
+                hashes.update(await source.killmail_hashes(session, day))
+            except aiohttp.ClientError as ex:
+                logger.error("Failed to fetch killmail history for %s: %s", day, ex)
+            day += dt.timedelta(days=1)
+
+        ids = sorted(id for id in hashes if id > after_id and not is_known(id))
+        if len(ids) > limit:
+            logger.warning(
+                "Backfilling only %d of %d missed killmails", limit, len(ids)
+            )
+            ids = ids[:limit]
+        logger.info("Backfilling %d missed killmails", len(ids))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(id: int) -> Optional[dict]:
+            async with semaphore:
+                try:
+                    return await source.killmail_data(session, id, hashes[id])
+                except aiohttp.ClientError as ex:
+                    logger.error("Failed to backfill killmail %d: %s", id, ex)
+                    return None
+
+        tasks = [asyncio.create_task(fetch(id)) for id in ids]
+        try:
+            for future in asyncio.as_completed(tasks):
+                killmail_data = await future
+                if killmail_data:
+                    metrics.inc(BACKFILL_KILLMAILS_TOTAL)
+                    yield killmail_data
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,128 @@
+"""Hooks for tracing and profiling the processing of single killmails."""
+
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class KillmailContext:
+    """Information about a killmail passed to hooks.
+
+    The killmail ID and attacker count are not yet known
+    when the decode stage starts.
+    """
+
+    killmail_id: Optional[int] = None
+    attackers_count: int = 0
+    size: int = 0
+    durations: Dict[str, float] = field(default_factory=dict)
+    spans: Dict[str, Any] = field(default_factory=dict)
+
+    def total_duration(self) -> float:
+        """Return the sum of all stage durations in seconds."""
+        return sum(self.durations.values())
+
+
+class Hook:
+    """Base class for hooks, which are called around each processing stage.
+
+    The stages are: decode, parse, resolve and callback.
+    Override the methods of interest.
+    """
+
+    def on_stage_start(self, stage: str, context: KillmailContext):
+        """Called when a stage starts for a killmail."""
+
+    def on_stage_error(
+        self, stage: str, context: KillmailContext, error: BaseException
+    ):
+        """Called when a stage has failed for a killmail, before it ends."""
+
+    def on_stage_end(self, stage: str, context: KillmailContext, duration: float):
+        """Called when a stage has ended for a killmail, also when it failed."""
+
+    def on_killmail_end(self, context: KillmailContext):
+        """Called after a killmail has been delivered."""
+
+
+@dataclass(frozen=True)
+class ProfileEntry:
+    """A profiled killmail."""
+
+    killmail_id: Optional[int]
+    attackers_count: int
+    size: int
+    total_duration: float
+    durations: Dict[str, float]
+
+
+class SlowestKillmailsProfiler(Hook):
+    """Records the N slowest killmails with their per-stage breakdown."""
+
+    def __init__(self, size: int = 10) -> None:
+        self.size = size
+        self._heap: List[Tuple[float, int, ProfileEntry]] = []
+        self._counter = itertools.count()
+
+    def on_killmail_end(self, context: KillmailContext):
+        total = context.total_duration()
+        if len(self._heap) >= self.size and total <= self._heap[0][0]:
+            return
+
+        entry = ProfileEntry(
+            killmail_id=context.killmail_id,
+            attackers_count=context.attackers_count,
+            size=context.size,
+            total_duration=total,
+            durations=dict(context.durations),
+        )
+        item = (total, next(self._counter), entry)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+
+    def slowest(self) -> List[ProfileEntry]:
+        """Return the recorded killmails, slowest first."""
+        return [item[2] for item in sorted(self._heap, reverse=True)]
+
+
+class OpenTelemetryHook(Hook):
+    """Creates one span per stage and killmail with an OpenTelemetry style tracer.
+
+    The tracer must provide `start_span(name)`,
+    which returns a span with `set_attribute(key, value)` and `end()` methods.
+    Spans of failed stages get the attributes `error` and `error.type`.
+    """
+
+    def __init__(self, tracer: Any, prefix: str = "zkillboard") -> None:
+        self.tracer = tracer
+        self.prefix = prefix
+
+    def on_stage_start(self, stage: str, context: KillmailContext):
+        name = f"{self.prefix}.{stage}"
+        context.spans[name] = self.tracer.start_span(name)
+
+    def on_stage_error(
+        self, stage: str, context: KillmailContext, error: BaseException
+    ):
+        span = context.spans.get(f"{self.prefix}.{stage}")
+        if span:
+            span.set_attribute("error", True)
+            span.set_attribute("error.type", type(error).__name__)
+
+    def on_stage_end(self, stage: str, context: KillmailContext, duration: float):
+        span = context.spans.pop(f"{self.prefix}.{stage}", None)
+        if not span:
+            return
+
+        for key, value in (
+            ("killmail.id", context.killmail_id),
+            ("killmail.attackers_count", context.attackers_count),
+            ("killmail.size", context.size),
+        ):
+            if value is not None:
+                span.set_attribute(key, value)
+        span.end()
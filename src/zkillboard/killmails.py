@@ -3,13 +3,15 @@
 # pylint: disable = redefined-builtin
 
 import datetime as dt
+import json
 import logging
 from dataclasses import asdict, dataclass
 from datetime import datetime
 from typing import List, Optional, Tuple
 
-from .esi import create_eve_entities_from_ids
 from .eveuniverse import EveEntity
+from .helpers import json_default
+from .metrics import Metrics
 
 logger = logging.getLogger("zkillboard")
 
@@ -127,6 +129,10 @@ class Killmail(_KillmailBase):
             objs += attacker.entities()
         return objs
 
+    def asjson(self) -> str:
+        """Return this object as JSON."""
+        return json.dumps(self.asdict(), default=json_default)
+
     def attacker_final_blow(self) -> Optional[KillmailAttacker]:
         """Returns the attacker with the final blow or None if not found."""
         for attacker in self.attackers:
@@ -134,11 +140,16 @@ class Killmail(_KillmailBase):
                 return attacker
         return None
 
-    async def resolve_entities(self):
+    async def resolve_entities(
+        self, metrics: Optional[Metrics] = None, esi_url: Optional[str] = None
+    ):
         """Resolve all eve entities from ESI."""
+        from .esi import create_eve_entities_from_ids  # keeps aiohttp import lazy
+
         entities = self.entities()
         ids = [obj.id for obj in entities]
-        resolved_entities = await create_eve_entities_from_ids(ids)
+        params = {"url": esi_url} if esi_url else {}
+        resolved_entities = await create_eve_entities_from_ids(ids, metrics, **params)
         for entity in entities:
             if entity.id in resolved_entities:
                 resolved_entity = resolved_entities[entity.id]
@@ -0,0 +1,219 @@
+"""Metrics for monitoring the processing of killmails."""
+
+import bisect
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, List, Sequence, Tuple
+
+STAGE_SECONDS = "zkillboard_stage_seconds"
+STREAM_LAG_SECONDS = "zkillboard_stream_lag_seconds"
+MESSAGES_TOTAL = "zkillboard_messages_total"
+RECONNECTS_TOTAL = "zkillboard_reconnects_total"
+STALLS_TOTAL = "zkillboard_stalls_total"
+BACKFILL_KILLMAILS_TOTAL = "zkillboard_backfill_killmails_total"
+ESI_REQUESTS_TOTAL = "zkillboard_esi_requests_total"
+ESI_IDS_TOTAL = "zkillboard_esi_ids_total"
+TASKS_IN_FLIGHT = "zkillboard_tasks_in_flight"
+RELAY_SUBSCRIBERS = "zkillboard_relay_subscribers"
+RELAY_EVICTIONS_TOTAL = "zkillboard_relay_evictions_total"
+RELAY_MESSAGES_TOTAL = "zkillboard_relay_messages_total"
+SINK_LAG_SECONDS = "zkillboard_sink_lag_seconds"
+LANE_LATENCY_SECONDS = "zkillboard_lane_latency_seconds"
+LANE_QUEUE_SIZE = "zkillboard_lane_queue_size"
+SINK_QUEUE_SIZE = "zkillboard_sink_queue_size"
+SINK_DROPS_TOTAL = "zkillboard_sink_drops_total"
+SINK_ERRORS_TOTAL = "zkillboard_sink_errors_total"
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class Metrics(ABC):
+    """Interface for recording metrics.
+
+    Metric names follow the Prometheus conventions.
+    Labels can be added as keyword arguments.
+    """
+
+    @abstractmethod
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        """Increase a counter."""
+
+    @abstractmethod
+    def set_gauge(self, name: str, value: float, **labels: str):
+        """Set a gauge to a value."""
+
+    @abstractmethod
+    def observe(self, name: str, value: float, **labels: str):
+        """Record a value in a histogram."""
+
+
+class NullMetrics(Metrics):
+    """Metrics which are not recorded."""
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        pass
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        pass
+
+    def observe(self, name: str, value: float, **labels: str):
+        pass
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class InMemoryMetrics(Metrics):
+    """Metrics recorded in memory, which can be rendered for Prometheus."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._histograms: Dict[_Key, _Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = self._make_key(name, labels)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        self._gauges[self._make_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = self._make_key(name, labels)
+        try:
+            histogram = self._histograms[key]
+        except KeyError:
+            histogram = self._histograms[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        """Return current value of a counter."""
+        return self._counters.get(self._make_key(name, labels), 0)
+
+    def gauge(self, name: str, **labels: str) -> float:
+        """Return current value of a gauge."""
+        return self._gauges.get(self._make_key(name, labels), 0)
+
+    def histogram_count(self, name: str, **labels: str) -> int:
+        """Return number of values recorded in a histogram."""
+        histogram = self._histograms.get(self._make_key(name, labels))
+        return histogram.count if histogram else 0
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text format."""
+        lines = []
+        for metric_type, values in (
+            ("counter", self._counters),
+            ("gauge", self._gauges),
+        ):
+            for name, items in self._group_by_name(values).items():
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in items:
+                    lines.append(f"{name}{self._format_labels(labels)} {value}")
+
+        for name, items in self._group_by_name(self._histograms).items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in items:
+                cumulative = 0
+                for bound, count in zip(
+                    list(histogram.buckets) + [math.inf], histogram.counts
+                ):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    bucket_labels = labels + (("le", le),)
+                    lines.append(
+                        f"{name}_bucket{self._format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(
+                    f"{name}_count{self._format_labels(labels)} {histogram.count}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _make_key(name: str, labels: Dict[str, str]) -> _Key:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    @staticmethod
+    def _group_by_name(values: dict) -> Dict[str, List[tuple]]:
+        groups = {}
+        for (name, labels), value in sorted(values.items(), key=lambda o: o[0]):
+            groups.setdefault(name, []).append((labels, value))
+        return groups
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        parts = ",".join(f'{k}="{v}"' for k, v in labels)
+        return "{" + parts + "}"
+
+
+class PrometheusExporter:
+    """A HTTP server exposing metrics in the Prometheus text format."""
+
+    def __init__(
+        self, metrics: InMemoryMetrics, host: str = "127.0.0.1", port: int = 9090
+    ) -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        """Start the HTTP server."""
+        from aiohttp import web  # imported here to keep import time low
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+
+    async def stop(self):
+        """Stop the HTTP server."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request):
+        # pylint: disable = unused-argument
+        from aiohttp import web
+
+        return web.Response(
+            body=self.metrics.render_prometheus().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
@@ -0,0 +1,218 @@
+"""Parsing killmails in a pool of worker processes."""
+
+import asyncio
+import datetime as dt
+import enum
+import heapq
+import itertools
+import json
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+from .eveuniverse import EveEntity
+from .killmails import (
+    Killmail,
+    KillmailAttacker,
+    KillmailPosition,
+    KillmailVictim,
+    KillmailZkb,
+)
+
+logger = logging.getLogger("zkillboard")
+
+
+class Ordering(str, enum.Enum):
+    """The order in which parsed killmails are returned."""
+
+    ARRIVAL = "arrival"
+    KILLMAIL_ID = "killmail_id"
+
+
+_ENTITY_KEYS = tuple(KillmailVictim._DATA_MAP.values())
+_ZKB_KEYS = (
+    "locationID",
+    "hash",
+    "fittedValue",
+    "totalValue",
+    "points",
+    "npc",
+    "solo",
+    "awox",
+)
+
+
+def _entity(entity_id: int) -> Optional[EveEntity]:
+    return EveEntity(entity_id) if entity_id else None
+
+
+class CompactKillmail(NamedTuple):
+    """A parsed killmail in a flat form, which is cheap to pass between processes.
+
+    Entity IDs are stored as integers with 0 for a missing entity.
+    Attackers are packed into one array with their entity IDs
+    followed by their final blow flag, which is -1 when missing.
+    """
+
+    id: int
+    timestamp: int
+    solar_system_id: int
+    victim: Optional[Tuple[int, ...]]
+    position: Optional[Tuple[Optional[float], ...]]
+    attackers: array
+    zkb: Optional[tuple]
+
+    @classmethod
+    def from_zkb_data(cls, killmail_data: dict) -> "CompactKillmail":
+        """Create a new object from raw killmail data
+        as returned by zkillboard WS API."""
+        victim = position = None
+        if "victim" in killmail_data:
+            victim_data = killmail_data["victim"]
+            victim = tuple(victim_data.get(key) or 0 for key in _ENTITY_KEYS)
+            if "position" in victim_data:
+                position_data = victim_data["position"]
+                position = tuple(position_data.get(key) for key in ("x", "y", "z"))
+
+        attackers = array("q")
+        for attacker_data in killmail_data.get("attackers", []):
+            attackers.extend(attacker_data.get(key) or 0 for key in _ENTITY_KEYS)
+            final_blow = attacker_data.get("final_blow")
+            attackers.append(-1 if final_blow is None else bool(final_blow))
+
+        zkb = None
+        if "zkb" in killmail_data:
+            zkb = tuple(killmail_data["zkb"].get(key) for key in _ZKB_KEYS)
+
+        time = Killmail.parse_killmail_time(killmail_data["killmail_time"])
+        return cls(
+            id=killmail_data["killmail_id"],
+            timestamp=int(time.timestamp()),
+            solar_system_id=killmail_data.get("solar_system_id") or 0,
+            victim=victim,
+            position=position,
+            attackers=attackers,
+            zkb=zkb,
+        )
+
+    def to_killmail(self) -> Killmail:
+        """Build the killmail from this object."""
+        victim = None
+        if self.victim:
+            victim = KillmailVictim(*(_entity(entity_id) for entity_id in self.victim))
+
+        items = iter(self.attackers)
+        attackers = [
+            KillmailAttacker(
+                _entity(character),
+                _entity(corporation),
+                _entity(alliance),
+                _entity(faction),
+                _entity(ship_type),
+                is_final_blow=None if final_blow < 0 else bool(final_blow),
+            )
+            for character, corporation, alliance, faction, ship_type, final_blow in zip(
+                items, items, items, items, items, items
+            )
+        ]
+        return Killmail(
+            id=self.id,
+            time=dt.datetime.fromtimestamp(self.timestamp, dt.timezone.utc),
+            victim=victim,
+            attackers=attackers,
+            position=KillmailPosition(*self.position) if self.position else None,
+            zkb=KillmailZkb(*self.zkb) if self.zkb else None,
+            solar_system=_entity(self.solar_system_id),
+        )
+
+
+def parse_frame(data: str) -> CompactKillmail:
+    """Decode and parse a raw websocket frame into a compact killmail.
+
+    This function runs in a worker process.
+    """
+    return CompactKillmail.from_zkb_data(json.loads(data))
+
+
+class ProcessPoolParser:
+    """Parses raw websocket frames in a pool of worker processes.
+
+    Args:
+        workers: Number of worker processes. Defaults to the number of CPUs.
+        ordering: Order in which killmails are returned.
+        reorder_window: Maximum number of killmails held back
+            for sorting them by killmail ID.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        ordering: Ordering = Ordering.ARRIVAL,
+        reorder_window: int = 100,
+    ) -> None:
+        self.workers = workers
+        self.ordering = Ordering(ordering)
+        self.reorder_window = max(1, reorder_window)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Optional["asyncio.Queue[asyncio.Future]"] = None
+        self._heap: List[Tuple[int, int, CompactKillmail]] = []
+        self._counter = itertools.count()
+        self._in_progress = 0
+
+    @property
+    def in_progress(self) -> int:
+        """Return number of frames submitted, but not yet returned as result."""
+        return self._in_progress
+
+    def start(self):
+        """Start the worker processes."""
+        if not self._executor:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._pending = asyncio.Queue()
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def submit(self, data: str):
+        """Submit a raw frame for parsing."""
+        if not self._executor or self._pending is None:
+            raise RuntimeError("Parser has not been started")
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, parse_frame, data)
+        self._pending.put_nowait(future)
+        self._in_progress += 1
+
+    async def results(self) -> AsyncIterator[CompactKillmail]:
+        """Return parsed killmails in the configured order.
+
+        Killmails are returned in their compact form,
+        so that callers only build those killmails they need.
+        """
+        if self._pending is None:
+            raise RuntimeError("Parser has not been started")
+
+        while True:
+            future = await self._pending.get()
+            try:
+                killmail = await future
+            except Exception:  # pylint: disable = broad-exception-caught
+                logger.exception("Failed to parse killmail")
+                self._in_progress -= 1
+                continue
+
+            if self.ordering == Ordering.ARRIVAL:
+                yield killmail
+                self._in_progress -= 1
+                continue
+
+            heapq.heappush(self._heap, (killmail.id, next(self._counter), killmail))
+            while self._heap and (
+                len(self._heap) > self.reorder_window or self._pending.empty()
+            ):
+                yield heapq.heappop(self._heap)[2]
+                self._in_progress -= 1
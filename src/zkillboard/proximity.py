@@ -0,0 +1,254 @@
+"""Jump distances between solar systems for proximity queries."""
+
+import csv
+import mmap
+import struct
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from .killmails import Killmail
+
+_MAGIC = b"ZKBJUMP2"
+_HEADER = struct.Struct("<8sII")
+
+UNREACHABLE = 255
+
+
+def read_stargate_edges(path: Union[str, Path]) -> List[Tuple[int, int]]:
+    """Read stargate connections between solar systems from a CSV file.
+
+    The file either has the columns `fromSolarSystemID` and `toSolarSystemID`
+    like `mapSolarSystemJumps.csv` from the SDE,
+    or has no header and the two solar system IDs in the first two columns.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        rows = list(csv.reader(file))
+
+    if not rows:
+        return []
+
+    from_col, to_col = 0, 1
+    if not rows[0][0].strip().isdigit():
+        header = [obj.strip() for obj in rows.pop(0)]
+        from_col = header.index("fromSolarSystemID")
+        to_col = header.index("toSolarSystemID")
+
+    return [(int(row[from_col]), int(row[to_col])) for row in rows if row]
+
+
+class JumpIndex:
+    """Precomputed jump distances between all pairs of solar systems.
+
+    Distances are stored as a matrix of bytes with one row per solar system,
+    so looking up a distance takes constant time.
+    Distances larger than `max_jumps` and between unconnected systems
+    are stored as `UNREACHABLE`.
+
+    An index can be saved to a file and then opened memory-mapped,
+    which is fast and shares the memory between processes.
+
+    Queries for more jumps than `max_jumps` raise ValueError,
+    because they would silently miss systems further away.
+
+    Args:
+        system_ids: IDs of all solar systems in order of the matrix rows.
+        distances: The matrix of distances as buffer of bytes.
+        max_jumps: Distances were computed up to this number of jumps.
+    """
+
+    def __init__(
+        self,
+        system_ids: Sequence[int],
+        distances: Union[bytes, bytearray, memoryview],
+        mapped: Optional[mmap.mmap] = None,
+        max_jumps: int = UNREACHABLE - 1,
+    ) -> None:
+        if len(distances) != len(system_ids) ** 2:
+            raise ValueError("Size of distances does not match number of systems")
+        self.max_jumps = min(max_jumps, UNREACHABLE - 1)
+        self.system_ids = list(system_ids)
+        self._positions: Dict[int, int] = {
+            system_id: num for num, system_id in enumerate(self.system_ids)
+        }
+        self._distances = distances
+        self._mapped = mapped
+
+    def __len__(self) -> int:
+        return len(self.system_ids)
+
+    def __contains__(self, system_id: int) -> bool:
+        return system_id in self._positions
+
+    @classmethod
+    def from_edges(
+        cls, edges: Iterable[Tuple[int, int]], max_jumps: int = UNREACHABLE - 1
+    ) -> "JumpIndex":
+        """Compute an index from stargate connections between solar systems.
+
+        Args:
+            edges: Pairs of connected solar system IDs. Connections work both ways.
+            max_jumps: Distances are only computed up to this number of jumps.
+                Lower values are faster to compute.
+        """
+        max_jumps = min(max_jumps, UNREACHABLE - 1)
+        neighbours: Dict[int, Set[int]] = {}
+        for first, second in edges:
+            neighbours.setdefault(first, set()).add(second)
+            neighbours.setdefault(second, set()).add(first)
+
+        system_ids = sorted(neighbours)
+        positions = {system_id: num for num, system_id in enumerate(system_ids)}
+        adjacency = [
+            [positions[obj] for obj in neighbours[system_id]]
+            for system_id in system_ids
+        ]
+        size = len(system_ids)
+        distances = bytearray([UNREACHABLE]) * (size * size)
+        for start in range(size):
+            offset = start * size
+            distances[offset + start] = 0
+            queue = deque([start])
+            while queue:
+                current = queue.popleft()
+                distance = distances[offset + current] + 1
+                if distance > max_jumps:
+                    continue
+                for neighbour in adjacency[current]:
+                    if distances[offset + neighbour] == UNREACHABLE:
+                        distances[offset + neighbour] = distance
+                        queue.append(neighbour)
+
+        return cls(system_ids, distances, max_jumps=max_jumps)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "JumpIndex":
+        """Open an index file memory-mapped."""
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(mapped) < _HEADER.size or mapped[: len(_MAGIC)] != _MAGIC:
+            mapped.close()
+            raise ValueError(f"Not a jump index file: {path}")
+
+        _, size, max_jumps = _HEADER.unpack_from(mapped)
+        ids_format = struct.Struct(f"<{size}i")
+        system_ids = ids_format.unpack_from(mapped, _HEADER.size)
+        offset = _HEADER.size + ids_format.size
+        distances = memoryview(mapped)[offset : offset + size * size]
+        return cls(system_ids, distances, mapped, max_jumps)
+
+    def save(self, path: Union[str, Path]):
+        """Save this index to a file."""
+        size = len(self.system_ids)
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, size, self.max_jumps))
+            file.write(struct.pack(f"<{size}i", *self.system_ids))
+            file.write(self._distances)
+
+    def close(self):
+        """Release the file of a memory-mapped index."""
+        if self._mapped:
+            if isinstance(self._distances, memoryview):
+                self._distances.release()
+            self._mapped.close()
+            self._mapped = None
+
+    def distance(self, first_id: int, second_id: int) -> Optional[int]:
+        """Return number of jumps between two solar systems.
+
+        Returns None when the systems are not connected within the computed range
+        or are unknown.
+        """
+        try:
+            first = self._positions[first_id]
+            second = self._positions[second_id]
+        except KeyError:
+            return None
+
+        distance = self._distances[first * len(self.system_ids) + second]
+        return None if distance == UNREACHABLE else distance
+
+    def within_jumps(self, first_id: int, second_id: int, jumps: int) -> bool:
+        """Report whether two solar systems are at most this many jumps apart.
+
+        Raises ValueError when jumps exceeds the computed range.
+        """
+        jumps = self._check_jumps(jumps)
+        try:
+            first = self._positions[first_id]
+            second = self._positions[second_id]
+        except KeyError:
+            return False
+
+        return self._distances[first * len(self.system_ids) + second] <= jumps
+
+    def neighbourhood(self, system_id: int, jumps: int) -> Set[int]:
+        """Return IDs of all solar systems at most this many jumps away,
+        including the system itself.
+
+        Raises ValueError when jumps exceeds the computed range.
+        """
+        jumps = self._check_jumps(jumps)
+        try:
+            position = self._positions[system_id]
+        except KeyError:
+            return set()
+
+        size = len(self.system_ids)
+        row = self._distances[position * size : (position + 1) * size]
+        return {
+            self.system_ids[num]
+            for num, distance in enumerate(row)
+            if distance <= jumps
+        }
+
+    def _check_jumps(self, jumps: int) -> int:
+        if jumps > self.max_jumps:
+            raise ValueError(
+                f"Distances are only computed up to {self.max_jumps} jumps: {jumps}"
+            )
+        return min(jumps, UNREACHABLE - 1)
+
+
+class ProximityFilter:
+    """A filter for killmails within a number of jumps of a home system.
+
+    zKillboard can not filter by proximity,
+    so the filter subscribes to the complete killstream
+    and matches each killmail against a precomputed neighbourhood.
+
+    Args:
+        index: Jump distances between solar systems.
+        home_id: ID of the home solar system.
+        jumps: Maximum number of jumps from the home system.
+            Must not exceed the range the index was computed for.
+    """
+
+    def __init__(self, index: JumpIndex, home_id: int, jumps: int) -> None:
+        if home_id not in index:
+            raise ValueError(f"Unknown solar system: {home_id}")
+        if jumps > index.max_jumps:
+            raise ValueError(
+                f"Index only has distances up to {index.max_jumps} jumps: {jumps}"
+            )
+        self.home_id = home_id
+        self.jumps = jumps
+        self.system_ids = frozenset(index.neighbourhood(home_id, jumps))
+
+    def __repr__(self) -> str:
+        return f"ProximityFilter(home_id={self.home_id}, jumps={self.jumps})"
+
+    def channel(self) -> str:
+        """Return channel name to subscribe to."""
+        return "killstream"
+
+    def matches_data(self, killmail_data: dict) -> bool:
+        """Report whether raw data of a killmail is within range of the home system."""
+        return killmail_data.get("solar_system_id") in self.system_ids
+
+    def matches(self, killmail: Killmail) -> bool:
+        """Report whether a killmail happened within range of the home system."""
+        return bool(
+            killmail.solar_system and killmail.solar_system.id in self.system_ids
+        )
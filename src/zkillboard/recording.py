@@ -0,0 +1,262 @@
+"""Recording and replaying the raw websocket stream."""
+
+import asyncio
+import datetime as dt
+import enum
+import gzip
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import IO, AsyncIterator, Iterator, List, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("zkillboard")
+
+_COMPRESSION_LEVEL = 1
+
+
+class Compression(str, enum.Enum):
+    """A compression format for segment files."""
+
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+    @property
+    def suffix(self) -> str:
+        """Return file suffix for this compression."""
+        return ".jsonl.gz" if self is Compression.GZIP else ".jsonl.zst"
+
+
+def _open_segment(path: Path, mode: str) -> IO[bytes]:
+    if path.name.endswith(Compression.ZSTD.suffix):
+        if not zstandard:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        if mode == "wb":
+            return zstandard.ZstdCompressor(level=_COMPRESSION_LEVEL).stream_writer(
+                open(path, "wb")
+            )
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+
+    if mode == "wb":
+        return gzip.open(path, mode, compresslevel=_COMPRESSION_LEVEL)
+    return gzip.open(path, mode)
+
+
+class StreamRecorder:
+    """Appends raw frames with their receive time to rotating segment files.
+
+    Each record of a segment is a header line with the receive time
+    as UNIX timestamp and the length of the frame in bytes,
+    followed by the raw frame as is and a newline.
+
+    Frames are compressed and written by a background thread,
+    so recording does not hold up the event loop.
+
+    Args:
+        directory: Where to store the segment files.
+        compression: Compression format for segment files.
+        max_segment_bytes: Start a new segment after this many uncompressed bytes.
+        max_segment_seconds: Start a new segment after this many seconds.
+        max_queue_size: Maximum number of frames waiting to be written.
+            New frames are dropped when the queue is full.
+
+    When writing fails, e.g. because the disk is full,
+    the error is logged and the recorder stops recording.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        compression: Compression = Compression.GZIP,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_segment_seconds: float = 3600,
+        max_queue_size: int = 10_000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.compression = Compression(compression)
+        if self.compression is Compression.ZSTD and not zstandard:
+            raise RuntimeError("zstd compression requires the zstandard package")
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self._queue: "queue.Queue[Optional[Tuple[str, float]]]" = queue.Queue(
+            maxsize=max_queue_size
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[IO[bytes]] = None
+        self._segment_bytes = 0
+        self._segment_started = 0.0
+        self._segment_count = 0
+        self.dropped = 0
+        self.failed = False
+
+    def write(self, data: str, received_at: Optional[float] = None):
+        """Queue a raw frame to be appended to the current segment."""
+        if self.failed:
+            self.dropped += 1
+            return
+
+        if received_at is None:
+            received_at = time.time()
+
+        if not self._thread:
+            self._thread = threading.Thread(
+                target=self._write_frames, name="zkb-recorder", daemon=True
+            )
+            self._thread.start()
+
+        try:
+            self._queue.put_nowait((data, received_at))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Recorder: Queue is full. Dropping frame")
+
+    def close(self):
+        """Write all queued frames and close the current segment.
+
+        A new segment is started with the next write.
+        """
+        if not self._thread:
+            return
+
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        self._thread = None
+
+    def _write_frames(self):
+        try:
+            while (item := self._queue.get()) is not None:
+                self._write_frame(*item)
+            self._close_segment()
+        except Exception:  # pylint: disable = broad-exception-caught
+            logger.exception("Recorder: Failed to write frames. Recording stopped")
+            self.failed = True
+            self._file = None
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+    def _close_segment(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_frame(self, data: str, received_at: float):
+        if self._file and (
+            self._segment_bytes >= self.max_segment_bytes
+            or received_at - self._segment_started >= self.max_segment_seconds
+        ):
+            self._close_segment()
+
+        if not self._file:
+            self._open_new_segment(received_at)
+
+        frame = data.encode("utf-8")
+        header = f"{received_at!r} {len(frame)}\n".encode("ascii")
+        self._file.write(header + frame + b"\n")
+        self._segment_bytes += len(header) + len(frame) + 1
+
+    def _open_new_segment(self, started: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        timestamp = dt.datetime.fromtimestamp(started, dt.timezone.utc)
+        self._segment_count += 1
+        name = (
+            f"zkb-{timestamp:%Y%m%dT%H%M%S}-{self._segment_count:04d}"
+            f"{self.compression.suffix}"
+        )
+        self._file = _open_segment(self.directory / name, "wb")
+        self._segment_bytes = 0
+        self._segment_started = started
+
+
+def read_segment(path: Union[str, Path]) -> Iterator[Tuple[float, str]]:
+    """Yield the receive time and raw frame for each record of a segment file."""
+    with _open_segment(Path(path), "rb") as file:
+        buffer = b""
+        position = 0
+        eof = False
+        while True:
+            end = buffer.find(b"\n", position)
+            if end == -1:
+                if eof:
+                    break
+                buffer = buffer[position:]
+                position = 0
+                chunk = file.read(1024 * 1024)
+                eof = not chunk
+                buffer += chunk
+                continue
+
+            received_at, length = buffer[position:end].split(b" ")
+            start = end + 1
+            stop = start + int(length)
+            while len(buffer) < stop and not eof:
+                chunk = file.read(max(1024 * 1024, stop - len(buffer)))
+                eof = not chunk
+                buffer += chunk
+            if len(buffer) < stop:
+                raise ValueError(f"Truncated frame in segment: {path}")
+            yield float(received_at), buffer[start:stop].decode("utf-8")
+            position = stop + 1
+
+
+class ReplaySource:
+    """Replays recorded frames from segment files.
+
+    Args:
+        paths: Segment files or directories containing segment files.
+            Segments are replayed in order of their names.
+        speed: Replay speed relative to real time, e.g. 2 for twice as fast.
+            When None frames are replayed as fast as possible.
+    """
+
+    def __init__(
+        self,
+        paths: Union[str, Path, List[Union[str, Path]]],
+        speed: Optional[float] = 1.0,
+    ) -> None:
+        if isinstance(paths, (str, Path)):
+            paths = [paths]
+        self.paths = paths
+        self.speed = speed
+
+    def segments(self) -> List[Path]:
+        """Return all segment files to be replayed in order."""
+        segments = []
+        for path in map(Path, self.paths):
+            if path.is_dir():
+                segments += [
+                    obj
+                    for obj in path.iterdir()
+                    if obj.name.endswith(tuple(o.suffix for o in Compression))
+                ]
+            else:
+                segments.append(path)
+        return sorted(segments, key=lambda o: o.name)
+
+    async def frames(self) -> AsyncIterator[str]:
+        """Yield the raw frames, paced according to the replay speed."""
+        first_received = None
+        replay_started = time.monotonic()
+        for segment in self.segments():
+            for received_at, data in read_segment(segment):
+                if self.speed:
+                    if first_received is None:
+                        first_received = received_at
+                    due = replay_started + (received_at - first_received) / self.speed
+                    delay = due - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+
+                yield data
@@ -0,0 +1,214 @@
+"""Relaying killmails from one upstream connection to many local subscribers."""
+
+import asyncio
+import json
+import logging
+from typing import List, Optional, Set
+
+from aiohttp import WSCloseCode, WSMsgType, web
+
+from .client import Filter, _Client
+from .killmails import Killmail
+from .metrics import RELAY_EVICTIONS_TOTAL, RELAY_MESSAGES_TOTAL, RELAY_SUBSCRIBERS
+
+logger = logging.getLogger("zkillboard")
+
+
+def encode_killmail(killmail: Killmail) -> str:
+    """Encode an enriched killmail as JSON for subscribers."""
+    return killmail.asjson()
+
+
+class _Subscriber:
+    """A local subscriber of a relay."""
+
+    def __init__(self, ws: web.WebSocketResponse, buffer_size: int) -> None:
+        self.ws = ws
+        self.filters: Set[Filter] = set()
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=buffer_size)
+        self.sender: Optional[asyncio.Task] = None
+
+    def matches(self, killmail: Killmail) -> bool:
+        """Report whether a killmail matches any filter of this subscriber."""
+        return any(obj.matches(killmail) for obj in self.filters)
+
+    async def send_payloads(self):
+        """Send queued payloads to the subscriber.
+
+        Raises ConnectionError when the connection to the subscriber is lost.
+        """
+        while True:
+            payload = await self.queue.get()
+            await self.ws.send_str(payload)
+
+    def reply_error(self, message: str):
+        """Queue an error message for the subscriber."""
+        try:
+            self.queue.put_nowait(json.dumps({"error": message}))
+        except asyncio.QueueFull:
+            pass
+
+
+class RelayServer(_Client):
+    """A server which relays enriched killmails to local websocket subscribers.
+
+    The relay keeps one upstream connection to zKillboard
+    and resolves each killmail only once.
+    Each killmail is encoded only once and the same payload
+    is sent to every subscriber with a matching filter.
+
+    Subscribers connect to the relay's websocket
+    and subscribe to channels with the same messages as for zKillboard,
+    e.g. `{"action": "sub", "channel": "alliance:99000001"}`.
+    The channel `killstream` subscribes to all killmails.
+    Channels for groups, constellations, regions and labels
+    can not be relayed, because killmails do not contain that data.
+    Subscriptions to them are rejected with an error message,
+    e.g. `{"error": "Channel can not be relayed: region:10000002"}`.
+
+    Subscribers which do not keep up are disconnected,
+    when their buffer is full.
+
+    Args:
+        filters: Upstream filters. When not set, the complete killstream is relayed.
+        host: Host to listen on for subscribers.
+        port: Port to listen on for subscribers.
+        unix_path: When set, listen on this Unix socket instead of host and port.
+        buffer_size: Maximum number of killmails buffered per subscriber.
+    """
+
+    path = "/websocket/"
+
+    def __init__(
+        self,
+        filters: Optional[List[Filter]] = None,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_path: Optional[str] = None,
+        buffer_size: int = 1000,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        if filters:
+            self.channels = [filter.channel() for filter in filters]
+        else:
+            self.channels = ["killstream"]
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.buffer_size = buffer_size
+        self._subscribers: Set[_Subscriber] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def subscribers_count(self) -> int:
+        """Return number of connected subscribers."""
+        return len(self._subscribers)
+
+    async def on_new_killmail(self, killmail: Killmail):
+        payload = None
+        for subscriber in list(self._subscribers):
+            if not subscriber.matches(killmail):
+                continue
+
+            if payload is None:
+                payload = encode_killmail(killmail)
+
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self._evict(subscriber)
+            else:
+                self.metrics.inc(RELAY_MESSAGES_TOTAL)
+
+    async def start_server(self):
+        """Start accepting subscribers."""
+        app = web.Application()
+        app.router.add_get(self.path, self._handle_subscriber)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        if self.unix_path:
+            site = web.UnixSite(self._runner, self.unix_path)
+        else:
+            site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info("Relay accepting subscribers on %s", site.name)
+
+    async def stop_server(self):
+        """Disconnect all subscribers and stop accepting new ones."""
+        for subscriber in list(self._subscribers):
+            await subscriber.ws.close(code=WSCloseCode.GOING_AWAY)
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _run_pipeline(self, producers: list, until_idle: bool = False):
+        await self.start_server()
+        try:
+            await super()._run_pipeline(producers, until_idle)
+        finally:
+            await self.stop_server()
+
+    async def _handle_subscriber(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subscriber = _Subscriber(ws, self.buffer_size)
+        subscriber.sender = asyncio.create_task(self._send_to_subscriber(subscriber))
+        self._subscribers.add(subscriber)
+        self.metrics.set_gauge(RELAY_SUBSCRIBERS, len(self._subscribers))
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    self._handle_subscriber_message(subscriber, msg.data)
+        finally:
+            subscriber.sender.cancel()
+            self._remove_subscriber(subscriber)
+        return ws
+
+    async def _send_to_subscriber(self, subscriber: _Subscriber):
+        try:
+            await subscriber.send_payloads()
+        except ConnectionError as ex:
+            logger.warning("Disconnecting subscriber after failed send: %s", ex)
+            self._remove_subscriber(subscriber)
+            task = asyncio.create_task(subscriber.ws.close(code=WSCloseCode.GOING_AWAY))
+            self._track_task(task)
+
+    @staticmethod
+    def _handle_subscriber_message(subscriber: _Subscriber, data: str):
+        try:
+            message = json.loads(data)
+            action = message["action"]
+            my_filter = Filter.from_channel(message["channel"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring invalid message from subscriber: %s", data)
+            return
+
+        if not my_filter.can_match_locally():
+            logger.warning("Rejecting subscription to channel: %s", message["channel"])
+            subscriber.reply_error(f"Channel can not be relayed: {my_filter.channel()}")
+            return
+
+        if action == "sub":
+            subscriber.filters.add(my_filter)
+        elif action == "unsub":
+            subscriber.filters.discard(my_filter)
+
+    def _evict(self, subscriber: _Subscriber):
+        if subscriber not in self._subscribers:
+            return
+
+        logger.warning("Disconnecting slow subscriber")
+        self._remove_subscriber(subscriber)
+        self.metrics.inc(RELAY_EVICTIONS_TOTAL)
+        subscriber.sender.cancel()
+        task = asyncio.create_task(
+            subscriber.ws.close(
+                code=WSCloseCode.POLICY_VIOLATION, message=b"slow consumer"
+            )
+        )
+        self._track_task(task)
+
+    def _remove_subscriber(self, subscriber: _Subscriber):
+        self._subscribers.discard(subscriber)
+        self.metrics.set_gauge(RELAY_SUBSCRIBERS, len(self._subscribers))
@@ -0,0 +1,162 @@
+"""Processing killmails in priority lanes."""
+
+import asyncio
+import enum
+import time
+from collections import deque
+from typing import Any, Collection, Deque, Dict, Optional, Tuple
+
+
+class Lane(enum.IntEnum):
+    """A priority lane for processing killmails. Lower values go first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+    @property
+    def label(self) -> str:
+        """Return name of this lane for metrics."""
+        return self.name.lower()
+
+
+class Ranker:
+    """Assigns killmails to lanes from their raw data before they are parsed.
+
+    Killmails go into the high lane when they are valuable
+    or involve a watched entity or ship type.
+    Killmails go into the low lane when they are NPC kills or of little value.
+
+    Args:
+        high_value: Minimum total value in ISK for the high lane.
+        low_value: Total value in ISK below which killmails go into the low lane.
+        watched_ids: IDs of characters, corporations and alliances,
+            whose killmails go into the high lane.
+        watched_ship_type_ids: IDs of ship types, e.g. of all capitals,
+            whose killmails go into the high lane.
+    """
+
+    _ENTITY_PROPS = ("character_id", "corporation_id", "alliance_id")
+
+    def __init__(
+        self,
+        high_value: float = 1_000_000_000,
+        low_value: float = 10_000_000,
+        watched_ids: Collection[int] = (),
+        watched_ship_type_ids: Collection[int] = (),
+    ) -> None:
+        self.high_value = high_value
+        self.low_value = low_value
+        self.watched_ids = frozenset(watched_ids)
+        self.watched_ship_type_ids = frozenset(watched_ship_type_ids)
+
+    def rank(self, killmail_data: dict) -> Lane:
+        """Return the lane for a killmail from the zkillboard WS API."""
+        zkb = killmail_data.get("zkb") or {}
+        value = zkb.get("totalValue") or 0
+        if value >= self.high_value or self._is_watched(killmail_data):
+            return Lane.HIGH
+        if zkb.get("npc") or value < self.low_value:
+            return Lane.LOW
+        return Lane.NORMAL
+
+    def _is_watched(self, killmail_data: dict) -> bool:
+        if not self.watched_ids and not self.watched_ship_type_ids:
+            return False
+
+        victim = killmail_data.get("victim") or {}
+        for character in (victim, *killmail_data.get("attackers", [])):
+            if character.get("ship_type_id") in self.watched_ship_type_ids:
+                return True
+            for prop in self._ENTITY_PROPS:
+                if character.get(prop) in self.watched_ids:
+                    return True
+        return False
+
+
+class PriorityScheduler:
+    """A queue with one FIFO lane per priority.
+
+    Items are taken from the highest priority lane first.
+    To prevent starvation an item which has waited longer than `max_wait`
+    is taken first, regardless of its lane.
+
+    Args:
+        max_wait: Seconds after which an item from any lane is taken first.
+    """
+
+    def __init__(self, max_wait: float = 5.0) -> None:
+        self.max_wait = max_wait
+        self._lanes: Dict[Lane, Deque[Tuple[Any, float]]] = {
+            lane: deque() for lane in Lane
+        }
+        self._unfinished = 0
+        self._has_items = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __len__(self) -> int:
+        return sum(len(obj) for obj in self._lanes.values())
+
+    def qsize(self, lane: Lane) -> int:
+        """Return number of waiting items in a lane."""
+        return len(self._lanes[lane])
+
+    def put(self, lane: Lane, item: Any, queued_at: Optional[float] = None):
+        """Add an item to a lane."""
+        queued_at = time.monotonic() if queued_at is None else queued_at
+        self._lanes[Lane(lane)].append((item, queued_at))
+        self._unfinished += 1
+        self._idle.clear()
+        self._has_items.set()
+
+    def get_nowait(self) -> Tuple[Lane, Any, float]:
+        """Return the next item with its lane and the time it was queued.
+
+        Raises asyncio.QueueEmpty when there are no items.
+        """
+        lane = self._next_lane()
+        if lane is None:
+            raise asyncio.QueueEmpty()
+
+        item, queued_at = self._lanes[lane].popleft()
+        if not len(self):
+            self._has_items.clear()
+        return lane, item, queued_at
+
+    async def get(self) -> Tuple[Lane, Any, float]:
+        """Wait for and return the next item with its lane
+        and the time it was queued.
+        """
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                await self._has_items.wait()
+
+    def task_done(self):
+        """Report that processing of an item has finished."""
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._idle.set()
+
+    async def join(self):
+        """Wait until all items have been processed."""
+        await self._idle.wait()
+
+    def _next_lane(self) -> Optional[Lane]:
+        deadline = time.monotonic() - self.max_wait
+        overdue_lane = None
+        overdue_at = deadline
+        first_lane = None
+        for lane, items in self._lanes.items():
+            if not items:
+                continue
+            if first_lane is None:
+                first_lane = lane
+            queued_at = items[0][1]
+            if queued_at < overdue_at:
+                overdue_lane = lane
+                overdue_at = queued_at
+        return overdue_lane if overdue_lane is not None else first_lane
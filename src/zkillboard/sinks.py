@@ -0,0 +1,263 @@
+"""Dispatching killmails to several independent sinks."""
+
+import asyncio
+import enum
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .killmails import Killmail
+from .metrics import (
+    SINK_DROPS_TOTAL,
+    SINK_ERRORS_TOTAL,
+    SINK_LAG_SECONDS,
+    SINK_QUEUE_SIZE,
+    Metrics,
+    NullMetrics,
+)
+
+logger = logging.getLogger("zkillboard")
+
+
+class SinkPolicy(str, enum.Enum):
+    """What to do with a new killmail when the queue of a sink is full."""
+
+    BLOCK = "block"  # wait for space, which slows down the whole client
+    DROP_NEWEST = "drop_newest"  # drop the new killmail
+    DROP_OLDEST = "drop_oldest"  # drop the oldest queued killmail
+
+
+class Sink(ABC):
+    """A consumer of killmails, e.g. a database or a webhook.
+
+    Killmails are shared between all sinks and must not be modified.
+    """
+
+    async def start(self):
+        """Prepare the sink before the first killmail is handled."""
+
+    async def stop(self):
+        """Clean up after the last killmail has been handled."""
+
+    @abstractmethod
+    async def handle(self, killmails: List[Killmail]):
+        """Handle a batch of killmails."""
+
+
+class FunctionSink(Sink):
+    """A sink which calls a coroutine function for each killmail."""
+
+    def __init__(self, func: Callable[[Killmail], Awaitable[None]]) -> None:
+        self.func = func
+
+    async def handle(self, killmails: List[Killmail]):
+        for killmail in killmails:
+            await self.func(killmail)
+
+
+class _SinkRunner:
+    """Feeds a sink from its own queue with its own workers."""
+
+    def __init__(
+        self,
+        name: str,
+        sink: Sink,
+        metrics: Metrics,
+        queue_size: int,
+        concurrency: int,
+        batch_size: int,
+        batch_timeout: float,
+        policy: SinkPolicy,
+    ) -> None:
+        self.name = name
+        self.sink = sink
+        self.metrics = metrics
+        self.queue_size = queue_size
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout = batch_timeout
+        self.policy = SinkPolicy(policy)
+        self.queue: Optional["asyncio.Queue[Tuple[Killmail, float]]"] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        await self.sink.start()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            if not self.queue.empty():
+                logger.warning(
+                    "Sink %s: Dropping %d killmails on stop",
+                    self.name,
+                    self.queue.qsize(),
+                )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.sink.stop()
+
+    async def put(self, killmail: Killmail):
+        if self.policy is not SinkPolicy.BLOCK:
+            self.put_nowait(killmail)
+            return
+
+        await self.queue.put((killmail, time.monotonic()))
+        self.metrics.set_gauge(SINK_QUEUE_SIZE, self.queue.qsize(), sink=self.name)
+
+    def put_nowait(self, killmail: Killmail):
+        item = (killmail, time.monotonic())
+        if self.queue.full():
+            self.metrics.inc(SINK_DROPS_TOTAL, sink=self.name)
+            if self.policy is SinkPolicy.DROP_NEWEST:
+                return
+
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(item)
+        else:
+            self.queue.put_nowait(item)
+        self.metrics.set_gauge(SINK_QUEUE_SIZE, self.queue.qsize(), sink=self.name)
+
+    async def _work(self):
+        while True:
+            items = [await self.queue.get()]
+            try:
+                await self._fill_batch(items)
+                await self._handle(items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    async def _fill_batch(self, items: list):
+        if self.batch_size == 1:
+            return
+
+        deadline = time.monotonic() + self.batch_timeout
+        while len(items) < self.batch_size:
+            if not self.queue.empty():
+                items.append(self.queue.get_nowait())
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                items.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                return
+
+    async def _handle(self, items: list):
+        self.metrics.set_gauge(SINK_QUEUE_SIZE, self.queue.qsize(), sink=self.name)
+        try:
+            await self.sink.handle([killmail for killmail, _ in items])
+        except Exception:  # pylint: disable = broad-exception-caught
+            logger.exception("Sink %s: Failed to handle killmails", self.name)
+            self.metrics.inc(SINK_ERRORS_TOTAL, len(items), sink=self.name)
+            return
+
+        now = time.monotonic()
+        for _, queued_at in items:
+            self.metrics.observe(SINK_LAG_SECONDS, now - queued_at, sink=self.name)
+
+
+class SinkRegistry:
+    """Dispatches each killmail to several sinks, which are isolated from each other.
+
+    Each sink has its own bounded queue and its own workers,
+    so a slow sink does not hold up the others,
+    unless its policy is to block when its queue is full.
+    By default the oldest queued killmail is dropped when a queue is full.
+    A failing batch is logged and counted, but does not stop the sink.
+
+    Args:
+        metrics: Where to record the lag, queue size, drops and errors of each sink.
+        stop_timeout: Maximum seconds to wait for queued killmails on stop.
+            Waits until all are handled when None.
+    """
+
+    def __init__(
+        self, metrics: Optional[Metrics] = None, stop_timeout: Optional[float] = 10.0
+    ) -> None:
+        self.metrics = metrics or NullMetrics()
+        self.stop_timeout = stop_timeout
+        self._runners: Dict[str, _SinkRunner] = {}
+        self._started = False
+
+    def __len__(self) -> int:
+        return len(self._runners)
+
+    def register(
+        self,
+        name: str,
+        sink: Sink,
+        queue_size: int = 1000,
+        concurrency: int = 1,
+        batch_size: int = 1,
+        batch_timeout: float = 1.0,
+        policy: SinkPolicy = SinkPolicy.DROP_OLDEST,
+    ):
+        """Register a sink. Must be called before the registry is started.
+
+        Args:
+            name: Unique name of the sink, e.g. for metrics.
+            sink: The sink.
+            queue_size: Maximum number of killmails waiting for this sink.
+            concurrency: Number of batches handled at the same time.
+            batch_size: Maximum number of killmails handled together.
+            batch_timeout: Maximum seconds to wait for a batch to fill up.
+            policy: What to do with new killmails when the queue is full.
+                Blocking slows down the client and all other sinks,
+                while this sink's queue is full.
+        """
+        if self._started:
+            raise RuntimeError("Can not register sinks after start")
+        if name in self._runners:
+            raise ValueError(f"A sink with this name already exists: {name}")
+        self._runners[name] = _SinkRunner(
+            name=name,
+            sink=sink,
+            metrics=self.metrics,
+            queue_size=queue_size,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            batch_timeout=batch_timeout,
+            policy=policy,
+        )
+
+    async def start(self):
+        """Start all sinks."""
+        for runner in self._runners.values():
+            await runner.start()
+        self._started = True
+
+    async def stop(self):
+        """Handle queued killmails and stop all sinks."""
+        if not self._started:
+            return
+        await asyncio.gather(
+            *[runner.stop(self.stop_timeout) for runner in self._runners.values()]
+        )
+        self._started = False
+
+    async def dispatch(self, killmail: Killmail):
+        """Queue a killmail for all sinks.
+
+        Sinks which do not block get the killmail first,
+        so they are not held up by sinks waiting for space in their queue.
+        """
+        blocking = []
+        for runner in self._runners.values():
+            if runner.policy is SinkPolicy.BLOCK:
+                blocking.append(runner)
+            else:
+                runner.put_nowait(killmail)
+        for runner in blocking:
+            await runner.put(killmail)
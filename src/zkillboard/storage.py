@@ -0,0 +1,307 @@
+"""Storing killmails in a SQLite database."""
+
+import asyncio
+import datetime as dt
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Union
+
+from .killmails import Killmail
+from .sinks import Sink
+
+logger = logging.getLogger("zkillboard")
+
+# errors raised when killmails can not be written, e.g. for too large values
+_WRITE_ERRORS = (sqlite3.Error, ValueError, OverflowError)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS killmails (
+    id INTEGER PRIMARY KEY,
+    time INTEGER NOT NULL,
+    solar_system_id INTEGER,
+    victim_character_id INTEGER,
+    victim_corporation_id INTEGER,
+    victim_alliance_id INTEGER,
+    victim_faction_id INTEGER,
+    victim_ship_type_id INTEGER,
+    victim_damage_taken INTEGER,
+    position_x REAL,
+    position_y REAL,
+    position_z REAL,
+    location_id INTEGER,
+    hash TEXT,
+    fitted_value REAL,
+    total_value REAL,
+    points INTEGER,
+    is_npc INTEGER,
+    is_solo INTEGER,
+    is_awox INTEGER
+);
+CREATE INDEX IF NOT EXISTS killmails_time ON killmails (time);
+CREATE INDEX IF NOT EXISTS killmails_solar_system ON killmails (solar_system_id, time);
+CREATE INDEX IF NOT EXISTS killmails_victim_alliance
+    ON killmails (victim_alliance_id, time);
+CREATE TABLE IF NOT EXISTS attackers (
+    killmail_id INTEGER NOT NULL,
+    num INTEGER NOT NULL,
+    character_id INTEGER,
+    corporation_id INTEGER,
+    alliance_id INTEGER,
+    faction_id INTEGER,
+    ship_type_id INTEGER,
+    weapon_type_id INTEGER,
+    damage_done INTEGER,
+    is_final_blow INTEGER,
+    security_status REAL,
+    PRIMARY KEY (killmail_id, num)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS attackers_alliance ON attackers (alliance_id);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+"""
+
+_INSERT_KILLMAIL = "INSERT OR IGNORE INTO killmails VALUES (" + ",".join("?" * 20) + ")"
+_INSERT_ATTACKER = "INSERT OR IGNORE INTO attackers VALUES (" + ",".join("?" * 11) + ")"
+_UPSERT_ENTITY = (
+    "INSERT INTO entities VALUES (?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET name = excluded.name, category = excluded.category"
+)
+
+
+def _entity_id(entity) -> Optional[int]:
+    return entity.id if entity else None
+
+
+class SqliteSink(Sink):
+    """Stores killmails, their attackers and resolved entities in SQLite.
+
+    Killmails are buffered and written in batches,
+    when the buffer is full or when the flush interval has passed.
+    The database runs in WAL mode and is accessed from a dedicated thread.
+
+    Can be registered with a `SinkRegistry`.
+
+    Args:
+        path: Path of the database file.
+        batch_size: Maximum number of killmails to buffer before writing them.
+        flush_interval: Maximum seconds a killmail stays in the buffer.
+        max_retries: Number of times a failed batch is written again,
+            before its killmails are written one by one
+            and those which can not be written are dropped.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_retries: int = 3,
+    ) -> None:
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._failed_flushes = 0
+        self._buffer: List[Killmail] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Open the database and start flushing periodically."""
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        await self._run(self._open)
+        self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        """Write all buffered killmails and close the database."""
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            await self.flush()
+        finally:
+            try:
+                await self._run(self._close)
+            finally:
+                self._executor.shutdown()
+                self._executor = None
+
+    async def add(self, killmail: Killmail):
+        """Add a killmail to be stored."""
+        self._buffer.append(killmail)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def handle(self, killmails: List[Killmail]):
+        self._buffer += killmails
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered killmails to the database.
+
+        When writing fails the killmails are put back into the buffer,
+        so they are written again with the next flush.
+        Once all retries have failed, the killmails are written one by one
+        and those which can not be written are dropped.
+        """
+        if not self._buffer:
+            return
+
+        killmails, self._buffer = self._buffer, []
+        try:
+            await self._run(self._write, killmails)
+        except _WRITE_ERRORS:
+            if self._failed_flushes < self.max_retries:
+                self._failed_flushes += 1
+                self._buffer = killmails + self._buffer
+                raise
+
+            self._failed_flushes = 0
+            await self._run(self._write_each, killmails)
+        except BaseException:
+            self._buffer = killmails + self._buffer
+            raise
+        else:
+            self._failed_flushes = 0
+
+    async def recent_killmails(
+        self,
+        limit: int = 100,
+        since: Optional[dt.datetime] = None,
+        solar_system_id: Optional[int] = None,
+        alliance_id: Optional[int] = None,
+    ) -> List[dict]:
+        """Return the most recent stored killmails, newest first.
+
+        Args:
+            limit: Maximum number of killmails to return.
+            since: Only return killmails which happened at or after this time.
+            solar_system_id: Only return killmails from this solar system.
+            alliance_id: Only return killmails where the victim is in this alliance.
+        """
+        conditions = []
+        params: List[Any] = []
+        if since:
+            conditions.append("time >= ?")
+            params.append(int(since.timestamp()))
+        if solar_system_id:
+            conditions.append("solar_system_id = ?")
+            params.append(solar_system_id)
+        if alliance_id:
+            conditions.append("victim_alliance_id = ?")
+            params.append(alliance_id)
+
+        sql = "SELECT * FROM killmails"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY time DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return await self._run(self._query, sql, params)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except _WRITE_ERRORS:
+                logger.exception("Failed to store killmails")
+
+    async def _run(self, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        self._connection = sqlite3.connect(self.path)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def _close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    def _write(self, killmails: List[Killmail]):
+        killmail_rows = []
+        attacker_rows = []
+        entities = {}
+        for killmail in killmails:
+            killmail_rows.append(self._killmail_row(killmail))
+            for num, attacker in enumerate(killmail.attackers):
+                attacker_rows.append(
+                    (
+                        killmail.id,
+                        num,
+                        _entity_id(attacker.character),
+                        _entity_id(attacker.corporation),
+                        _entity_id(attacker.alliance),
+                        _entity_id(attacker.faction),
+                        _entity_id(attacker.ship_type),
+                        _entity_id(attacker.weapon_type),
+                        attacker.damage_done,
+                        attacker.is_final_blow,
+                        attacker.security_status,
+                    )
+                )
+            for entity in killmail.entities():
+                if entity.name:
+                    entities[entity.id] = (
+                        entity.id,
+                        entity.name,
+                        entity.category.name.lower(),
+                    )
+
+        with self._connection:
+            self._connection.executemany(_INSERT_KILLMAIL, killmail_rows)
+            self._connection.executemany(_INSERT_ATTACKER, attacker_rows)
+            self._connection.executemany(_UPSERT_ENTITY, entities.values())
+
+        logger.debug("Stored %d killmails", len(killmails))
+
+    def _write_each(self, killmails: List[Killmail]):
+        for killmail in killmails:
+            try:
+                self._write([killmail])
+            except _WRITE_ERRORS as ex:
+                logger.error(
+                    "Dropping killmail %d, which can not be stored: %s", killmail.id, ex
+                )
+
+    @staticmethod
+    def _killmail_row(killmail: Killmail) -> tuple:
+        victim = killmail.victim
+        position = killmail.position
+        zkb = killmail.zkb
+        return (
+            killmail.id,
+            int(killmail.time.timestamp()),
+            _entity_id(killmail.solar_system),
+            _entity_id(victim.character) if victim else None,
+            _entity_id(victim.corporation) if victim else None,
+            _entity_id(victim.alliance) if victim else None,
+            _entity_id(victim.faction) if victim else None,
+            _entity_id(victim.ship_type) if victim else None,
+            victim.damage_taken if victim else None,
+            position.x if position else None,
+            position.y if position else None,
+            position.z if position else None,
+            zkb.location_id if zkb else None,
+            zkb.hash if zkb else None,
+            zkb.fitted_value if zkb else None,
+            zkb.total_value if zkb else None,
+            zkb.points if zkb else None,
+            zkb.is_npc if zkb else None,
+            zkb.is_solo if zkb else None,
+            zkb.is_awox if zkb else None,
+        )
+
+    def _query(self, sql: str, params: list) -> List[dict]:
+        return [dict(row) for row in self._connection.execute(sql, params)]
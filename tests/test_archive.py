@@ -0,0 +1,108 @@
+# type: ignore
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import TestCase
+
+from zkillboard.archive import KillmailArchive
+from zkillboard.fakes import synthetic_killmail_data
+from zkillboard.recording import Compression
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ArchiveTestMixin:
+    compression = None
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temp_dir.name) / "archive"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_archive(self, **kwargs):
+        params = {"compression": self.compression, "training_samples": 20}
+        params.update(kwargs)
+        return KillmailArchive(self.directory, **params)
+
+    def test_should_return_killmails_by_id(self):
+        # given
+        with self.create_archive() as archive:
+            for id in range(1, 51):
+                archive.add(synthetic_killmail_data(id))
+            # when
+            killmail = archive.get(42)
+            # then
+            self.assertEqual(killmail.id, 42)
+            self.assertEqual(len(killmail.attackers), 10)
+            self.assertIsNone(archive.get(99))
+            self.assertEqual(len(archive), 50)
+
+    def test_should_return_killmails_before_dictionary_is_trained(self):
+        with self.create_archive() as archive:
+            archive.add(json.dumps(synthetic_killmail_data(1)))
+            self.assertEqual(archive.get(1).id, 1)
+
+    def test_should_ignore_duplicates(self):
+        with self.create_archive() as archive:
+            self.assertTrue(archive.add(synthetic_killmail_data(1)))
+            self.assertFalse(archive.add(synthetic_killmail_data(1)))
+            self.assertEqual(len(archive), 1)
+
+    def test_should_iterate_in_batches_in_order_of_adding(self):
+        # given
+        ids = [5, 3, 9, 1, 7] + list(range(10, 40))
+        with self.create_archive() as archive:
+            for id in ids:
+                archive.add(synthetic_killmail_data(id))
+            # when
+            batches = list(archive.batches(batch_size=10))
+        # then
+        self.assertListEqual([len(obj) for obj in batches], [10, 10, 10, 5])
+        self.assertListEqual([obj.id for batch in batches for obj in batch], ids)
+
+    def test_should_reopen_archive(self):
+        # given
+        with self.create_archive(max_segment_bytes=10_000) as archive:
+            for id in range(1, 31):
+                archive.add(synthetic_killmail_data(id))
+        # when
+        with KillmailArchive(self.directory) as archive:
+            archive.add(synthetic_killmail_data(31))
+            # then
+            self.assertEqual(archive.compression, self.compression)
+            self.assertEqual(len(archive), 31)
+            self.assertEqual(archive.get(7).id, 7)
+            self.assertEqual(archive.get(31).id, 31)
+            self.assertEqual(len(list(archive.killmails())), 31)
+        self.assertGreater(len(list(self.directory.glob("segment-*.dat"))), 1)
+
+    def test_should_compress_better_than_raw_json(self):
+        # given
+        raw_size = 0
+        with self.create_archive(training_samples=100) as archive:
+            for id in range(1, 301):
+                killmail_data = synthetic_killmail_data(id)
+                raw_size += len(json.dumps(killmail_data, separators=(",", ":")))
+                archive.add(killmail_data)
+        # when
+        archive_size = sum(
+            obj.stat().st_size for obj in self.directory.glob("segment-*.dat")
+        )
+        # then
+        self.assertLess(archive_size, raw_size / 2)
+
+
+class TestKillmailArchiveZlib(ArchiveTestMixin, TestCase):
+    compression = Compression.GZIP
+
+
+@unittest.skipUnless(zstandard, "zstandard not installed")
+class TestKillmailArchiveZstd(ArchiveTestMixin, TestCase):
+    compression = Compression.ZSTD
@@ -0,0 +1,136 @@
+# type: ignore
+
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import AsyncMock, patch
+
+from zkillboard.cli import LineWriter, _killmail_encoder, main
+from zkillboard.recording import StreamRecorder
+
+from .factories import KillmailFactory
+from .fixtures import killmails_raw
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def read_lines(directory: Path) -> list:
+    lines = []
+    for path in sorted(directory.iterdir()):
+        lines += path.read_text().splitlines()
+    return lines
+
+
+class TestLineWriter(TestCase):
+    def test_should_buffer_lines_until_flushed(self):
+        # given
+        stream = io.BytesIO()
+        writer = LineWriter(stream=stream)
+        # when
+        writer.write_line(b"a")
+        writer.write_line(b"b")
+        before = stream.getvalue()
+        writer.flush()
+        # then
+        self.assertEqual(before, b"")
+        self.assertEqual(stream.getvalue(), b"a\nb\n")
+
+    def test_should_flush_when_buffer_is_full(self):
+        # given
+        stream = io.BytesIO()
+        writer = LineWriter(stream=stream, buffer_size=4)
+        # when
+        writer.write_line(b"abc")
+        # then
+        self.assertEqual(stream.getvalue(), b"abc\n")
+
+    def test_should_rotate_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            writer = LineWriter(
+                directory=Path(temp_dir), max_file_bytes=4, buffer_size=1
+            )
+            # when
+            for line in [b"abc", b"def", b"ghi"]:
+                writer.write_line(line)
+            writer.close()
+            # then
+            self.assertEqual(len(list(Path(temp_dir).iterdir())), 3)
+            self.assertListEqual(read_lines(Path(temp_dir)), ["abc", "def", "ghi"])
+
+
+@unittest.skipUnless(orjson, "orjson not installed")
+class TestKillmailEncoder(TestCase):
+    def test_should_encode_same_with_and_without_orjson(self):
+        # given
+        killmail = KillmailFactory()
+        # when
+        with patch.dict(sys.modules, {"orjson": None}):
+            encode_stdlib = _killmail_encoder()
+        encode_orjson = _killmail_encoder()
+        # then
+        self.assertEqual(encode_orjson(killmail), encode_stdlib(killmail))
+        result = json.loads(encode_orjson(killmail))
+        self.assertEqual(result, json.loads(killmail.asjson()))
+        self.assertEqual(result["solar_system"]["category"], "solar_system")
+
+
+class TestMain(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.recording = Path(self.temp_dir.name) / "recording"
+        self.output = Path(self.temp_dir.name) / "output"
+        recorder = StreamRecorder(self.recording)
+        for killmail_id in [1, 2, 3]:
+            killmail_data = {**killmails_raw[111519365], "killmail_id": killmail_id}
+            recorder.write(json.dumps(killmail_data))
+        recorder.close()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_should_write_raw_frames(self):
+        # when
+        result = main(["--replay", str(self.recording), "-o", str(self.output)])
+        # then
+        self.assertEqual(result, 0)
+        lines = read_lines(self.output)
+        self.assertListEqual(
+            [json.loads(obj)["killmail_id"] for obj in lines], [1, 2, 3]
+        )
+
+    def test_should_stop_after_limit(self):
+        # when
+        main(["--replay", str(self.recording), "-o", str(self.output), "--limit", "2"])
+        # then
+        self.assertEqual(len(read_lines(self.output)), 2)
+
+    def test_should_run_with_uvloop(self):
+        # when
+        result = main(
+            ["--replay", str(self.recording), "-o", str(self.output), "--uvloop"]
+        )
+        # then
+        self.assertEqual(result, 0)
+        self.assertEqual(len(read_lines(self.output)), 3)
+
+    @patch("zkillboard.killmails.Killmail.resolve_entities", new_callable=AsyncMock)
+    def test_should_write_resolved_killmails(self, mock_resolve):
+        # when
+        main(["--replay", str(self.recording), "-o", str(self.output), "--resolved"])
+        # then
+        lines = [json.loads(obj) for obj in read_lines(self.output)]
+        self.assertListEqual([obj["id"] for obj in lines], [1, 2, 3])
+        self.assertEqual(lines[0]["solar_system"]["id"], 30001994)
+        self.assertEqual(lines[0]["solar_system"]["category"], "undefined")
+
+    def test_should_reject_invalid_channels(self):
+        with self.assertRaises(SystemExit), patch("sys.stderr", io.StringIO()):
+            main(["invalid:1"])
@@ -0,0 +1,462 @@
+# type: ignore
+
+import asyncio
+import datetime as dt
+import itertools
+import json
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import aiohttp
+
+from zkillboard import config
+from zkillboard.client import ClientFiltered, ClientKillStream, Filter, FilterType
+from zkillboard.fakes import (
+    FakeEsiServer,
+    FakeHistoryServer,
+    FakeZkbServer,
+    synthetic_frames,
+    synthetic_killmail_data,
+)
+from zkillboard.history import ZkbHistorySource
+from zkillboard.hooks import Hook, OpenTelemetryHook, SlowestKillmailsProfiler
+from zkillboard.killmails import Killmail
+from zkillboard.metrics import (
+    MESSAGES_TOTAL,
+    STAGE_SECONDS,
+    STALLS_TOTAL,
+    STREAM_LAG_SECONDS,
+    InMemoryMetrics,
+    NullMetrics,
+)
+from zkillboard.parsing import Ordering
+from zkillboard.recording import ReplaySource, StreamRecorder
+
+from .factories import KillmailFactory
+from .fixtures import killmails_raw
+
+MODULE_PATH = "zkillboard.client"
+
+
+class MyClient(ClientKillStream):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.killmails = []
+
+    async def on_new_killmail(self, killmail: Killmail):
+        self.killmails.append(killmail)
+
+
+class MyClientFiltered(ClientFiltered):
+    async def on_new_killmail(self, killmail: Killmail):
+        pass
+
+
+class TestFilter(TestCase):
+    def test_should_return_channel(self):
+        self.assertEqual(Filter(FilterType.REGION, 42).channel(), "region:42")
+
+    def test_should_return_channel_for_all(self):
+        self.assertEqual(Filter(FilterType.ALL, 0).channel(), "all:*")
+
+
+class TestFilterMatchesData(TestCase):
+    def test_should_match_raw_killmail_data(self):
+        # given
+        killmail_data = killmails_raw[111519365]
+        # when/then
+        self.assertTrue(Filter(FilterType.SYSTEM, 30001994).matches_data(killmail_data))
+        self.assertTrue(
+            Filter(FilterType.ALLIANCE, 99001317).matches_data(killmail_data)
+        )
+        self.assertTrue(Filter(FilterType.ALL, 0).matches_data(killmail_data))
+        self.assertFalse(Filter(FilterType.SYSTEM, 1).matches_data(killmail_data))
+        self.assertFalse(Filter(FilterType.SHIP, 1).matches_data(killmail_data))
+        self.assertFalse(
+            Filter(FilterType.REGION, 10000002).matches_data(killmail_data)
+        )
+
+
+class TestClientFilteredBackfill(IsolatedAsyncioTestCase):
+    async def test_should_not_backfill_channels_only_zkb_can_match(self):
+        # given
+        client = MyClientFiltered(
+            [Filter(FilterType.REGION, 10000002)], history=MagicMock()
+        )
+        since = dt.datetime.now(dt.timezone.utc)
+        # when
+        with self.assertLogs("zkillboard", level="WARNING") as logs:
+            client._start_backfill(0, 1, since)
+            client._start_backfill(1, 1, since)
+        # then
+        self.assertEqual(len(logs.output), 1)
+        self.assertDictEqual(client._backfills, {})
+
+    async def test_should_skip_backfilled_killmails_not_matching(self):
+        # given
+        client = MyClientFiltered([Filter(FilterType.SYSTEM, 30001994)])
+        other_data = {**killmails_raw[111519365], "solar_system_id": 30000001}
+        # when/then
+        self.assertTrue(client.can_backfill())
+        self.assertTrue(client.matches_data(killmails_raw[111519365]))
+        self.assertFalse(client.matches_data(other_data))
+
+
+class TestFilterFromChannel(TestCase):
+    def test_should_create_filter_from_channel(self):
+        self.assertEqual(
+            Filter.from_channel("alliance:99000001"),
+            Filter(FilterType.ALLIANCE, 99000001),
+        )
+
+    def test_should_create_filter_for_killstream(self):
+        self.assertEqual(Filter.from_channel("killstream"), Filter(FilterType.ALL, 0))
+
+    def test_should_raise_error_for_invalid_channel(self):
+        with self.assertRaises(ValueError):
+            Filter.from_channel("invalid:1")
+
+
+class TestFilterMatches(TestCase):
+    def test_should_match_attacker_alliance(self):
+        killmail = KillmailFactory()
+        alliance_id = killmail.attackers[0].alliance.id
+        self.assertTrue(Filter(FilterType.ALLIANCE, alliance_id).matches(killmail))
+        self.assertFalse(Filter(FilterType.ALLIANCE, 1).matches(killmail))
+
+    def test_should_match_solar_system(self):
+        killmail = KillmailFactory()
+        system_id = killmail.solar_system.id
+        self.assertTrue(Filter(FilterType.SYSTEM, system_id).matches(killmail))
+
+    def test_should_never_match_region(self):
+        killmail = KillmailFactory()
+        self.assertFalse(Filter(FilterType.REGION, 10000002).matches(killmail))
+
+    def test_should_match_filters_of_client(self):
+        killmail = KillmailFactory()
+        system_id = killmail.solar_system.id
+        client = MyClientFiltered([Filter(FilterType.SYSTEM, system_id)])
+        self.assertTrue(client.matches(killmail))
+        client = MyClientFiltered([Filter(FilterType.SYSTEM, 1)])
+        self.assertFalse(client.matches(killmail))
+
+
+class TestChannelShards(TestCase):
+    def test_should_spread_channels_over_shards(self):
+        # given
+        filters = [Filter(FilterType.REGION, id) for id in range(5)]
+        client = MyClientFiltered(filters, shards=2)
+        # when
+        result = client.channel_shards()
+        # then
+        self.assertListEqual(
+            result,
+            [["region:0", "region:2", "region:4"], ["region:1", "region:3"]],
+        )
+
+    def test_should_not_create_more_shards_than_channels(self):
+        # given
+        client = MyClient(shards=4)
+        # when
+        result = client.channel_shards()
+        # then
+        self.assertListEqual(result, [["killstream"]])
+
+
+@patch(MODULE_PATH + ".Killmail.resolve_entities", new_callable=AsyncMock)
+class TestProcessKillmailData(IsolatedAsyncioTestCase):
+    async def test_should_deliver_duplicate_killmails_once(self, mock_resolve):
+        # given
+        client = MyClient()
+        killmail_data = killmails_raw[111519365]
+        # when
+        client._process_killmail_data(killmail_data)
+        client._process_killmail_data(killmail_data)
+        await asyncio.sleep(0)
+        # then
+        self.assertEqual(len(client.killmails), 1)
+        self.assertEqual(client.killmails[0].id, 111519365)
+
+    async def test_should_record_metrics(self, mock_resolve):
+        # given
+        metrics = InMemoryMetrics()
+        client = MyClient(metrics=metrics)
+        # when
+        client._process_frame(json.dumps(killmails_raw[111519365]))
+        await asyncio.sleep(0)
+        # then
+        self.assertEqual(len(client.killmails), 1)
+        self.assertEqual(metrics.counter(MESSAGES_TOTAL), 1)
+        for stage in ["decode", "parse", "resolve", "callback"]:
+            self.assertEqual(metrics.histogram_count(STAGE_SECONDS, stage=stage), 1)
+        self.assertEqual(metrics.histogram_count(STREAM_LAG_SECONDS), 1)
+
+    async def test_should_call_hooks_for_each_stage(self, mock_resolve):
+        # given
+        hook = MagicMock(spec=Hook)
+        profiler = SlowestKillmailsProfiler()
+        client = MyClient(hooks=[hook, profiler])
+        data = json.dumps(killmails_raw[111519365])
+        # when
+        client._process_frame(data)
+        await asyncio.sleep(0)
+        # then
+        stages = [obj.args[0] for obj in hook.on_stage_end.call_args_list]
+        self.assertListEqual(stages, ["decode", "parse", "resolve", "callback"])
+        hook.on_killmail_end.assert_called_once()
+        entry = profiler.slowest()[0]
+        self.assertEqual(entry.killmail_id, 111519365)
+        self.assertEqual(entry.attackers_count, 3)
+        self.assertEqual(entry.size, len(data))
+
+    async def test_should_end_stage_for_hooks_when_it_fails(self, mock_resolve):
+        # given
+        mock_resolve.side_effect = aiohttp.ClientError("failed")
+        hook = MagicMock(spec=Hook)
+        tracer = MagicMock()
+        client = MyClient(hooks=[hook, OpenTelemetryHook(tracer)])
+        data = json.dumps(killmails_raw[111519365])
+        # when
+        with self.assertLogs("zkillboard", level="ERROR"):
+            client._process_frame(data)
+            await asyncio.sleep(0)
+        # then
+        stages = [obj.args[0] for obj in hook.on_stage_end.call_args_list]
+        self.assertListEqual(stages, ["decode", "parse", "resolve"])
+        hook.on_stage_error.assert_called_once()
+        self.assertEqual(hook.on_stage_error.call_args.args[0], "resolve")
+        self.assertEqual(tracer.start_span.return_value.end.call_count, 3)
+        context = hook.on_stage_end.call_args.args[1]
+        self.assertDictEqual(context.spans, {})
+
+    def test_should_require_in_memory_metrics_for_exporter(self, mock_resolve):
+        with self.assertRaises(ValueError):
+            MyClient(metrics=NullMetrics(), metrics_port=9090)
+
+
+@patch(MODULE_PATH + ".Killmail.resolve_entities", new_callable=AsyncMock)
+class TestRunReplay(IsolatedAsyncioTestCase):
+    def record_killmails(self, directory: str, killmail_ids: list):
+        recorder = StreamRecorder(directory)
+        for num, killmail_id in enumerate(killmail_ids):
+            killmail_data = {**killmails_raw[111519365], "killmail_id": killmail_id}
+            recorder.write(json.dumps(killmail_data), received_at=100.0 + num)
+        recorder.close()
+
+    async def test_should_process_recorded_killmails(self, mock_resolve):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            self.record_killmails(temp_dir, [1, 2, 2, 3])
+            client = MyClient()
+            # when
+            await client.run_replay(ReplaySource(temp_dir, speed=None))
+            # then
+            self.assertListEqual([obj.id for obj in client.killmails], [1, 2, 3])
+
+    async def test_should_process_recorded_killmails_with_workers(self, mock_resolve):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            self.record_killmails(temp_dir, [3, 1, 2])
+            client = MyClient(parse_workers=2, parse_ordering=Ordering.KILLMAIL_ID)
+            # when
+            await client.run_replay(ReplaySource(temp_dir, speed=None))
+            # then
+            self.assertListEqual(sorted(obj.id for obj in client.killmails), [1, 2, 3])
+
+
+class TestRunClient(IsolatedAsyncioTestCase):
+    async def test_should_receive_and_resolve_killmails_from_configured_urls(self):
+        # given
+        zkb = FakeZkbServer(itertools.islice(synthetic_frames(), 3), rate=100)
+        esi = FakeEsiServer()
+        await zkb.start()
+        await esi.start()
+        client = MyClient(ws_url=zkb.url, esi_url=esi.url)
+        # when
+        runner = asyncio.create_task(client.run_client())
+        try:
+            for _ in range(100):
+                if len(client.killmails) == 3:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await zkb.stop()
+            await esi.stop()
+        # then
+        self.assertListEqual([obj.id for obj in client.killmails], [1, 2, 3])
+        self.assertListEqual(zkb.subscriptions, ["killstream"])
+        killmail = client.killmails[0]
+        self.assertTrue(killmail.victim.character.name.startswith("Name "))
+
+    @patch(MODULE_PATH + ".Killmail.resolve_entities", new_callable=AsyncMock)
+    async def test_should_receive_large_killmails_with_runtime_config(
+        self, mock_resolve
+    ):
+        # given
+        frames = itertools.islice(synthetic_frames(attackers=5000), 2)
+        zkb = FakeZkbServer(frames, rate=100)
+        await zkb.start()
+        runtime = config.RuntimeConfig(max_msg_size=4 * 1024 * 1024, compress=15)
+        client = MyClient(ws_url=zkb.url, runtime=runtime)
+        # when
+        runner = asyncio.create_task(client.run_client())
+        try:
+            for _ in range(100):
+                if len(client.killmails) == 2:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await zkb.stop()
+        # then
+        self.assertListEqual([obj.id for obj in client.killmails], [1, 2])
+        self.assertEqual(len(client.killmails[0].attackers), 5000)
+
+
+@patch(MODULE_PATH + ".Killmail.resolve_entities", new_callable=AsyncMock)
+class TestRunClientStalls(IsolatedAsyncioTestCase):
+    async def run_until_resubscribed(self, runtime):
+        zkb = FakeZkbServer(itertools.islice(synthetic_frames(), 2), rate=100)
+        await zkb.start()
+        metrics = InMemoryMetrics()
+        client = MyClient(ws_url=zkb.url, runtime=runtime, metrics=metrics)
+        runner = asyncio.create_task(client.run_client())
+        try:
+            for _ in range(100):
+                if len(zkb.subscriptions) >= 2:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await zkb.stop()
+        return zkb, client, metrics
+
+    async def test_should_reconnect_immediately_when_stalled(self, mock_resolve):
+        # given
+        runtime = config.RuntimeConfig(
+            reconnect_delay=60, min_inactivity_timeout=0.1, max_inactivity_timeout=0.2
+        )
+        # when
+        zkb, client, metrics = await self.run_until_resubscribed(runtime)
+        # then
+        self.assertListEqual(zkb.subscriptions, ["killstream", "killstream"])
+        self.assertListEqual([obj.id for obj in client.killmails], [1, 2])
+        self.assertEqual(metrics.counter(STALLS_TOTAL, shard="0"), 1)
+
+    async def test_should_not_reconnect_quiet_filtered_channel(self, mock_resolve):
+        # given
+        zkb = FakeZkbServer([])
+        await zkb.start()
+        metrics = InMemoryMetrics()
+        client = MyClientFiltered(
+            [Filter(FilterType.REGION, 10000002)], ws_url=zkb.url, metrics=metrics
+        )
+        # when
+        with patch(MODULE_PATH + ".InactivityWatchdog") as mock_watchdog:
+            runner = asyncio.create_task(client.run_client())
+            try:
+                await asyncio.sleep(0.3)
+            finally:
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+                await zkb.stop()
+        # then
+        self.assertFalse(mock_watchdog.called)
+        self.assertEqual(zkb.connections, 1)
+        self.assertListEqual(zkb.subscriptions, ["region:10000002"])
+        self.assertEqual(metrics.counter(STALLS_TOTAL, shard="0"), 0)
+
+    async def test_should_switch_to_standby_connection(self, mock_resolve):
+        # given
+        runtime = config.RuntimeConfig(
+            min_inactivity_timeout=0.1, max_inactivity_timeout=0.2, standby=True
+        )
+        # when
+        zkb, _, _ = await self.run_until_resubscribed(runtime)
+        # then
+        self.assertListEqual(zkb.subscriptions, ["killstream", "killstream"])
+        self.assertEqual(zkb.connections, 3)
+
+    async def test_should_backfill_missed_killmails_after_reconnect(self, mock_resolve):
+        # given
+        history_server = FakeHistoryServer(
+            [synthetic_killmail_data(id) for id in range(1, 6)]
+        )
+        await history_server.start()
+        history = ZkbHistorySource(
+            history_server.history_url, history_server.killmails_url
+        )
+        zkb = FakeZkbServer(itertools.islice(synthetic_frames(), 2), rate=100)
+        await zkb.start()
+        runtime = config.RuntimeConfig(
+            min_inactivity_timeout=0.1, max_inactivity_timeout=0.2
+        )
+        client = MyClient(ws_url=zkb.url, runtime=runtime, history=history)
+        # when
+        runner = asyncio.create_task(client.run_client())
+        try:
+            for _ in range(100):
+                if len(client.killmails) == 5:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await zkb.stop()
+            await history_server.stop()
+        # then
+        self.assertListEqual(
+            sorted(obj.id for obj in client.killmails), [1, 2, 3, 4, 5]
+        )
+        self.assertEqual(history_server.requests, 3)
+        self.assertEqual(client.last_killmail_id, 5)
+
+    async def test_should_backfill_from_killmail_before_disconnect(self, mock_resolve):
+        # given
+        history_server = FakeHistoryServer(
+            [synthetic_killmail_data(id) for id in range(1, 6)]
+        )
+        await history_server.start()
+        history = ZkbHistorySource(
+            history_server.history_url, history_server.killmails_url
+        )
+        zkb = FakeZkbServer(itertools.islice(synthetic_frames(), 2), rate=100)
+        await zkb.start()
+        runtime = config.RuntimeConfig(
+            min_inactivity_timeout=0.1, max_inactivity_timeout=0.2
+        )
+
+        class MyShardedClient(MyClient):
+            async def _ws_connect(self, session):
+                if zkb.connections:
+                    # another shard delivers a newer killmail during the outage
+                    self._is_new_killmail(4)
+                    killmail_data = synthetic_killmail_data(4)
+                    await self._deliver_killmail(
+                        Killmail.create_from_zkb_data(killmail_data)
+                    )
+                return await super()._ws_connect(session)
+
+        client = MyShardedClient(ws_url=zkb.url, runtime=runtime, history=history)
+        # when
+        runner = asyncio.create_task(client.run_client())
+        try:
+            for _ in range(100):
+                if len(client.killmails) == 5:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+            await zkb.stop()
+            await history_server.stop()
+        # then
+        self.assertListEqual(
+            sorted(obj.id for obj in client.killmails), [1, 2, 3, 4, 5]
+        )
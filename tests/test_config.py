@@ -0,0 +1,20 @@
+from unittest import TestCase
+
+from zkillboard.config import RuntimeConfig
+
+
+class TestRuntimeConfig(TestCase):
+    def test_should_have_defaults_for_large_killmails(self):
+        # when
+        obj = RuntimeConfig()
+        # then
+        self.assertFalse(obj.use_uvloop)
+        self.assertEqual(obj.max_msg_size, 32 * 1024 * 1024)
+        self.assertEqual(obj.compress, 15)
+        self.assertIsNotNone(obj.heartbeat)
+
+    def test_should_disable_inactivity_watchdog_by_default(self):
+        # when
+        obj = RuntimeConfig()
+        # then
+        self.assertIsNone(obj.max_inactivity_timeout)
@@ -0,0 +1,65 @@
+import random
+from unittest import TestCase
+
+from zkillboard.connection import Backoff, InactivityWatchdog
+
+
+class TestBackoff(TestCase):
+    def test_should_double_delays_up_to_maximum(self):
+        # given
+        backoff = Backoff(initial=1, maximum=5, jitter=0)
+        # when
+        result = [backoff.next_delay() for _ in range(5)]
+        # then
+        self.assertListEqual(result, [1, 2, 4, 5, 5])
+
+    def test_should_reduce_delays_by_jitter(self):
+        # given
+        backoff = Backoff(initial=8, maximum=8, jitter=0.5, rnd=random.Random(42))
+        # when
+        result = [backoff.next_delay() for _ in range(20)]
+        # then
+        self.assertTrue(all(4 <= obj <= 8 for obj in result))
+        self.assertGreater(len(set(result)), 1)
+
+    def test_should_start_again_after_reset(self):
+        # given
+        backoff = Backoff(initial=1, maximum=5, jitter=0)
+        backoff.next_delay()
+        backoff.next_delay()
+        # when
+        backoff.reset()
+        # then
+        self.assertEqual(backoff.next_delay(), 1)
+
+
+class TestInactivityWatchdog(TestCase):
+    def test_should_use_max_timeout_while_rate_is_unknown(self):
+        # given
+        watchdog = InactivityWatchdog(min_timeout=10, max_timeout=100)
+        watchdog.start(now=0)
+        # when/then
+        self.assertEqual(watchdog.timeout(), 100)
+        self.assertFalse(watchdog.is_stalled(now=99))
+        self.assertTrue(watchdog.is_stalled(now=100))
+
+    def test_should_follow_message_rate(self):
+        # given
+        watchdog = InactivityWatchdog(min_timeout=10, max_timeout=100, factor=5)
+        watchdog.start(now=0)
+        # when
+        for now in range(0, 20, 4):
+            watchdog.record_message(now=now)
+        # then
+        self.assertEqual(watchdog.timeout(), 20)
+        self.assertFalse(watchdog.is_stalled(now=35))
+        self.assertTrue(watchdog.is_stalled(now=36))
+
+    def test_should_keep_timeout_within_limits(self):
+        # given
+        watchdog = InactivityWatchdog(min_timeout=10, max_timeout=100, factor=5)
+        # when
+        watchdog.record_message(now=0)
+        watchdog.record_message(now=0.1)
+        # then
+        self.assertEqual(watchdog.timeout(), 10)
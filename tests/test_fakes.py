@@ -0,0 +1,95 @@
+# type: ignore
+
+import itertools
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import aiohttp
+
+from zkillboard.esi import create_eve_entities_from_ids
+from zkillboard.eveuniverse import EveEntity
+from zkillboard.fakes import (
+    FakeEsiServer,
+    FakeZkbServer,
+    synthetic_frames,
+    synthetic_killmail_data,
+)
+from zkillboard.killmails import Killmail
+
+
+class TestSyntheticKillmails(TestCase):
+    def test_should_create_parsable_killmail(self):
+        # when
+        killmail = Killmail.create_from_zkb_data(synthetic_killmail_data(42, 5))
+        # then
+        self.assertEqual(killmail.id, 42)
+        self.assertEqual(len(killmail.attackers), 5)
+        self.assertEqual(killmail.attacker_final_blow(), killmail.attackers[0])
+
+    def test_should_create_frames_with_ascending_ids(self):
+        # when
+        frames = list(itertools.islice(synthetic_frames(start_id=10), 3))
+        # then
+        ids = [json.loads(obj)["killmail_id"] for obj in frames]
+        self.assertListEqual(ids, [10, 11, 12])
+
+
+class TestFakeZkbServer(IsolatedAsyncioTestCase):
+    async def test_should_push_frames_to_subscribed_client(self):
+        # given
+        server = FakeZkbServer(itertools.islice(synthetic_frames(), 3), rate=100)
+        await server.start()
+        # when
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(server.url) as ws:
+                    await ws.send_json({"action": "sub", "channel": "killstream"})
+                    ids = [(await ws.receive_json())["killmail_id"] for _ in range(3)]
+        finally:
+            await server.stop()
+        # then
+        self.assertListEqual(ids, [1, 2, 3])
+        self.assertListEqual(server.subscriptions, ["killstream"])
+
+
+class TestFakeEsiServer(IsolatedAsyncioTestCase):
+    async def test_should_resolve_names(self):
+        # given
+        server = FakeEsiServer()
+        await server.start()
+        # when
+        try:
+            result = await create_eve_entities_from_ids([5, 6], url=server.url)
+        finally:
+            await server.stop()
+        # then
+        self.assertEqual(
+            result[5], EveEntity(5, "Name 5", EveEntity.Category.CHARACTER)
+        )
+        self.assertEqual(server.requests, 1)
+
+    async def test_should_return_errors(self):
+        # given
+        server = FakeEsiServer(error_rate=1)
+        await server.start()
+        # when/then
+        try:
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await create_eve_entities_from_ids([5], url=server.url)
+        finally:
+            await server.stop()
+        self.assertEqual(server.errors, 1)
+
+    async def test_should_enforce_rate_limit(self):
+        # given
+        server = FakeEsiServer(rate_limit=1)
+        await server.start()
+        # when
+        try:
+            await create_eve_entities_from_ids([5], url=server.url)
+            with self.assertRaises(aiohttp.ClientResponseError) as cm:
+                await create_eve_entities_from_ids([6], url=server.url)
+        finally:
+            await server.stop()
+        # then
+        self.assertEqual(cm.exception.status, 420)
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from zkillboard.helpers import RecentIds, chunks
+
+
+class TestChunks(TestCase):
+    def test_should_split_list_into_chunks(self):
+        # when
+        result = list(chunks([1, 2, 3, 4, 5], 2))
+        # then
+        self.assertListEqual(result, [[1, 2], [3, 4], [5]])
+
+
+class TestRecentIds(TestCase):
+    def test_should_report_new_ids_only_once(self):
+        # given
+        ids = RecentIds(10)
+        # when/then
+        self.assertTrue(ids.add(1))
+        self.assertFalse(ids.add(1))
+        self.assertIn(1, ids)
+
+    def test_should_forget_oldest_ids_when_full(self):
+        # given
+        ids = RecentIds(2)
+        # when
+        ids.add(1)
+        ids.add(2)
+        ids.add(3)
+        # then
+        self.assertNotIn(1, ids)
+        self.assertIn(2, ids)
+        self.assertIn(3, ids)
+        self.assertEqual(len(ids), 2)
@@ -0,0 +1,62 @@
+import datetime as dt
+from unittest import IsolatedAsyncioTestCase
+
+from zkillboard.fakes import FakeHistoryServer, synthetic_killmail_data
+from zkillboard.history import ZkbHistorySource, backfill_killmails
+from zkillboard.killmails import Killmail
+from zkillboard.metrics import BACKFILL_KILLMAILS_TOTAL, InMemoryMetrics
+
+
+class TestBackfillKillmails(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        killmails = [synthetic_killmail_data(id) for id in range(1, 11)]
+        self.server = FakeHistoryServer(killmails, latency=0.01)
+        await self.server.start()
+        self.source = ZkbHistorySource(
+            self.server.history_url, self.server.killmails_url
+        )
+        self.since = dt.datetime.now(dt.timezone.utc)
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_should_fetch_missed_killmails(self):
+        # given
+        metrics = InMemoryMetrics()
+        # when
+        result = [
+            obj
+            async for obj in backfill_killmails(
+                self.source,
+                self.since,
+                after_id=5,
+                is_known=lambda id: id == 7,
+                metrics=metrics,
+            )
+        ]
+        # then
+        self.assertListEqual(
+            sorted(obj["killmail_id"] for obj in result), [6, 8, 9, 10]
+        )
+        killmail = Killmail.create_from_zkb_data(result[0])
+        self.assertTrue(killmail.zkb.hash)
+        self.assertEqual(metrics.counter(BACKFILL_KILLMAILS_TOTAL), 4)
+
+    async def test_should_limit_concurrency_and_number_of_killmails(self):
+        # when
+        result = [
+            obj
+            async for obj in backfill_killmails(
+                self.source,
+                self.since,
+                after_id=0,
+                is_known=lambda id: False,
+                concurrency=2,
+                limit=6,
+            )
+        ]
+        # then
+        self.assertListEqual(
+            sorted(obj["killmail_id"] for obj in result), [1, 2, 3, 4, 5, 6]
+        )
+        self.assertEqual(self.server.max_concurrent_requests, 2)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from zkillboard.hooks import (
+    KillmailContext,
+    OpenTelemetryHook,
+    SlowestKillmailsProfiler,
+)
+
+
+def make_context(killmail_id: int, **durations) -> KillmailContext:
+    return KillmailContext(
+        killmail_id=killmail_id, attackers_count=3, size=100, durations=durations
+    )
+
+
+class TestSlowestKillmailsProfiler(TestCase):
+    def test_should_keep_slowest_killmails_only(self):
+        # given
+        profiler = SlowestKillmailsProfiler(size=2)
+        # when
+        profiler.on_killmail_end(make_context(1, parse=0.1, resolve=0.2))
+        profiler.on_killmail_end(make_context(2, parse=0.5, resolve=0.5))
+        profiler.on_killmail_end(make_context(3, parse=0.05))
+        profiler.on_killmail_end(make_context(4, parse=0.2, resolve=0.2))
+        # then
+        result = profiler.slowest()
+        self.assertListEqual([obj.killmail_id for obj in result], [2, 4])
+        self.assertDictEqual(result[0].durations, {"parse": 0.5, "resolve": 0.5})
+        self.assertAlmostEqual(result[0].total_duration, 1.0)
+
+
+class TestOpenTelemetryHook(TestCase):
+    def test_should_create_one_span_per_stage(self):
+        # given
+        tracer = MagicMock()
+        hook = OpenTelemetryHook(tracer)
+        context = make_context(42)
+        # when
+        hook.on_stage_start("parse", context)
+        hook.on_stage_end("parse", context, 0.1)
+        # then
+        tracer.start_span.assert_called_once_with("zkillboard.parse")
+        span = tracer.start_span.return_value
+        span.set_attribute.assert_any_call("killmail.id", 42)
+        span.set_attribute.assert_any_call("killmail.attackers_count", 3)
+        span.end.assert_called_once_with()
+
+    def test_should_mark_span_of_failed_stage(self):
+        # given
+        tracer = MagicMock()
+        hook = OpenTelemetryHook(tracer)
+        context = make_context(42)
+        # when
+        hook.on_stage_start("resolve", context)
+        hook.on_stage_error("resolve", context, TimeoutError())
+        hook.on_stage_end("resolve", context, 0.1)
+        # then
+        span = tracer.start_span.return_value
+        span.set_attribute.assert_any_call("error", True)
+        span.set_attribute.assert_any_call("error.type", "TimeoutError")
+        span.end.assert_called_once_with()
+        self.assertDictEqual(context.spans, {})
@@ -0,0 +1,75 @@
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import aiohttp
+from aiohttp.test_utils import unused_port
+
+from zkillboard.metrics import InMemoryMetrics, NullMetrics, PrometheusExporter
+
+
+class TestInMemoryMetrics(TestCase):
+    def test_should_count(self):
+        # given
+        metrics = InMemoryMetrics()
+        # when
+        metrics.inc("dummy_total")
+        metrics.inc("dummy_total", 2)
+        metrics.inc("dummy_total", shard="1")
+        # then
+        self.assertEqual(metrics.counter("dummy_total"), 3)
+        self.assertEqual(metrics.counter("dummy_total", shard="1"), 1)
+
+    def test_should_set_gauge(self):
+        # given
+        metrics = InMemoryMetrics()
+        # when
+        metrics.set_gauge("dummy", 5)
+        metrics.set_gauge("dummy", 2)
+        # then
+        self.assertEqual(metrics.gauge("dummy"), 2)
+
+    def test_should_render_prometheus_text_format(self):
+        # given
+        metrics = InMemoryMetrics(buckets=[0.1, 1.0])
+        metrics.inc("dummy_total", 3)
+        metrics.observe("dummy_seconds", 0.05, stage="parse")
+        metrics.observe("dummy_seconds", 0.5, stage="parse")
+        # when
+        result = metrics.render_prometheus()
+        # then
+        lines = result.splitlines()
+        self.assertIn("# TYPE dummy_total counter", lines)
+        self.assertIn("dummy_total 3", lines)
+        self.assertIn("# TYPE dummy_seconds histogram", lines)
+        self.assertIn('dummy_seconds_bucket{stage="parse",le="0.1"} 1', lines)
+        self.assertIn('dummy_seconds_bucket{stage="parse",le="1.0"} 2', lines)
+        self.assertIn('dummy_seconds_bucket{stage="parse",le="+Inf"} 2', lines)
+        self.assertIn('dummy_seconds_count{stage="parse"} 2', lines)
+
+
+class TestNullMetrics(TestCase):
+    def test_should_accept_all_calls(self):
+        metrics = NullMetrics()
+        metrics.inc("dummy_total")
+        metrics.set_gauge("dummy", 1)
+        metrics.observe("dummy_seconds", 1)
+
+
+class TestPrometheusExporter(IsolatedAsyncioTestCase):
+    async def test_should_serve_metrics(self):
+        # given
+        metrics = InMemoryMetrics()
+        metrics.inc("dummy_total")
+        port = unused_port()
+        exporter = PrometheusExporter(metrics, port=port)
+        await exporter.start()
+        # when
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    status = resp.status
+                    text = await resp.text()
+        finally:
+            await exporter.stop()
+        # then
+        self.assertEqual(status, 200)
+        self.assertIn("dummy_total 1", text)
@@ -0,0 +1,109 @@
+# type: ignore
+
+import json
+import pickle
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from zkillboard.killmails import Killmail
+from zkillboard.parsing import (
+    CompactKillmail,
+    Ordering,
+    ProcessPoolParser,
+    parse_frame,
+)
+
+from .fixtures import killmails_raw
+
+
+def make_frame(killmail_id: int) -> str:
+    killmail_data = {**killmails_raw[111519365], "killmail_id": killmail_id}
+    return json.dumps(killmail_data)
+
+
+class TestParseFrame(TestCase):
+    def test_should_parse_raw_frame(self):
+        # when
+        compact_killmail = parse_frame(make_frame(111519365))
+        # then
+        self.assertEqual(compact_killmail.id, 111519365)
+        killmail = compact_killmail.to_killmail()
+        self.assertEqual(killmail.id, 111519365)
+        self.assertEqual(killmail.solar_system.id, 30001994)
+
+
+class TestCompactKillmail(TestCase):
+    def test_should_build_same_killmail_as_from_zkb_data(self):
+        for killmail_id, killmail_data in killmails_raw.items():
+            with self.subTest(killmail_id=killmail_id):
+                # given
+                compact_killmail = CompactKillmail.from_zkb_data(killmail_data)
+                # when
+                killmail = pickle.loads(pickle.dumps(compact_killmail)).to_killmail()
+                # then
+                self.assertEqual(killmail, Killmail.create_from_zkb_data(killmail_data))
+
+    def test_should_build_killmail_with_missing_parts(self):
+        # given
+        killmail_data = {
+            "killmail_id": 42,
+            "killmail_time": "2023-06-01T12:00:00Z",
+            "attackers": [{"character_id": 1001}],
+        }
+        # when
+        killmail = CompactKillmail.from_zkb_data(killmail_data).to_killmail()
+        # then
+        self.assertEqual(killmail, Killmail.create_from_zkb_data(killmail_data))
+
+
+class TestProcessPoolParser(IsolatedAsyncioTestCase):
+    async def collect(self, parser: ProcessPoolParser, amount: int) -> list:
+        ids = []
+        async for killmail in parser.results():
+            ids.append(killmail.id)
+            if len(ids) == amount:
+                break
+        return ids
+
+    async def test_should_return_killmails_in_arrival_order(self):
+        # given
+        parser = ProcessPoolParser(workers=2)
+        parser.start()
+        frame_ids = [5, 3, 4, 1, 2]
+        # when
+        try:
+            for killmail_id in frame_ids:
+                parser.submit(make_frame(killmail_id))
+            result = await self.collect(parser, len(frame_ids))
+        finally:
+            parser.close()
+        # then
+        self.assertListEqual(result, frame_ids)
+
+    async def test_should_return_killmails_in_id_order(self):
+        # given
+        parser = ProcessPoolParser(workers=2, ordering=Ordering.KILLMAIL_ID)
+        parser.start()
+        frame_ids = [5, 3, 4, 1, 2]
+        # when
+        try:
+            for killmail_id in frame_ids:
+                parser.submit(make_frame(killmail_id))
+            result = await self.collect(parser, len(frame_ids))
+        finally:
+            parser.close()
+        # then
+        self.assertListEqual(result, [1, 2, 3, 4, 5])
+
+    async def test_should_skip_frames_which_can_not_be_parsed(self):
+        # given
+        parser = ProcessPoolParser(workers=1)
+        parser.start()
+        # when
+        try:
+            parser.submit("invalid")
+            parser.submit(make_frame(7))
+            result = await self.collect(parser, 1)
+        finally:
+            parser.close()
+        # then
+        self.assertListEqual(result, [7])
@@ -0,0 +1,204 @@
+import asyncio
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+from zkillboard.client import ClientFiltered, Filter, FilterType
+from zkillboard.killmails import Killmail
+from zkillboard.proximity import (
+    UNREACHABLE,
+    JumpIndex,
+    ProximityFilter,
+    read_stargate_edges,
+)
+
+from .factories import EveEntitySolarSystemFactory, KillmailFactory
+from .fixtures import killmails_raw
+
+EDGES = [(1, 2), (2, 3), (3, 4), (2, 5), (6, 7)]
+
+
+class TestReadStargateEdges(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "jumps.csv"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_should_read_sde_format(self):
+        # given
+        self.path.write_text(
+            "fromRegionID,fromConstellationID,fromSolarSystemID,toSolarSystemID\n"
+            "10,20,1,2\n"
+            "10,20,2,1\n"
+        )
+        # when
+        result = read_stargate_edges(self.path)
+        # then
+        self.assertListEqual(result, [(1, 2), (2, 1)])
+
+    def test_should_read_pairs_without_header(self):
+        # given
+        self.path.write_text("1,2\n2,3\n")
+        # when
+        result = read_stargate_edges(self.path)
+        # then
+        self.assertListEqual(result, [(1, 2), (2, 3)])
+
+
+class TestJumpIndex(TestCase):
+    def test_should_compute_distances(self):
+        # when
+        index = JumpIndex.from_edges(EDGES)
+        # then
+        self.assertEqual(index.distance(1, 1), 0)
+        self.assertEqual(index.distance(1, 4), 3)
+        self.assertEqual(index.distance(4, 5), 3)
+        self.assertIsNone(index.distance(1, 6))
+        self.assertIsNone(index.distance(1, 99))
+
+    def test_should_check_within_jumps(self):
+        # given
+        index = JumpIndex.from_edges(EDGES)
+        # when/then
+        self.assertTrue(index.within_jumps(1, 3, 2))
+        self.assertFalse(index.within_jumps(1, 4, 2))
+        self.assertFalse(index.within_jumps(1, 7, 200))
+        self.assertFalse(index.within_jumps(1, 99, 2))
+
+    def test_should_limit_computed_distances(self):
+        # when
+        index = JumpIndex.from_edges(EDGES, max_jumps=2)
+        # then
+        self.assertEqual(index.distance(1, 3), 2)
+        self.assertIsNone(index.distance(1, 4))
+        self.assertEqual(index.max_jumps, 2)
+
+    def test_should_reject_queries_beyond_computed_distances(self):
+        # given
+        index = JumpIndex.from_edges(EDGES, max_jumps=2)
+        # when/then
+        with self.assertRaises(ValueError):
+            index.within_jumps(1, 4, 3)
+        with self.assertRaises(ValueError):
+            index.neighbourhood(1, 3)
+        with self.assertRaises(ValueError):
+            ProximityFilter(index, home_id=1, jumps=3)
+
+    def test_should_not_report_unconnected_systems_within_any_jumps(self):
+        # given
+        index = JumpIndex.from_edges(EDGES)
+        # when/then
+        self.assertFalse(index.within_jumps(1, 6, UNREACHABLE - 1))
+        with self.assertRaises(ValueError):
+            index.within_jumps(1, 6, UNREACHABLE)
+
+    def test_should_return_neighbourhood(self):
+        # given
+        index = JumpIndex.from_edges(EDGES)
+        # when
+        result = index.neighbourhood(2, 1)
+        # then
+        self.assertSetEqual(result, {1, 2, 3, 5})
+
+    def test_should_save_and_open_memory_mapped(self):
+        # given
+        index = JumpIndex.from_edges(EDGES)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "jumps.bin"
+            index = JumpIndex.from_edges(EDGES, max_jumps=5)
+            index.save(path)
+            # when
+            mapped = JumpIndex.open(path)
+            try:
+                # then
+                self.assertListEqual(mapped.system_ids, index.system_ids)
+                self.assertEqual(mapped.max_jumps, 5)
+                self.assertEqual(mapped.distance(1, 4), 3)
+                self.assertSetEqual(mapped.neighbourhood(4, 2), {2, 3, 4})
+            finally:
+                mapped.close()
+
+    def test_should_reject_other_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "other.bin"
+            path.write_bytes(b"something else")
+            with self.assertRaises(ValueError):
+                JumpIndex.open(path)
+
+
+class TestProximityFilter(TestCase):
+    def test_should_match_killmails_within_range(self):
+        # given
+        index = JumpIndex.from_edges(EDGES)
+        my_filter = ProximityFilter(index, home_id=1, jumps=2)
+        near = KillmailFactory(solar_system=EveEntitySolarSystemFactory(id=3))
+        far = KillmailFactory(solar_system=EveEntitySolarSystemFactory(id=4))
+        # when/then
+        self.assertTrue(my_filter.matches(near))
+        self.assertFalse(my_filter.matches(far))
+        self.assertEqual(my_filter.channel(), "killstream")
+        self.assertTrue(my_filter.matches_data({"solar_system_id": 3}))
+        self.assertFalse(my_filter.matches_data({"solar_system_id": 4}))
+
+    def test_should_reject_unknown_home_system(self):
+        index = JumpIndex.from_edges(EDGES)
+        with self.assertRaises(ValueError):
+            ProximityFilter(index, home_id=99, jumps=2)
+
+
+class MyClient(ClientFiltered):
+    def __init__(self, filters, **kwargs) -> None:
+        super().__init__(filters, **kwargs)
+        self.killmails = []
+
+    async def on_new_killmail(self, killmail: Killmail):
+        self.killmails.append(killmail)
+
+
+@patch("zkillboard.client.Killmail.resolve_entities", new_callable=AsyncMock)
+class TestClientWithProximityFilter(IsolatedAsyncioTestCase):
+    async def test_should_deliver_only_killmails_within_range(self, mock_resolve):
+        # given
+        index = JumpIndex.from_edges([(30001994, 30001995), (30001995, 30001996)])
+        near = MyClient([ProximityFilter(index, 30001995, 1)])
+        far = MyClient([ProximityFilter(index, 30001996, 1)])
+        killmail_data = killmails_raw[111519365]
+        # when
+        near._process_killmail_data(killmail_data)
+        far._process_killmail_data(killmail_data)
+        await asyncio.sleep(0)
+        # then
+        self.assertEqual(len(near.killmails), 1)
+        self.assertEqual(len(far.killmails), 0)
+        self.assertListEqual(near.channels, ["killstream"])
+        mock_resolve.assert_awaited_once()
+
+    async def test_should_deliver_killmails_matching_other_filters(self, mock_resolve):
+        # given
+        index = JumpIndex.from_edges([(30001994, 30001995), (30001995, 30001996)])
+        client = MyClient(
+            [
+                ProximityFilter(index, 30001996, 1),
+                Filter(FilterType.ALLIANCE, 99001317),
+            ]
+        )
+        killmail_data = killmails_raw[111519365]
+        # when
+        client._process_killmail_data(killmail_data)
+        await asyncio.sleep(0)
+        # then
+        self.assertEqual(len(client.killmails), 1)
+        self.assertListEqual(client.channels, ["killstream", "alliance:99001317"])
+
+    def test_should_reject_filters_which_only_zkb_can_match(self, mock_resolve):
+        index = JumpIndex.from_edges([(30001994, 30001995)])
+        with self.assertRaises(ValueError):
+            MyClient(
+                [
+                    ProximityFilter(index, 30001994, 1),
+                    Filter(FilterType.REGION, 10000002),
+                ]
+            )
@@ -0,0 +1,174 @@
+# type: ignore
+
+import gzip
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from zkillboard.recording import (
+    Compression,
+    ReplaySource,
+    StreamRecorder,
+    read_segment,
+)
+
+
+class TestStreamRecorder(TestCase):
+    def test_should_record_frames(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir)
+            # when
+            recorder.write('{"killmail_id": 1}', received_at=100.0)
+            recorder.write('{"killmail_id": 2}', received_at=101.0)
+            recorder.close()
+            # then
+            segments = list(Path(temp_dir).iterdir())
+            self.assertEqual(len(segments), 1)
+            self.assertTrue(segments[0].name.endswith(".jsonl.gz"))
+            result = list(read_segment(segments[0]))
+            self.assertListEqual(
+                result, [(100.0, '{"killmail_id": 1}'), (101.0, '{"killmail_id": 2}')]
+            )
+
+    def test_should_store_frames_without_escaping(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir)
+            frame = '{"name": "Ünïcode \\"quoted\\""}'
+            # when
+            recorder.write(frame, received_at=100.0)
+            recorder.close()
+            # then
+            segment = next(Path(temp_dir).iterdir())
+            with gzip.open(segment, "rb") as file:
+                content = file.read()
+            self.assertIn(frame.encode("utf-8"), content)
+            self.assertListEqual(list(read_segment(segment)), [(100.0, frame)])
+
+    def test_should_record_frames_with_newlines(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir, compression=Compression.ZSTD)
+            # when
+            recorder.write('{\n"killmail_id": 1\n}\n', received_at=100.0)
+            recorder.write("", received_at=101.0)
+            recorder.write('{"killmail_id": 2}', received_at=102.0)
+            recorder.close()
+            # then
+            segment = next(Path(temp_dir).iterdir())
+            self.assertTrue(segment.name.endswith(".jsonl.zst"))
+            self.assertListEqual(
+                list(read_segment(segment)),
+                [
+                    (100.0, '{\n"killmail_id": 1\n}\n'),
+                    (101.0, ""),
+                    (102.0, '{"killmail_id": 2}'),
+                ],
+            )
+
+    def test_should_stop_recording_when_writing_fails(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            directory = Path(temp_dir) / "file"
+            directory.write_bytes(b"")  # segments can not be created here
+            recorder = StreamRecorder(directory, max_queue_size=1)
+            # when
+            with self.assertLogs("zkillboard", level="ERROR"):
+                recorder.write("a", received_at=100.0)
+                while recorder._thread.is_alive():
+                    time.sleep(0.001)
+            for num in range(3):
+                recorder.write(str(num), received_at=101.0 + num)
+            closer = threading.Thread(target=recorder.close)
+            closer.start()
+            closer.join(2)
+            # then
+            self.assertFalse(closer.is_alive())
+            self.assertTrue(recorder.failed)
+            self.assertEqual(recorder.dropped, 3)
+
+    def test_should_drop_frames_when_queue_is_full(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir, max_queue_size=1)
+            disk_is_slow = threading.Event()
+            write_frame = recorder._write_frame
+
+            def slow_write_frame(*args):
+                disk_is_slow.wait()
+                write_frame(*args)
+
+            recorder._write_frame = slow_write_frame
+            recorder.write("a", received_at=100.0)
+            while not recorder._queue.empty():  # wait until writer has taken "a"
+                time.sleep(0.001)
+            # when
+            recorder.write("b", received_at=101.0)
+            recorder.write("c", received_at=102.0)
+            disk_is_slow.set()
+            recorder.close()
+            # then
+            self.assertEqual(recorder.dropped, 1)
+            segment = next(Path(temp_dir).iterdir())
+            self.assertListEqual(
+                list(read_segment(segment)), [(100.0, "a"), (101.0, "b")]
+            )
+
+    def test_should_rotate_segments_by_size(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir, max_segment_bytes=10)
+            # when
+            for num in range(3):
+                recorder.write(json.dumps({"killmail_id": num}), received_at=100.0)
+            recorder.close()
+            # then
+            self.assertEqual(len(list(Path(temp_dir).iterdir())), 3)
+
+    def test_should_rotate_segments_by_age(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir, max_segment_seconds=60)
+            # when
+            recorder.write("a", received_at=100.0)
+            recorder.write("b", received_at=130.0)
+            recorder.write("c", received_at=161.0)
+            recorder.close()
+            # then
+            self.assertEqual(len(list(Path(temp_dir).iterdir())), 2)
+
+
+class TestReplaySource(IsolatedAsyncioTestCase):
+    async def test_should_replay_segments_in_order(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir, max_segment_bytes=10)
+            for num in range(5):
+                recorder.write(str(num), received_at=100.0 + num)
+            recorder.close()
+            source = ReplaySource(temp_dir, speed=None)
+            # when
+            result = [data async for data in source.frames()]
+            # then
+            self.assertListEqual(result, ["0", "1", "2", "3", "4"])
+
+    async def test_should_replay_at_given_speed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir)
+            recorder.write("a", received_at=100.0)
+            recorder.write("b", received_at=101.0)
+            recorder.close()
+            source = ReplaySource(temp_dir, speed=10)
+            # when
+            started = time.monotonic()
+            result = [data async for data in source.frames()]
+            duration = time.monotonic() - started
+            # then
+            self.assertListEqual(result, ["a", "b"])
+            self.assertGreaterEqual(duration, 0.09)
+            self.assertLess(duration, 0.5)
@@ -0,0 +1,121 @@
+# type: ignore
+
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock
+
+import aiohttp
+from aiohttp.test_utils import unused_port
+
+from zkillboard.metrics import RELAY_EVICTIONS_TOTAL, InMemoryMetrics
+from zkillboard.relay import RelayServer, encode_killmail
+
+from .factories import KillmailFactory
+
+
+class TestEncodeKillmail(IsolatedAsyncioTestCase):
+    async def test_should_encode_enriched_killmail(self):
+        # given
+        killmail = KillmailFactory()
+        # when
+        result = json.loads(encode_killmail(killmail))
+        # then
+        self.assertEqual(result["id"], killmail.id)
+        self.assertEqual(result["time"], killmail.time.isoformat())
+        self.assertEqual(result["solar_system"]["category"], "solar_system")
+
+
+class TestRelayServer(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.port = unused_port()
+        self.metrics = InMemoryMetrics()
+        self.relay = RelayServer(port=self.port, buffer_size=1, metrics=self.metrics)
+        await self.relay.start_server()
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.relay.stop_server()
+
+    async def connect(self, *channels: str):
+        ws = await self.session.ws_connect(
+            f"http://127.0.0.1:{self.port}{RelayServer.path}"
+        )
+        for channel in channels:
+            await ws.send_json({"action": "sub", "channel": channel})
+        for _ in range(100):
+            if self.relay.subscribers_count and all(
+                obj.filters for obj in self.relay._subscribers
+            ):
+                break
+            await asyncio.sleep(0.01)
+        return ws
+
+    async def test_should_relay_matching_killmails_only(self):
+        # given
+        killmail_1 = KillmailFactory()
+        killmail_2 = KillmailFactory()
+        ws = await self.connect(f"system:{killmail_2.solar_system.id}")
+        # when
+        await self.relay.on_new_killmail(killmail_1)
+        await self.relay.on_new_killmail(killmail_2)
+        # then
+        result = await asyncio.wait_for(ws.receive_json(), 1)
+        self.assertEqual(result["id"], killmail_2.id)
+        await ws.close()
+
+    async def test_should_relay_all_killmails_for_killstream(self):
+        # given
+        killmail = KillmailFactory()
+        ws = await self.connect("killstream")
+        # when
+        await self.relay.on_new_killmail(killmail)
+        # then
+        result = await asyncio.wait_for(ws.receive_json(), 1)
+        self.assertEqual(result["id"], killmail.id)
+        await ws.close()
+
+    async def test_should_disconnect_slow_subscribers(self):
+        # given
+        ws = await self.connect("killstream")
+        # when
+        await self.relay.on_new_killmail(KillmailFactory())
+        await self.relay.on_new_killmail(KillmailFactory())
+        # then
+        self.assertEqual(self.relay.subscribers_count, 0)
+        messages = []
+        async for msg in ws:
+            messages.append(msg)
+        self.assertEqual(ws.close_code, aiohttp.WSCloseCode.POLICY_VIOLATION)
+
+    async def test_should_reject_channels_which_can_not_be_relayed(self):
+        # given
+        killmail = KillmailFactory()
+        ws = await self.session.ws_connect(
+            f"http://127.0.0.1:{self.port}{RelayServer.path}"
+        )
+        # when
+        await ws.send_json({"action": "sub", "channel": "region:10000002"})
+        result = await asyncio.wait_for(ws.receive_json(), 1)
+        # then
+        self.assertEqual(
+            result, {"error": "Channel can not be relayed: region:10000002"}
+        )
+        subscriber = next(iter(self.relay._subscribers))
+        self.assertSetEqual(subscriber.filters, set())
+        await self.relay.on_new_killmail(killmail)
+        await ws.close()
+
+    async def test_should_remove_subscriber_when_sending_fails(self):
+        # given
+        ws = await self.connect("killstream")
+        subscriber = next(iter(self.relay._subscribers))
+        subscriber.ws.send_str = AsyncMock(side_effect=ConnectionResetError())
+        # when
+        await self.relay.on_new_killmail(KillmailFactory())
+        await asyncio.wait_for(subscriber.sender, 1)
+        # then
+        self.assertEqual(self.relay.subscribers_count, 0)
+        self.assertEqual(self.metrics.counter(RELAY_EVICTIONS_TOTAL), 0)
+        await ws.close()
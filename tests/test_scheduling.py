@@ -0,0 +1,141 @@
+# type: ignore
+
+import asyncio
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
+
+from zkillboard import config
+from zkillboard.client import ClientKillStream
+from zkillboard.killmails import Killmail
+from zkillboard.metrics import LANE_LATENCY_SECONDS, InMemoryMetrics
+from zkillboard.scheduling import Lane, PriorityScheduler, Ranker
+
+from .fixtures import killmails_raw
+
+
+def make_killmail_data(killmail_id: int, value: float, npc: bool = False) -> dict:
+    killmail_data = killmails_raw[111519365]
+    zkb = {**killmail_data["zkb"], "totalValue": value, "npc": npc}
+    return {**killmail_data, "killmail_id": killmail_id, "zkb": zkb}
+
+
+class TestRanker(TestCase):
+    def test_should_rank_by_value(self):
+        # given
+        ranker = Ranker(high_value=1_000, low_value=10)
+        # when/then
+        self.assertEqual(ranker.rank(make_killmail_data(1, 1_000)), Lane.HIGH)
+        self.assertEqual(ranker.rank(make_killmail_data(1, 100)), Lane.NORMAL)
+        self.assertEqual(ranker.rank(make_killmail_data(1, 5)), Lane.LOW)
+        self.assertEqual(ranker.rank({"killmail_id": 1}), Lane.LOW)
+
+    def test_should_put_npc_kills_in_low_lane(self):
+        ranker = Ranker(high_value=1_000, low_value=10)
+        killmail_data = make_killmail_data(1, 100, npc=True)
+        self.assertEqual(ranker.rank(killmail_data), Lane.LOW)
+
+    def test_should_put_watched_killmails_in_high_lane(self):
+        # given
+        killmail_data = make_killmail_data(1, 5)
+        victim = killmail_data["victim"]
+        attacker = {"character_id": 42, "ship_type_id": 587}
+        killmail_data["attackers"] = [*killmail_data["attackers"], attacker]
+        # when/then
+        ranker = Ranker(watched_ids=[victim["alliance_id"]])
+        self.assertEqual(ranker.rank(killmail_data), Lane.HIGH)
+        ranker = Ranker(watched_ids=[attacker["character_id"]])
+        self.assertEqual(ranker.rank(killmail_data), Lane.HIGH)
+        ranker = Ranker(watched_ship_type_ids=[victim["ship_type_id"]])
+        self.assertEqual(ranker.rank(killmail_data), Lane.HIGH)
+        ranker = Ranker(watched_ids=[1])
+        self.assertEqual(ranker.rank(killmail_data), Lane.LOW)
+
+
+class TestPriorityScheduler(IsolatedAsyncioTestCase):
+    async def test_should_return_items_by_lane_first(self):
+        # given
+        scheduler = PriorityScheduler(max_wait=60)
+        scheduler.put(Lane.LOW, "low")
+        scheduler.put(Lane.NORMAL, "normal")
+        scheduler.put(Lane.HIGH, "high 1")
+        scheduler.put(Lane.HIGH, "high 2")
+        # when
+        result = [(await scheduler.get())[1] for _ in range(4)]
+        # then
+        self.assertListEqual(result, ["high 1", "high 2", "normal", "low"])
+
+    async def test_should_return_overdue_items_first(self):
+        # given
+        scheduler = PriorityScheduler(max_wait=5)
+        scheduler.put(Lane.LOW, "low", queued_at=0)
+        scheduler.put(Lane.HIGH, "high")
+        # when
+        lane, item, _ = await scheduler.get()
+        # then
+        self.assertEqual(lane, Lane.LOW)
+        self.assertEqual(item, "low")
+
+    async def test_should_wait_for_items(self):
+        # given
+        scheduler = PriorityScheduler()
+        getter = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        # when
+        scheduler.put(Lane.NORMAL, "item")
+        # then
+        lane, item, _ = await asyncio.wait_for(getter, 1)
+        self.assertEqual((lane, item), (Lane.NORMAL, "item"))
+
+    async def test_should_join_when_all_items_are_done(self):
+        # given
+        scheduler = PriorityScheduler()
+        scheduler.put(Lane.NORMAL, "item")
+        joiner = asyncio.create_task(scheduler.join())
+        await scheduler.get()
+        await asyncio.sleep(0)
+        self.assertFalse(joiner.done())
+        # when
+        scheduler.task_done()
+        # then
+        await asyncio.wait_for(joiner, 1)
+
+
+class MyClient(ClientKillStream):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.killmails = []
+
+    async def on_new_killmail(self, killmail: Killmail):
+        self.killmails.append(killmail)
+
+
+@patch("zkillboard.client.Killmail.resolve_entities", new_callable=AsyncMock)
+class TestClientWithRanker(IsolatedAsyncioTestCase):
+    async def test_should_deliver_high_priority_killmails_first(self, mock_resolve):
+        # given
+        metrics = InMemoryMetrics()
+        client = MyClient(
+            ranker=Ranker(high_value=1_000, low_value=10),
+            runtime=config.RuntimeConfig(lane_workers=1),
+            metrics=metrics,
+        )
+
+        async def burst():
+            for killmail_id, value in [(1, 5), (2, 100), (3, 1_000), (4, 100)]:
+                client._process_frame(
+                    json.dumps(make_killmail_data(killmail_id, value))
+                )
+
+        # when
+        await client._run_pipeline([burst()], until_idle=True)
+        # then
+        self.assertListEqual([obj.id for obj in client.killmails], [3, 2, 4, 1])
+        self.assertEqual(metrics.histogram_count(LANE_LATENCY_SECONDS, lane="high"), 1)
+        self.assertEqual(
+            metrics.histogram_count(LANE_LATENCY_SECONDS, lane="normal"), 2
+        )
+
+    def test_should_not_allow_ranker_with_parse_workers(self, mock_resolve):
+        with self.assertRaises(ValueError):
+            MyClient(ranker=Ranker(), parse_workers=2)
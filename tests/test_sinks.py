@@ -0,0 +1,199 @@
+# type: ignore
+
+import asyncio
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from zkillboard.client import ClientKillStream
+from zkillboard.killmails import Killmail
+from zkillboard.metrics import (
+    SINK_DROPS_TOTAL,
+    SINK_ERRORS_TOTAL,
+    SINK_LAG_SECONDS,
+    InMemoryMetrics,
+)
+from zkillboard.recording import ReplaySource, StreamRecorder
+from zkillboard.sinks import FunctionSink, Sink, SinkPolicy, SinkRegistry
+from zkillboard.storage import SqliteSink
+
+from .factories import KillmailFactory
+from .fixtures import killmails_raw
+
+
+class CollectingSink(Sink):
+    def __init__(self, delay: float = 0, fail: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+        self.started = False
+        self.stopped = False
+
+    async def start(self):
+        self.started = True
+
+    async def stop(self):
+        self.stopped = True
+
+    async def handle(self, killmails):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("failed")
+        self.batches.append([obj.id for obj in killmails])
+
+    @property
+    def ids(self):
+        return [id for batch in self.batches for id in batch]
+
+
+class TestSinkRegistry(IsolatedAsyncioTestCase):
+    async def test_should_not_let_slow_sink_hold_up_others(self):
+        # given
+        metrics = InMemoryMetrics()
+        registry = SinkRegistry(metrics, stop_timeout=0)
+        fast = CollectingSink()
+        slow = CollectingSink(delay=10)
+        registry.register("fast", fast)
+        registry.register("slow", slow, queue_size=2, policy=SinkPolicy.DROP_NEWEST)
+        await registry.start()
+        # when
+        for id in range(1, 11):
+            await registry.dispatch(KillmailFactory(id=id))
+        await asyncio.sleep(0.01)
+        await registry.stop()
+        # then
+        self.assertListEqual(fast.ids, list(range(1, 11)))
+        self.assertListEqual(slow.ids, [])
+        self.assertEqual(metrics.counter(SINK_DROPS_TOTAL, sink="slow"), 8)
+        self.assertEqual(metrics.counter(SINK_DROPS_TOTAL, sink="fast"), 0)
+        self.assertEqual(metrics.histogram_count(SINK_LAG_SECONDS, sink="fast"), 10)
+        self.assertTrue(slow.started and slow.stopped)
+
+    async def test_should_queue_for_other_sinks_before_blocking(self):
+        # given
+        registry = SinkRegistry(stop_timeout=0)
+        blocking = CollectingSink(delay=10)
+        fast = CollectingSink()
+        registry.register("blocking", blocking, queue_size=1, policy=SinkPolicy.BLOCK)
+        registry.register("fast", fast)
+        await registry.start()
+        await registry.dispatch(KillmailFactory(id=1))
+        await asyncio.sleep(0.01)  # blocking sink is now handling killmail 1
+        await registry.dispatch(KillmailFactory(id=2))
+        # when
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(registry.dispatch(KillmailFactory(id=3)), 0.05)
+        # then
+        self.assertListEqual(fast.ids, [1, 2, 3])
+        await registry.stop()
+
+    async def test_should_drop_oldest_killmails_by_default(self):
+        # given
+        metrics = InMemoryMetrics()
+        registry = SinkRegistry(metrics, stop_timeout=0)
+        sink = CollectingSink(delay=10)
+        registry.register("sink", sink, queue_size=2)
+        await registry.start()
+        await registry.dispatch(KillmailFactory(id=1))
+        await asyncio.sleep(0.01)  # sink is now handling killmail 1
+        # when
+        for id in range(2, 6):
+            await asyncio.wait_for(registry.dispatch(KillmailFactory(id=id)), 1)
+        # then
+        self.assertEqual(metrics.counter(SINK_DROPS_TOTAL, sink="sink"), 2)
+        await registry.stop()
+
+    async def test_should_keep_newest_killmails_when_dropping_oldest(self):
+        # given
+        registry = SinkRegistry()
+        sink = CollectingSink()
+        registry.register("sink", sink, queue_size=3, policy=SinkPolicy.DROP_OLDEST)
+        await registry.start()
+        # when
+        for id in range(1, 11):
+            await registry.dispatch(KillmailFactory(id=id))
+        await registry.stop()
+        # then
+        self.assertListEqual(sink.ids, [8, 9, 10])
+
+    async def test_should_handle_killmails_in_batches(self):
+        # given
+        registry = SinkRegistry()
+        sink = CollectingSink()
+        registry.register("sink", sink, batch_size=3, batch_timeout=0.05)
+        await registry.start()
+        # when
+        for id in range(1, 8):
+            await registry.dispatch(KillmailFactory(id=id))
+        await registry.stop()
+        # then
+        self.assertListEqual(sink.batches, [[1, 2, 3], [4, 5, 6], [7]])
+
+    async def test_should_count_errors_and_continue(self):
+        # given
+        metrics = InMemoryMetrics()
+        registry = SinkRegistry(metrics)
+        registry.register("sink", CollectingSink(fail=True))
+        await registry.start()
+        # when
+        with self.assertLogs("zkillboard", level="ERROR"):
+            for id in range(1, 4):
+                await registry.dispatch(KillmailFactory(id=id))
+            await registry.stop()
+        # then
+        self.assertEqual(metrics.counter(SINK_ERRORS_TOTAL, sink="sink"), 3)
+
+    async def test_should_call_function_for_each_killmail(self):
+        # given
+        registry = SinkRegistry()
+        func = AsyncMock()
+        registry.register("func", FunctionSink(func), concurrency=2)
+        await registry.start()
+        # when
+        await registry.dispatch(KillmailFactory())
+        await registry.dispatch(KillmailFactory())
+        await registry.stop()
+        # then
+        self.assertEqual(func.await_count, 2)
+
+    def test_should_reject_duplicate_names(self):
+        registry = SinkRegistry()
+        registry.register("sink", CollectingSink())
+        with self.assertRaises(ValueError):
+            registry.register("sink", CollectingSink())
+
+
+class MyClient(ClientKillStream):
+    async def on_new_killmail(self, killmail: Killmail):
+        pass
+
+
+@patch("zkillboard.client.Killmail.resolve_entities", new_callable=AsyncMock)
+class TestClientWithSinks(IsolatedAsyncioTestCase):
+    async def test_should_dispatch_killmails_to_all_sinks(self, mock_resolve):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # given
+            recorder = StreamRecorder(temp_dir)
+            for killmail_id in [1, 2, 3]:
+                killmail_data = {**killmails_raw[111519365], "killmail_id": killmail_id}
+                recorder.write(json.dumps(killmail_data))
+            recorder.close()
+            path = Path(temp_dir) / "killmails.sqlite"
+            registry = SinkRegistry()
+            collector = CollectingSink()
+            registry.register("collector", collector)
+            registry.register(
+                "sqlite", SqliteSink(path), batch_size=100, batch_timeout=0.05
+            )
+            client = MyClient(sinks=registry)
+            # when
+            await client.run_replay(ReplaySource(temp_dir, speed=None))
+            # then
+            self.assertListEqual(collector.ids, [1, 2, 3])
+            with sqlite3.connect(path) as connection:
+                count = connection.execute("SELECT COUNT(*) FROM killmails")
+                self.assertEqual(count.fetchone()[0], 3)
@@ -0,0 +1,174 @@
+# type: ignore
+
+import asyncio
+import datetime as dt
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from zkillboard.storage import SqliteSink
+
+from .factories import KillmailFactory
+
+
+class TestSqliteSink(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "killmails.sqlite"
+        self.sink = SqliteSink(self.path, batch_size=2, flush_interval=60)
+        await self.sink.start()
+
+    async def asyncTearDown(self):
+        await self.sink.stop()
+        self.temp_dir.cleanup()
+
+    def count_rows(self, table: str) -> int:
+        with sqlite3.connect(self.path) as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    async def test_should_write_when_batch_is_full(self):
+        # given
+        killmail_1 = KillmailFactory()
+        killmail_2 = KillmailFactory()
+        # when
+        await self.sink.add(killmail_1)
+        before = self.count_rows("killmails")
+        await self.sink.add(killmail_2)
+        # then
+        self.assertEqual(before, 0)
+        self.assertEqual(self.count_rows("killmails"), 2)
+        attackers = len(killmail_1.attackers) + len(killmail_2.attackers)
+        self.assertEqual(self.count_rows("attackers"), attackers)
+
+    async def test_should_upsert_entities(self):
+        # given
+        killmail_1 = KillmailFactory()
+        killmail_2 = KillmailFactory(solar_system=killmail_1.solar_system)
+        killmail_2.solar_system.name = "Renamed"
+        # when
+        await self.sink.add(killmail_1)
+        await self.sink.add(killmail_2)
+        # then
+        with sqlite3.connect(self.path) as connection:
+            name = connection.execute(
+                "SELECT name FROM entities WHERE id = ?", [killmail_1.solar_system.id]
+            ).fetchone()[0]
+        self.assertEqual(name, "Renamed")
+
+    async def test_should_use_wal_mode(self):
+        with sqlite3.connect(self.path) as connection:
+            mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    async def test_should_return_recent_killmails(self):
+        # given
+        now = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+        killmail_1 = KillmailFactory(time=now - dt.timedelta(hours=2))
+        killmail_2 = KillmailFactory(time=now - dt.timedelta(minutes=5))
+        killmail_3 = KillmailFactory(time=now)
+        for killmail in [killmail_1, killmail_2, killmail_3]:
+            await self.sink.add(killmail)
+        await self.sink.flush()
+        # when
+        result = await self.sink.recent_killmails(since=now - dt.timedelta(hours=1))
+        # then
+        self.assertListEqual(
+            [obj["id"] for obj in result], [killmail_3.id, killmail_2.id]
+        )
+        self.assertEqual(result[0]["solar_system_id"], killmail_3.solar_system.id)
+
+    async def test_should_filter_recent_killmails_by_system(self):
+        # given
+        killmail_1 = KillmailFactory()
+        killmail_2 = KillmailFactory()
+        await self.sink.add(killmail_1)
+        await self.sink.add(killmail_2)
+        # when
+        result = await self.sink.recent_killmails(
+            solar_system_id=killmail_1.solar_system.id
+        )
+        # then
+        self.assertListEqual([obj["id"] for obj in result], [killmail_1.id])
+
+    async def test_should_write_buffered_killmails_on_stop(self):
+        # given
+        await self.sink.add(KillmailFactory())
+        # when
+        await self.sink.stop()
+        # then
+        self.assertEqual(self.count_rows("killmails"), 1)
+        await self.sink.start()
+
+    async def test_should_keep_killmails_when_write_fails(self):
+        # given
+        killmail_1 = KillmailFactory()
+        killmail_2 = KillmailFactory()
+        await self.sink.add(killmail_1)
+        # when
+        with patch.object(
+            self.sink, "_write", side_effect=sqlite3.OperationalError("locked")
+        ):
+            with self.assertRaises(sqlite3.OperationalError):
+                await self.sink.add(killmail_2)
+        await self.sink.flush()
+        # then
+        result = await self.sink.recent_killmails()
+        self.assertSetEqual(
+            {obj["id"] for obj in result}, {killmail_1.id, killmail_2.id}
+        )
+
+    async def test_should_close_database_on_stop_when_write_fails(self):
+        # given
+        await self.sink.add(KillmailFactory())
+        # when
+        with patch.object(
+            self.sink, "_write", side_effect=sqlite3.OperationalError("locked")
+        ):
+            with self.assertRaises(sqlite3.OperationalError):
+                await self.sink.stop()
+        # then
+        self.assertIsNone(self.sink._connection)
+        self.assertIsNone(self.sink._executor)
+        await self.sink.start()
+
+    async def test_should_drop_killmails_which_can_not_be_written(self):
+        # given
+        self.sink.max_retries = 1
+        bad_killmail = KillmailFactory()
+        bad_killmail.zkb.points = 2**70
+        good_killmails = [KillmailFactory() for _ in range(3)]
+        # when
+        with self.assertLogs("zkillboard", level="ERROR"):
+            for killmail in [bad_killmail, *good_killmails]:
+                try:
+                    await self.sink.add(killmail)
+                except OverflowError:
+                    pass
+            await self.sink.flush()
+        # then
+        result = await self.sink.recent_killmails()
+        self.assertSetEqual(
+            {obj["id"] for obj in result}, {obj.id for obj in good_killmails}
+        )
+        self.assertListEqual(self.sink._buffer, [])
+
+    async def test_should_keep_flushing_periodically_after_errors(self):
+        # given
+        await self.sink.stop()
+        self.sink = SqliteSink(self.path, flush_interval=0.01, max_retries=0)
+        await self.sink.start()
+        bad_killmail = KillmailFactory()
+        bad_killmail.zkb.points = 2**70
+        good_killmail = KillmailFactory()
+        # when
+        with self.assertLogs("zkillboard", level="ERROR"):
+            await self.sink.add(bad_killmail)
+            await asyncio.sleep(0.05)
+        await self.sink.add(good_killmail)
+        await asyncio.sleep(0.05)
+        # then
+        self.assertFalse(self.sink._flusher.done())
+        result = await self.sink.recent_killmails()
+        self.assertListEqual([obj["id"] for obj in result], [good_killmail.id])